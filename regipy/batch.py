@@ -0,0 +1,288 @@
+"""
+Run the plugins on a directory of collected hives, using several processes.
+
+Each worker process imports the plugins once and then processes hive after hive, so there is no interpreter or plugin
+import startup per hive. A hive that takes longer than the timeout is stopped by killing its worker, which is then
+replaced, and a worker that dies only fails the hive it was processing.
+
+The result of every hive is appended to a JSON-lines manifest as soon as it is known. Running the batch again with
+the same manifest skips the hives it already has, so an interrupted batch resumes where it stopped.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Optional
+
+from construct import ConstError, StreamError
+
+from regipy.exceptions import RegipyGeneralException
+from regipy.plugins.utils import run_relevant_plugins
+from regipy.registry import RegistryHive
+
+try:
+    import resource
+except ModuleNotFoundError:
+    # Not available on Windows, where memory limits are not supported
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Transaction logs, backups and other files that are collected with hives, but are not hives
+HIVE_SKIP_EXTENSIONS = {".log", ".log1", ".log2", ".sav", ".regtrans-ms", ".blf", ".tmp"}
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+UNIDENTIFIED = "unidentified"
+
+# Hives with these statuses are processed again on resume if retry_failed is set
+RETRYABLE_STATUSES = (FAILED, TIMEOUT)
+
+
+@dataclass
+class HiveResult:
+    hive_path: str
+    status: str
+    hive_type: Optional[str] = None
+    output_path: Optional[str] = None
+    plugins_count: int = 0
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+def iter_hive_files(directory, recursive=True) -> Iterator[Path]:
+    """
+    Find the files of a directory that may be hives. Transaction logs and backup files are skipped.
+    :param directory: The directory to search
+    :param recursive: Whether to search the subdirectories too
+    :return: Paths, sorted
+    """
+    directory_path = Path(directory)
+    file_paths = directory_path.rglob("*") if recursive else directory_path.iterdir()
+    for file_path in sorted(file_paths):
+        if file_path.is_file() and file_path.suffix.lower() not in HIVE_SKIP_EXTENSIONS:
+            yield file_path
+
+
+def load_manifest(manifest_path) -> dict[str, HiveResult]:
+    """
+    Load the results recorded in a manifest. If a hive was recorded more than once, its last result is used.
+    :param manifest_path: The path of the manifest. If it does not exist, there are no results.
+    :return: A mapping of hive paths to results
+    """
+    results = {}
+    if not os.path.exists(manifest_path):
+        return results
+
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            try:
+                result = HiveResult(**json.loads(line))
+            except (ValueError, TypeError):
+                # The last line may be incomplete, if the batch was killed while writing it
+                logger.warning(f"Skipping a bad line in the manifest {manifest_path}")
+                continue
+            results[result.hive_path] = result
+    return results
+
+
+def get_output_path(hive_path: Path, directory: Path, output_directory) -> str:
+    """
+    The results of a hive are written under the output directory, at the path of the hive relative to the directory
+    """
+    return os.path.join(output_directory, f"{hive_path.relative_to(directory)}.json")
+
+
+def _set_memory_limit(memory_limit: Optional[int]):
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _process_hive(hive_path, output_path, plugins, include_unvalidated) -> HiveResult:
+    start_time = time.monotonic()
+    try:
+        registry_hive = RegistryHive(hive_path)
+    except (ConstError, StreamError) as ex:
+        return HiveResult(hive_path=hive_path, status=UNIDENTIFIED, error=f"Could not parse the hive: {ex!r}")
+
+    try:
+        if registry_hive.hive_type is None:
+            return HiveResult(hive_path=hive_path, status=UNIDENTIFIED, duration=time.monotonic() - start_time)
+
+        plugin_results = run_relevant_plugins(
+            registry_hive, as_json=True, plugins=plugins, include_unvalidated=include_unvalidated
+        )
+    finally:
+        registry_hive.close()
+
+    # Written to a temporary file first, so an interrupted batch never leaves a partial output behind
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(f"{output_path}.tmp", "w") as f:
+        f.write(json.dumps(plugin_results, indent=4))
+    os.replace(f"{output_path}.tmp", output_path)
+
+    return HiveResult(
+        hive_path=hive_path,
+        status=DONE,
+        hive_type=registry_hive.hive_type,
+        output_path=output_path,
+        plugins_count=len(plugin_results),
+        duration=time.monotonic() - start_time,
+    )
+
+
+def _worker_main(connection, memory_limit):
+    _set_memory_limit(memory_limit)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+
+        hive_path = task[0]
+        start_time = time.monotonic()
+        try:
+            result = _process_hive(*task)
+        except MemoryError:
+            result = HiveResult(hive_path=hive_path, status=FAILED, error="Memory limit exceeded")
+        except Exception as ex:
+            result = HiveResult(hive_path=hive_path, status=FAILED, error=f"{type(ex).__name__}: {ex}")
+        result.duration = time.monotonic() - start_time
+        connection.send(result)
+
+
+class _Worker:
+    def __init__(self, memory_limit):
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(worker_connection, memory_limit), daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.task = None
+        self.deadline = None
+        self.start_time = None
+
+    def submit(self, task, timeout):
+        self.task = task
+        self.start_time = time.monotonic()
+        self.deadline = self.start_time + timeout if timeout else None
+        self.connection.send(task)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        self.connection.send(None)
+        self.process.join()
+        self.connection.close()
+
+
+def run_plugins_on_directory(
+    directory,
+    output_directory,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    manifest_path=None,
+    plugins=None,
+    include_unvalidated=False,
+    retry_failed=False,
+    recursive=True,
+) -> list[HiveResult]:
+    """
+    Run the relevant plugins on every hive of a directory, and write the results of each hive to a JSON file
+    :param directory: The directory of the hives
+    :param output_directory: The results of every hive are written to <output_directory>/<path of the hive>.json
+    :param workers: The number of worker processes, by default the number of CPUs
+    :param timeout: If given, a hive is stopped after this many seconds
+    :param memory_limit: If given, the address space of every worker is limited to this many bytes (not on Windows)
+    :param manifest_path: The manifest of the batch, by default MANIFEST_FILE_NAME in the output directory
+    :param plugins: List of plugin names to execute, see run_relevant_plugins()
+    :param include_unvalidated: Whether to include plugins that don't have validation test cases
+    :param retry_failed: Whether to process again the hives that failed or timed out in a previous run
+    :param recursive: Whether to look for hives in subdirectories too
+    :return: The results of the hives processed in this run
+    """
+    if memory_limit and resource is None:
+        raise RegipyGeneralException("Memory limits are not supported on this platform")
+
+    directory = Path(directory).resolve()
+    output_directory = Path(output_directory).resolve()
+    workers = workers or os.cpu_count() or 1
+    manifest_path = manifest_path or os.path.join(output_directory, MANIFEST_FILE_NAME)
+    os.makedirs(output_directory, exist_ok=True)
+
+    previous_results = load_manifest(manifest_path)
+    tasks = deque()
+    for hive_path in iter_hive_files(directory, recursive=recursive):
+        # The output directory may be inside the directory of the hives
+        if hive_path.is_relative_to(output_directory):
+            continue
+
+        previous_result = previous_results.get(str(hive_path))
+        if previous_result and not (retry_failed and previous_result.status in RETRYABLE_STATUSES):
+            continue
+        tasks.append((str(hive_path), get_output_path(hive_path, directory, output_directory), plugins, include_unvalidated))
+    logger.info(f"Processing {len(tasks)} hives, {len(previous_results)} were already in the manifest")
+
+    results = []
+    with open(manifest_path, "a") as manifest:
+
+        def record(result: HiveResult):
+            manifest.write(json.dumps(asdict(result)) + "\n")
+            manifest.flush()
+            results.append(result)
+            logger.info(f"{result.hive_path}: {result.status} in {result.duration:.2f}s")
+
+        pool = [_Worker(memory_limit) for _ in range(min(workers, len(tasks)))]
+        try:
+            while tasks or any(worker.task for worker in pool):
+                for worker in pool:
+                    if worker.task is None and tasks:
+                        worker.submit(tasks.popleft(), timeout)
+
+                busy_workers = [worker for worker in pool if worker.task]
+                deadlines = [worker.deadline for worker in busy_workers if worker.deadline]
+                wait_timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                ready_connections = wait([worker.connection for worker in busy_workers], timeout=wait_timeout)
+
+                for index, worker in enumerate(pool):
+                    if not worker.task:
+                        continue
+                    hive_path = worker.task[0]
+                    if worker.connection in ready_connections:
+                        try:
+                            record(worker.connection.recv())
+                            worker.task = None
+                            continue
+                        except EOFError:
+                            error = f"The worker process exited with code {worker.process.exitcode}"
+                            status = FAILED
+                    elif worker.deadline and time.monotonic() >= worker.deadline:
+                        error = f"Stopped after {timeout}s"
+                        status = TIMEOUT
+                    else:
+                        continue
+
+                    # The worker is gone, or is stuck on the hive, so it is replaced
+                    duration = time.monotonic() - worker.start_time
+                    worker.kill()
+                    record(HiveResult(hive_path=hive_path, status=status, error=error, duration=duration))
+                    pool[index] = _Worker(memory_limit)
+        finally:
+            for worker in pool:
+                if worker.task:
+                    worker.kill()
+                else:
+                    worker.stop()
+    return results
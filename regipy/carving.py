@@ -0,0 +1,526 @@
+"""
+Recover deleted keys, values and security keys from the unallocated cells and the slack space of a hive.
+
+When a key or a value is deleted, its cells are only marked as free: the records stay in the hive until the space
+is reused. Free cells may be merged with their neighbours, so a free cell can hold several old records. The carver
+looks for NK, VK and SK signatures in the free cells, in the unused tail of allocated records and in hbin space after
+a broken cell, validates every candidate against the constraints of its structure, and reattaches the recovered keys
+to their parent key when parent_key_offset still points at a live or recovered key node.
+
+Everything is done in one forward pass over the cells, so the cost grows linearly with the size of the hive.
+"""
+
+import binascii
+import datetime as dt
+import logging
+import re
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from construct import ConstError, StreamError
+
+from regipy.exceptions import RegipyException
+from regipy.fast_parsers import KeyNodeFields, parse_value_key, unpack_cm_key_node
+from regipy.registry import Cell, LazyValue, NKRecord, RegistryHive, get_value_name, get_value_type
+from regipy.scanner import iter_hbins
+from regipy.structs import CM_KEY_NODE_SIZE, HBIN_HEADER, KEY_COMP_NAME, REGF_HEADER_SIZE, VALUE_TYPE_ENUM
+from regipy.utils import MAX_LEN, convert_wintime
+
+logger = logging.getLogger(__name__)
+
+# Where a carved record was found
+UNALLOCATED = "unallocated"
+SLACK = "slack"
+
+# Cells are 8 bytes aligned, relative to the start of the hbin data
+CELL_ALIGNMENT = 8
+
+# Structure constraints used to validate carved records
+MAX_KEY_NAME_SIZE = 255 * 2
+MAX_VALUE_NAME_SIZE = 16383 * 2
+# FILETIME of 1990-01-01 and of 2100-01-01
+MIN_FILETIME = 0x01B41E2A18D64000
+MAX_FILETIME = 0x022F716377640000
+KEY_NODE_FLAGS_MASK = 0x7FFF
+VALUE_KEY_FLAGS_MASK = 0x0003
+INLINE_DATA_FLAG = 0x80000000
+INVALID_OFFSET = 0xFFFFFFFF
+
+_CELL_SIZE = struct.Struct("<i")
+_UINT16 = struct.Struct("<H")
+_VALUE_KEY = struct.Struct("<2sHIIIH2x")
+_KEY_SECURITY = struct.Struct("<2s2xIIII")
+_SIGNATURES = re.compile(b"nk|vk|sk")
+_KNOWN_VALUE_TYPES = frozenset(VALUE_TYPE_ENUM.encmapping.values())
+_HBIN_HEADER_SIZE = HBIN_HEADER.sizeof()
+
+# The cell size, the signature and the fixed size part of the key node
+_NK_RECORD_SIZE = 6 + CM_KEY_NODE_SIZE
+_NK_NAME_SIZE_OFFSET = _NK_RECORD_SIZE - 4
+# The smallest record that can be carved is a VK record with no name
+_MIN_RECORD_SIZE = 4 + _VALUE_KEY.size
+_MIN_SLACK_CELL_SIZE = 8 + _MIN_RECORD_SIZE
+
+
+@dataclass
+class CarvedCell:
+    """
+    A record carved from unallocated or slack space. The offset points right after the signature, like Cell.offset.
+    """
+
+    offset: int
+    cell_type: str
+    size: int
+    source: str
+
+
+@dataclass
+class RecoveredValue:
+    offset: int
+    name: str
+    value_type: str
+    value: Union[str, int, bytes, list, None]
+    size: int
+    source: str
+    is_corrupted: bool = False
+
+
+@dataclass
+class RecoveredKey:
+    offset: int
+    subkey_name: str
+    timestamp: Union[dt.datetime, str]
+    values_count: int
+    source: str
+
+    # The path of the key, if its parents could be resolved up to the root key, either live or recovered ones
+    path: Optional[str] = None
+    parent_offset: Optional[int] = None
+    # Whether the direct parent of the key is still allocated
+    has_live_parent: bool = False
+    values: list[RecoveredValue] = field(default_factory=list)
+
+
+@dataclass
+class RecoveredSecurityKey:
+    offset: int
+    reference_count: int
+    security_descriptor: Union[bytes, str]
+    source: str
+
+
+@dataclass
+class CarvingResult:
+    keys: list[RecoveredKey] = field(default_factory=list)
+    # Values which do not belong to any of the recovered keys
+    values: list[RecoveredValue] = field(default_factory=list)
+    security_keys: list[RecoveredSecurityKey] = field(default_factory=list)
+
+
+def _is_offset(offset, hbins_data_size) -> bool:
+    return offset == INVALID_OFFSET or offset < hbins_data_size
+
+
+def validate_key_node(buffer, offset, end_offset, hbins_data_size) -> Optional[KeyNodeFields]:
+    """
+    Check whether a carved NK record is consistent
+    :param buffer: The hive buffer
+    :param offset: The offset of the key node, right after the "nk" signature
+    :param end_offset: The end of the space the record was carved from
+    :param hbins_data_size: The size of the hbins data, which bounds all the cell offsets
+    :return: The key node fields, or None if this is not a valid key node
+    """
+    if offset + CM_KEY_NODE_SIZE > end_offset:
+        return None
+
+    fields = unpack_cm_key_node(buffer, offset)
+    if not 0 < fields.key_name_size <= MAX_KEY_NAME_SIZE:
+        return None
+    if offset + CM_KEY_NODE_SIZE + fields.key_name_size > end_offset:
+        return None
+    if fields.flags & ~KEY_NODE_FLAGS_MASK or not MIN_FILETIME <= fields.last_modified < MAX_FILETIME:
+        return None
+    if fields.parent_key_offset >= hbins_data_size:
+        return None
+    # Deleted keys usually have their security key reference cleared
+    if not all(
+        _is_offset(cell_offset, hbins_data_size)
+        for cell_offset in (
+            fields.subkeys_list_offset,
+            fields.values_list_offset,
+            fields.security_key_offset,
+            fields.class_name_offset,
+        )
+    ):
+        return None
+    # The values list is read after its cell size
+    values_list_end = REGF_HEADER_SIZE + 4 + fields.values_list_offset + 4 * fields.values_count
+    if fields.values_count and values_list_end > len(buffer):
+        return None
+
+    key_name = bytes(buffer[offset + CM_KEY_NODE_SIZE : offset + CM_KEY_NODE_SIZE + fields.key_name_size])
+    if fields.flags & KEY_COMP_NAME:
+        return fields if b"\x00" not in key_name and b"\\" not in key_name else None
+
+    try:
+        key_name = key_name.decode("utf-16-le")
+    except UnicodeDecodeError:
+        return None
+    return fields if "\x00" not in key_name and "\\" not in key_name else None
+
+
+def validate_value_key(buffer, offset, end_offset, hbins_data_size) -> bool:
+    """
+    Check whether a carved VK record is consistent
+    :param buffer: The hive buffer
+    :param offset: The offset of the value key, at the "vk" signature
+    :param end_offset: The end of the space the record was carved from
+    :param hbins_data_size: The size of the hbins data, which bounds all the cell offsets
+    """
+    if offset + _VALUE_KEY.size > end_offset:
+        return False
+
+    _, name_size, data_size, data_offset, data_type, flags = _VALUE_KEY.unpack_from(buffer, offset)
+    if name_size > MAX_VALUE_NAME_SIZE or offset + _VALUE_KEY.size + name_size > end_offset:
+        return False
+    if flags & ~VALUE_KEY_FLAGS_MASK:
+        return False
+    if data_type not in _KNOWN_VALUE_TYPES and data_type <= 0xFFFF0000:
+        return False
+    if data_size & INLINE_DATA_FLAG:
+        return data_size - INLINE_DATA_FLAG <= 4
+    return not data_size or data_offset < hbins_data_size
+
+
+def validate_security_key(buffer, offset, end_offset, hbins_data_size) -> bool:
+    """
+    Check whether a carved SK record is consistent
+    :param buffer: The hive buffer
+    :param offset: The offset of the security key, at the "sk" signature
+    :param end_offset: The end of the space the record was carved from
+    :param hbins_data_size: The size of the hbins data, which bounds all the cell offsets
+    """
+    if offset + _KEY_SECURITY.size > end_offset:
+        return False
+
+    _, forward_link, backward_link, reference_count, descriptor_size = _KEY_SECURITY.unpack_from(buffer, offset)
+    if forward_link >= hbins_data_size or backward_link >= hbins_data_size:
+        return False
+    if descriptor_size < 20 or offset + _KEY_SECURITY.size + descriptor_size > end_offset:
+        return False
+    # The security descriptor revision
+    return buffer[offset + _KEY_SECURITY.size] == 1
+
+
+def _carve_space(buffer, start_offset, end_offset, source, hbins_data_size) -> Iterator[CarvedCell]:
+    """
+    Look for valid records in unallocated or slack space. Records start at cell boundaries, with a cell size
+    and then a signature.
+    """
+    for match in _SIGNATURES.finditer(buffer, start_offset + 4, end_offset):
+        signature_offset = match.start()
+        if (signature_offset - 4 - REGF_HEADER_SIZE) % CELL_ALIGNMENT:
+            continue
+
+        signature = match.group()
+        if signature == b"nk":
+            is_valid = validate_key_node(buffer, signature_offset + 2, end_offset, hbins_data_size) is not None
+        elif signature == b"vk":
+            is_valid = validate_value_key(buffer, signature_offset, end_offset, hbins_data_size)
+        else:
+            is_valid = validate_security_key(buffer, signature_offset, end_offset, hbins_data_size)
+
+        if is_valid:
+            yield CarvedCell(
+                offset=signature_offset + 2,
+                cell_type=signature.decode(),
+                size=end_offset - signature_offset + 4,
+                source=source,
+            )
+
+
+def _get_record_size(buffer, cell_offset, signature) -> Optional[int]:
+    """
+    Get the size of the record stored in an allocated cell, including the cell size, for the cell types that have
+    a known size. Whatever is left in the cell after the record is slack.
+    """
+    if signature == b"nk":
+        return _NK_RECORD_SIZE + _UINT16.unpack_from(buffer, cell_offset + _NK_NAME_SIZE_OFFSET)[0]
+    elif signature == b"vk":
+        return 4 + _VALUE_KEY.size + _UINT16.unpack_from(buffer, cell_offset + 6)[0]
+    elif signature == b"lf" or signature == b"lh":
+        return 8 + 8 * _UINT16.unpack_from(buffer, cell_offset + 6)[0]
+    elif signature == b"li" or signature == b"ri":
+        return 8 + 4 * _UINT16.unpack_from(buffer, cell_offset + 6)[0]
+    return None
+
+
+def iter_carved_cells(registry_hive: RegistryHive, key_nodes=None) -> Iterator[CarvedCell]:
+    """
+    Carve NK, VK and SK records from the unallocated cells and the slack space of the hive, in one forward pass
+    :param registry_hive: A RegistryHive object
+    :param key_nodes: If a dict is given, the offsets of the allocated key nodes met during the pass are added to it,
+                      mapped to NKRecord objects
+    :return: CarvedCell objects, in the order they are stored in
+    """
+    buffer = registry_hive._buffer
+    stream = registry_hive._stream
+    hbins_data_size = registry_hive.header.hive_bins_data_size
+    unpack_cell_size = _CELL_SIZE.unpack_from
+
+    for hbin_offset, hbin_size in iter_hbins(registry_hive):
+        offset = hbin_offset + _HBIN_HEADER_SIZE
+        hbin_end_offset = hbin_offset + hbin_size
+        while offset + 4 <= hbin_end_offset:
+            cell_size = unpack_cell_size(buffer, offset)[0]
+            if not cell_size or offset + abs(cell_size) > hbin_end_offset:
+                # The rest of the hbin cannot be parsed as cells, but it can still hold old records
+                yield from _carve_space(buffer, offset, hbin_end_offset, SLACK, hbins_data_size)
+                break
+
+            if cell_size > 0:
+                yield from _carve_space(buffer, offset, offset + cell_size, UNALLOCATED, hbins_data_size)
+                offset += cell_size
+                continue
+
+            cell_size = -cell_size
+            signature = bytes(buffer[offset + 4 : offset + 6])
+            if signature == b"nk" and key_nodes is not None:
+                key_nodes[offset + 6] = NKRecord(Cell(offset + 6, "nk", cell_size - 4), stream, buffer=buffer)
+
+            # Slack records start at a cell boundary as well, and need room for at least a VK record
+            if cell_size >= _MIN_SLACK_CELL_SIZE:
+                record_size = _get_record_size(buffer, offset, signature)
+                if record_size is not None:
+                    slack_offset = offset + -(-record_size // CELL_ALIGNMENT) * CELL_ALIGNMENT
+                    if slack_offset + _MIN_RECORD_SIZE <= offset + cell_size:
+                        yield from _carve_space(buffer, slack_offset, offset + cell_size, SLACK, hbins_data_size)
+            offset += cell_size
+
+
+def _resolve_key_path(offset, key_nodes, paths) -> Optional[str]:
+    """
+    Resolve the path of a key node by following its parents, and remember the paths on the way
+    """
+    chain = []
+    current = offset
+    while current not in paths:
+        if current not in key_nodes or current in chain:
+            # A missing parent, or a loop
+            break
+        chain.append(current)
+        current = REGF_HEADER_SIZE + key_nodes[current].fields.parent_key_offset + 6
+
+    path = paths.get(current)
+    for chain_offset in reversed(chain):
+        path = None if path is None else rf"{path}\{key_nodes[chain_offset].name}"
+        paths[chain_offset] = path
+    return path
+
+
+def _recover_value(nk_record, vk_offset, source, as_json, max_len, trim_values) -> Optional[RecoveredValue]:
+    """
+    Decode a carved or deleted VK record. nk_record is only used to read the data, so any key of the hive will do.
+    """
+    try:
+        vk = parse_value_key(nk_record._buffer, vk_offset)
+    except (ConstError, StreamError):
+        return None
+
+    data_type = get_value_type(vk, vk_offset)
+    if data_type is None:
+        return None
+
+    lazy_value = LazyValue(
+        nk_record=nk_record,
+        vk=vk,
+        offset=vk_offset,
+        name=get_value_name(vk),
+        value_type=data_type,
+        as_json=as_json,
+        max_len=max_len,
+        trim_values=trim_values,
+    )
+    try:
+        value, is_corrupted = lazy_value.value, lazy_value.is_corrupted
+    except (RegipyException, ConstError, StreamError, ValueError, UnicodeDecodeError) as ex:
+        # The data cell may have been reused since the value was deleted
+        logger.debug(f"Could not decode recovered value at {vk_offset}: {ex}")
+        value, is_corrupted = None, True
+
+    if is_corrupted:
+        value = None
+    elif as_json and isinstance(value, bytes):
+        value = binascii.b2a_hex(value).decode()
+
+    return RecoveredValue(
+        offset=vk_offset,
+        name=lazy_value.name,
+        value_type=str(data_type),
+        value=value,
+        size=lazy_value.size & ~INLINE_DATA_FLAG,
+        source=source,
+        is_corrupted=is_corrupted,
+    )
+
+
+def _iter_key_value_offsets(nk_record, carved_values) -> Iterator[int]:
+    """
+    Yield the offsets of the VK records in the values list of a recovered key, that were carved as well.
+    The values list is not validated otherwise, as it is usually freed with the key.
+    """
+    buffer = nk_record._buffer
+    values_list_offset = REGF_HEADER_SIZE + 4 + nk_record.fields.values_list_offset
+    for value_index in range(nk_record.values_count):
+        vk_offset = REGF_HEADER_SIZE + 4 + struct.unpack_from("<I", buffer, values_list_offset + value_index * 4)[0]
+        if vk_offset in carved_values:
+            yield vk_offset
+
+
+def _collect_carved_records(registry_hive: RegistryHive):
+    """
+    Carve the hive, and sort the records by type
+    :return: The live key nodes, the recovered key nodes with their source, the offsets of the carved VK records
+             mapped to their source, and the carved SK cells
+    """
+    live_key_nodes: dict[int, NKRecord] = {}
+    recovered_key_nodes = {}
+    carved_values = {}
+    security_key_cells = []
+    for carved_cell in iter_carved_cells(registry_hive, key_nodes=live_key_nodes):
+        if carved_cell.cell_type == "nk":
+            recovered_key_nodes[carved_cell.offset] = (
+                NKRecord(carved_cell, registry_hive._stream, buffer=registry_hive._buffer),
+                carved_cell.source,
+            )
+        elif carved_cell.cell_type == "vk":
+            # VK offsets point at the signature, like they do in the values lists
+            carved_values[carved_cell.offset - 2] = carved_cell.source
+        else:
+            security_key_cells.append(carved_cell)
+    return live_key_nodes, recovered_key_nodes, carved_values, security_key_cells
+
+
+def _iter_recovered_keys(
+    registry_hive,
+    live_key_nodes,
+    recovered_key_nodes,
+    carved_values,
+    attached_values,
+    as_json,
+    fetch_values,
+    max_len,
+    trim_values,
+) -> Iterator[RecoveredKey]:
+    """
+    Build the recovered keys one at a time, and add the offsets of the values attached to them to attached_values
+    """
+    # Resolve the paths through both live and recovered keys, so deleted subtrees keep their structure
+    key_nodes = {**live_key_nodes, **{offset: nk_record for offset, (nk_record, _) in recovered_key_nodes.items()}}
+    paths: dict[int, Optional[str]] = {registry_hive.root.offset: ""}
+
+    for offset, (nk_record, source) in recovered_key_nodes.items():
+        parent_offset = REGF_HEADER_SIZE + nk_record.fields.parent_key_offset + 6
+        recovered_key = RecoveredKey(
+            offset=offset,
+            subkey_name=nk_record.name,
+            timestamp=convert_wintime(nk_record.last_modified, as_json=as_json),
+            values_count=nk_record.values_count,
+            source=source,
+            path=_resolve_key_path(offset, key_nodes, paths),
+            parent_offset=parent_offset if parent_offset in key_nodes else None,
+            has_live_parent=parent_offset in live_key_nodes,
+        )
+
+        if recovered_key.values_count:
+            for vk_offset in _iter_key_value_offsets(nk_record, carved_values):
+                attached_values.add(vk_offset)
+                if fetch_values:
+                    value = _recover_value(nk_record, vk_offset, carved_values[vk_offset], as_json, max_len, trim_values)
+                    if value is not None:
+                        recovered_key.values.append(value)
+        yield recovered_key
+
+
+def carve_hive(
+    registry_hive: RegistryHive, as_json=False, fetch_values=True, max_len=MAX_LEN, trim_values=True
+) -> CarvingResult:
+    """
+    Recover deleted keys, values and security keys from the hive
+    :param registry_hive: A RegistryHive object
+    :param as_json: Whether to normalize the data as JSON or not
+    :param fetch_values: If False, values will not be decoded
+    :param max_len: Max length of value to return
+    :param trim_values: whether to trim values to MAX_LEN
+    :return: A CarvingResult. Values found in the values list of a recovered key are attached to that key.
+    """
+    live_key_nodes, recovered_key_nodes, carved_values, security_key_cells = _collect_carved_records(registry_hive)
+
+    result = CarvingResult()
+    for carved_cell in security_key_cells:
+        _, _, _, reference_count, descriptor_size = _KEY_SECURITY.unpack_from(registry_hive._buffer, carved_cell.offset - 2)
+        descriptor_offset = carved_cell.offset - 2 + _KEY_SECURITY.size
+        security_descriptor = bytes(registry_hive._buffer[descriptor_offset : descriptor_offset + descriptor_size])
+        result.security_keys.append(
+            RecoveredSecurityKey(
+                offset=carved_cell.offset,
+                reference_count=reference_count,
+                security_descriptor=(binascii.b2a_hex(security_descriptor).decode() if as_json else security_descriptor),
+                source=carved_cell.source,
+            )
+        )
+
+    attached_values: set[int] = set()
+    result.keys.extend(
+        _iter_recovered_keys(
+            registry_hive,
+            live_key_nodes,
+            recovered_key_nodes,
+            carved_values,
+            attached_values,
+            as_json,
+            fetch_values,
+            max_len,
+            trim_values,
+        )
+    )
+
+    if fetch_values:
+        for vk_offset, source in carved_values.items():
+            if vk_offset in attached_values:
+                continue
+            value = _recover_value(registry_hive.root, vk_offset, source, as_json, max_len, trim_values)
+            if value is not None:
+                result.values.append(value)
+    return result
+
+
+def iter_recovered_keys(
+    registry_hive: RegistryHive, as_json=False, fetch_values=True, max_len=MAX_LEN, trim_values=True
+) -> Iterator[RecoveredKey]:
+    """
+    Iterate over the deleted keys of the hive, with the values that could be recovered for them.
+    This is separate from RegistryHive.recurse_subkeys(), which only yields the keys that are still allocated.
+    The parent and the values of a deleted key can be stored anywhere in the hive, so the hive is carved in one pass
+    before the first key is yielded. The keys and their values are then decoded one at a time, and the security keys
+    and the values that do not belong to a recovered key are skipped.
+    :param registry_hive: A RegistryHive object
+    :param as_json: Whether to normalize the data as JSON or not
+    :param fetch_values: If False, values will not be decoded
+    :param max_len: Max length of value to return
+    :param trim_values: whether to trim values to MAX_LEN
+    """
+    live_key_nodes, recovered_key_nodes, carved_values, _ = _collect_carved_records(registry_hive)
+    yield from _iter_recovered_keys(
+        registry_hive,
+        live_key_nodes,
+        recovered_key_nodes,
+        carved_values,
+        set(),
+        as_json,
+        fetch_values,
+        max_len,
+        trim_values,
+    )
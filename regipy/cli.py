@@ -3,19 +3,23 @@ import json
 import logging
 import os
 import time
+from collections import Counter
 from dataclasses import asdict
 
 import click
 from tabulate import tabulate
 
-from regipy.cli_utils import _normalize_subkey_fields, get_filtered_subkeys
+from regipy.batch import FAILED, TIMEOUT, run_plugins_on_directory
+from regipy.cli_utils import get_filtered_subkeys
+from regipy.columnar import OUTPUT_FORMATS, PARQUET_FORMAT, dump_hive_to_arrow
 from regipy.exceptions import RegistryKeyNotFoundException
 from regipy.plugins.plugin import PLUGINS
-from regipy.plugins.utils import run_relevant_plugins
+from regipy.plugins.utils import dump_hive_to_json, run_relevant_plugins
 from regipy.recovery import apply_transaction_logs
-from regipy.regdiff import compare_hives
+from regipy.regdiff import compare_snapshots, iter_hive_differences
 from regipy.registry import RegistryHive
-from regipy.utils import _setup_logging, calculate_xor32_checksum
+from regipy.serialization import SERIALIZERS, WRITE_BUFFER_SIZE, get_serializer, subkey_to_dict, write_json_lines
+from regipy.utils import TIMESTAMP_BATCH_SIZE, _setup_logging, calculate_xor32_checksum
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +40,7 @@ def parse_header(hive_path, verbose):
     if registry_hive.header.primary_sequence_num != registry_hive.header.secondary_sequence_num:
         click.secho("Hive is not clean! You should apply transaction logs", fg="red")
 
-    calculated_checksum = calculate_xor32_checksum(registry_hive._stream.read(508))
+    calculated_checksum = calculate_xor32_checksum(bytes(registry_hive._buffer[:508]))
     if registry_hive.header.checksum != calculated_checksum:
         click.secho("Hive is not clean! Header checksum does not match", fg="red")
 
@@ -98,6 +102,20 @@ def parse_header(hive_path, verbose):
     required=False,
     help='If "-e" was specified, fetch only values for subkeys until this timestamp in isoformat',
 )
+@click.option(
+    "-w",
+    "--workers",
+    type=click.INT,
+    default=1,
+    help="Dump the hive using this many processes. Only supported for JSON output to a file, without a date range",
+)
+@click.option(
+    "--serializer",
+    "serializer_name",
+    type=click.Choice(sorted(SERIALIZERS)),
+    required=False,
+    help="The JSON serializer to use. By default orjson if it is installed, and the json module if not",
+)
 def registry_dump(
     hive_path,
     output_path,
@@ -109,9 +127,12 @@ def registry_dump(
     do_not_fetch_values,
     start_date,
     end_date,
+    workers,
+    serializer_name,
 ):
     _setup_logging(verbose=verbose)
     registry_hive = RegistryHive(hive_path, hive_type=hive_type, partial_hive_path=partial_hive_path)
+    serializer = get_serializer(serializer_name)
 
     start_time = time.monotonic()
 
@@ -128,9 +149,32 @@ def registry_dump(
         click.secho("You must provide an output path if choosing timeline output!", fg="red")
         return
 
+    if output_path and not (timeline or start_date or end_date):
+        # The entries are built the same way with any number of workers
+        subkey_count = dump_hive_to_json(
+            registry_hive,
+            output_path,
+            name_key_entry,
+            fetch_values=not do_not_fetch_values,
+            workers=workers,
+            serializer=serializer,
+        )
+        click.secho(f"Completed in {time.monotonic() - start_time}s ({subkey_count} subkeys enumerated)")
+        return
+
+    if workers > 1:
+        click.secho("Multiple workers are only supported for JSON output to a file, without a date range", fg="yellow")
+
     if output_path:
-        with open(output_path, "w") as output_file:
-            if timeline:
+        entries = get_filtered_subkeys(
+            registry_hive,
+            name_key_entry,
+            fetch_values=not do_not_fetch_values,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        if timeline:
+            with open(output_path, "w", buffering=WRITE_BUFFER_SIZE) as output_file:
                 csvwriter = csv.DictWriter(
                     output_file,
                     delimiter=",",
@@ -139,17 +183,7 @@ def registry_dump(
                     fieldnames=["timestamp", "subkey_name", "values_count", "values"],
                 )
                 csvwriter.writeheader()
-
-            for subkey_count, entry in enumerate(
-                get_filtered_subkeys(
-                    registry_hive,
-                    name_key_entry,
-                    fetch_values=not do_not_fetch_values,
-                    start_date=start_date,
-                    end_date=end_date,
-                )
-            ):
-                if timeline:
+                for subkey_count, entry in enumerate(entries):
                     csvwriter.writerow(
                         {
                             "subkey_name": entry.path,
@@ -158,29 +192,80 @@ def registry_dump(
                             "values": entry.values,
                         }
                     )
-                else:
-                    output_file.write(
-                        json.dumps(
-                            asdict(
-                                entry,
-                            ),
-                            separators=(
-                                ",",
-                                ":",
-                            ),
-                            default=_normalize_subkey_fields,
-                        )
-                    )
-                    output_file.write("\n")
+        else:
+            with open(output_path, "wb", buffering=WRITE_BUFFER_SIZE) as output_file:
+                # The index of the last entry is reported, as it always was
+                subkey_count = write_json_lines(output_file, entries, serializer=serializer) - 1
     else:
         for subkey_count, entry in enumerate(
-            registry_hive.recurse_subkeys(name_key_entry, as_json=True, fetch_values=not do_not_fetch_values)
+            registry_hive.recurse_subkeys(
+                name_key_entry,
+                as_json=True,
+                fetch_values=not do_not_fetch_values,
+                timestamp_batch_size=TIMESTAMP_BATCH_SIZE,
+            )
         ):
-            click.secho(json.dumps(asdict(entry), indent=4))
+            click.secho(json.dumps(subkey_to_dict(entry), indent=4))
 
     click.secho(f"Completed in {time.monotonic() - start_time}s ({subkey_count} subkeys enumerated)")
 
 
+@click.command()
+@click.argument(
+    "hive_path",
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+    required=True,
+)
+@click.option(
+    "-o",
+    "output_path",
+    type=click.Path(exists=False, dir_okay=False, resolve_path=True),
+    required=True,
+)
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default=PARQUET_FORMAT,
+    help="Write a Parquet file, or an Arrow IPC file",
+)
+@click.option("-p", "--registry-path", help="A registry path to start iterating from")
+@click.option(
+    "-l",
+    "--hive-type",
+    type=click.STRING,
+    required=False,
+    help="Specify a hive type, if it could not be identified for some reason",
+)
+@click.option(
+    "--no-raw-data",
+    is_flag=True,
+    default=False,
+    help="Do not export the raw data of the values, only their decoded data",
+)
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Verbosity")
+def registry_export(hive_path, output_path, output_format, registry_path, hive_type, no_raw_data, verbose):
+    _setup_logging(verbose=verbose)
+    registry_hive = RegistryHive(hive_path, hive_type=hive_type)
+
+    start_time = time.monotonic()
+
+    if registry_path:
+        try:
+            name_key_entry = registry_hive.get_key(registry_path)
+        except RegistryKeyNotFoundException as ex:
+            logger.debug(f"Did not find the key: {ex}")
+            return
+    else:
+        name_key_entry = registry_hive.root
+
+    rows_count = dump_hive_to_arrow(
+        registry_hive, output_path, name_key_entry, output_format=output_format, fetch_raw_data=not no_raw_data
+    )
+    click.secho(f"Completed in {time.monotonic() - start_time}s ({rows_count} rows written)")
+
+
 @click.command()
 @click.argument(
     "hive_path",
@@ -270,6 +355,98 @@ def run_plugins(hive_path, output_path, plugins, hive_type, partial_hive_path, v
     )
 
 
+@click.command()
+@click.argument(
+    "hives_directory",
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    required=True,
+)
+@click.option(
+    "-o",
+    "output_directory",
+    type=click.Path(exists=False, file_okay=False, resolve_path=True),
+    required=True,
+    help="Output directory for the plugins results of every hive, and the manifest of the batch",
+)
+@click.option(
+    "-p",
+    "--plugins",
+    type=click.STRING,
+    required=False,
+    help="A plugin or list of plugins to execute command separated",
+)
+@click.option("-w", "--workers", type=click.INT, required=False, help="The number of processes, by default the number of CPUs")
+@click.option("--timeout", type=click.FLOAT, required=False, help="Stop processing a hive after this many seconds")
+@click.option(
+    "--memory-limit",
+    type=click.INT,
+    required=False,
+    help="Limit the memory of every process to this many MiB. Not supported on Windows",
+)
+@click.option(
+    "-m",
+    "--manifest",
+    "manifest_path",
+    type=click.Path(dir_okay=False, resolve_path=True),
+    required=False,
+    help="The manifest to resume from and record to, by default manifest.jsonl in the output directory",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Process again the hives that failed or timed out in a previous run",
+)
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Verbosity")
+@click.option(
+    "--include-unvalidated",
+    is_flag=True,
+    default=False,
+    help="Include plugins that don't have validation test cases. "
+    "These plugins may return incomplete or inaccurate data. Use at your own risk.",
+)
+def run_plugins_batch(
+    hives_directory,
+    output_directory,
+    plugins,
+    workers,
+    timeout,
+    memory_limit,
+    manifest_path,
+    retry_failed,
+    verbose,
+    include_unvalidated,
+):
+    _setup_logging(verbose=verbose)
+
+    if plugins:
+        plugins = set(plugins.split(","))
+        invalid_plugins = plugins - {x.NAME for x in PLUGINS}
+        if invalid_plugins:
+            click.secho(f"Invalid plugin names given: {','.join(invalid_plugins)}", fg="red")
+            return
+
+    start_time = time.monotonic()
+    results = run_plugins_on_directory(
+        hives_directory,
+        output_directory,
+        workers=workers,
+        timeout=timeout,
+        memory_limit=memory_limit * 1024**2 if memory_limit else None,
+        manifest_path=manifest_path,
+        plugins=plugins,
+        include_unvalidated=include_unvalidated,
+        retry_failed=retry_failed,
+    )
+
+    statuses = Counter(result.status for result in results)
+    click.secho(
+        f"Processed {len(results)} files in {time.monotonic() - start_time:.2f}s: "
+        + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())),
+        fg="red" if statuses[FAILED] or statuses[TIMEOUT] else "green",
+    )
+
+
 @click.command()
 def list_plugins():
     click.secho(
@@ -297,23 +474,109 @@ def list_plugins():
     type=click.Path(exists=False, dir_okay=False, resolve_path=True),
     required=False,
 )
+@click.option(
+    "-d",
+    "--detailed",
+    is_flag=True,
+    default=False,
+    help="Compare the values of all the keys, and report deleted and modified values and deleted subkeys",
+)
+@click.option(
+    "-i",
+    "index_path",
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    required=False,
+    help="A directory of hive indexes. Missing indexes are built, and identical subtrees are skipped with their digests",
+)
 @click.option("-v", "--verbose", is_flag=True, default=False, help="Verbosity")
-def reg_diff(first_hive_path, second_hive_path, output_path, verbose):
+def reg_diff(first_hive_path, second_hive_path, output_path, detailed, index_path, verbose):
     _setup_logging(verbose=verbose)
     REGDIFF_HEADERS = ["difference", "first_hive", "second_hive", "description"]
 
-    found_differences = compare_hives(first_hive_path, second_hive_path, verbose=verbose)
     click.secho(f"Comparing {os.path.basename(first_hive_path)} vs {os.path.basename(second_hive_path)}")
+    differences = iter_hive_differences(first_hive_path, second_hive_path, detailed=detailed, index_path=index_path)
 
     if output_path:
+        # The differences are written as they are found
+        differences_count = 0
         with open(output_path, "w") as csvfile:
             csvwriter = csv.writer(csvfile, delimiter="|", quoting=csv.QUOTE_MINIMAL)
             csvwriter.writerow(REGDIFF_HEADERS)
-            for difference in found_differences:
+            for difference in differences:
                 csvwriter.writerow(difference)
+                differences_count += 1
     else:
+        found_differences = list(differences)
+        differences_count = len(found_differences)
         click.secho(tabulate(found_differences, headers=REGDIFF_HEADERS, tablefmt="fancy_grid"))
-    click.secho(f"Detected {len(found_differences)} differences", fg="green")
+    click.secho(f"Detected {differences_count} differences", fg="green")
+
+
+@click.command()
+@click.argument(
+    "hive_paths",
+    nargs=-1,
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+    required=True,
+)
+@click.option(
+    "-o",
+    "output_path",
+    type=click.Path(exists=False, dir_okay=False, resolve_path=True),
+    required=False,
+    help="Write the history of every changed key as JSON lines",
+)
+@click.option(
+    "-d",
+    "--detailed",
+    is_flag=True,
+    default=False,
+    help="Compare the values of all the keys, and not only of the keys whose timestamps changed",
+)
+@click.option(
+    "-i",
+    "index_path",
+    type=click.Path(exists=True, file_okay=False, resolve_path=True),
+    required=False,
+    help="A directory of hive indexes. Missing indexes are built, and unchanged subtrees are skipped with their digests",
+)
+@click.option("-v", "--verbose", is_flag=True, default=False, help="Verbosity")
+def reg_diff_snapshots(hive_paths, output_path, detailed, index_path, verbose):
+    _setup_logging(verbose=verbose)
+    if len(hive_paths) < 2:
+        raise click.UsageError("At least two snapshots are required")
+
+    click.secho("Comparing snapshots, from the oldest to the newest:")
+    for snapshot_index, hive_path in enumerate(hive_paths):
+        click.secho(f"{snapshot_index}: {hive_path}")
+
+    key_histories = compare_snapshots(hive_paths, detailed=detailed, index_path=index_path)
+    keys_count = 0
+    if output_path:
+        # The histories are written as they are found
+        with open(output_path, "w") as f:
+            for key_history in key_histories:
+                f.write(json.dumps(asdict(key_history)) + "\n")
+                keys_count += 1
+    else:
+        rows = []
+        for key_history in key_histories:
+            keys_count += 1
+            for key_change in key_history.changes:
+                values = [
+                    f"{description}: {', '.join(value_names)}"
+                    for description, value_names in [
+                        ("new", key_change.new_values),
+                        ("deleted", key_change.deleted_values),
+                        ("modified", key_change.modified_values),
+                    ]
+                    if value_names
+                ]
+                rows.append(
+                    (key_history.path, key_change.snapshot_index, key_change.change, key_change.timestamp, "\n".join(values))
+                )
+        click.secho(tabulate(rows, headers=["path", "snapshot", "change", "timestamp", "values"], tablefmt="fancy_grid"))
+    click.secho(f"Detected changes in {keys_count} keys", fg="green")
 
 
 @click.command()
@@ -1,4 +1,3 @@
-import binascii
 import datetime as dt
 import logging
 from collections.abc import Iterator
@@ -7,11 +6,32 @@ import pytz
 from click import progressbar
 
 from regipy import NKRecord, RegistryHive, Subkey
-from regipy.utils import MAX_LEN
+from regipy.utils import TIMESTAMP_BATCH_SIZE, batched, convert_datetime_to_filetime, convert_wintime, convert_wintimes
+
+# Bigger than any FILETIME
+MAX_FILETIME = 2**64
 
 logger = logging.getLogger(__name__)
 
 
+def _get_first_filetime_at(date: dt.datetime) -> int:
+    """
+    Get the first FILETIME that convert_wintime() converts to this date or later.
+    The conversion goes through a float, so FILETIMEs may be rounded to a microsecond or two around the exact value.
+    """
+    if date.tzinfo is None:
+        date = pytz.utc.localize(date)
+    exact_filetime = convert_datetime_to_filetime(date)
+    low, high = exact_filetime - 100, exact_filetime + 100
+    while low < high:
+        middle = (low + high) // 2
+        if convert_wintime(middle) < date:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
 def get_filtered_subkeys(
     registry_hive: RegistryHive,
     name_key_entry: NKRecord,
@@ -29,39 +49,24 @@ def get_filtered_subkeys(
     :param end_date: Include only subkeys modified before the specified date
                      in isoformat UTC, for example: 2020-02-20T14:15:00.000000
     """
-    skipped_entries_count = 0
-    if start_date:
-        start_date = pytz.utc.localize(dt.datetime.fromisoformat(start_date))
-
-    if end_date:
-        end_date = pytz.utc.localize(dt.datetime.fromisoformat(end_date))
-
-    with progressbar(registry_hive.recurse_subkeys(name_key_entry, fetch_values=False)) as reg_subkeys:
-        for subkey_count, subkey in enumerate(reg_subkeys):
-            if start_date and subkey.timestamp < start_date:
-                skipped_entries_count += 1
-                logger.debug(f"Skipping entry {subkey} which has a timestamp prior to start_date")
-                continue
-
-            if end_date and subkey.timestamp > end_date:
-                skipped_entries_count += 1
-                logger.debug(f"Skipping entry {subkey} which has a timestamp after the end_date")
-                continue
-
-            nk = registry_hive.get_key(subkey.path)
-            yield Subkey(
-                subkey_name=subkey.subkey_name,
-                path=subkey.path,
-                timestamp=subkey.timestamp,
-                values=list(nk.iter_values(as_json=True)) if fetch_values else [],
-                values_count=subkey.values_count,
-            )
-        logger.info(f"{skipped_entries_count} out of {subkey_count} subkeys were filtered out due to timestamp constrains")
-
+    # The dates are converted once to FILETIME bounds, which are compared with the timestamps as they are stored
+    start = _get_first_filetime_at(dt.datetime.fromisoformat(start_date)) if start_date else 0
+    # The end date is included
+    end = (
+        _get_first_filetime_at(dt.datetime.fromisoformat(end_date) + dt.timedelta(microseconds=1)) if end_date else MAX_FILETIME
+    )
 
-def _normalize_subkey_fields(field) -> str:
-    if isinstance(field, bytes):
-        return binascii.b2a_hex(field[:MAX_LEN])
-    elif isinstance(field, dt.datetime):
-        return field.isoformat()
-    return field
+    subkey_count = 0
+    with progressbar(registry_hive.iter_key_nodes_modified_between(start, end, nk_record=name_key_entry)) as reg_subkeys:
+        for keys in batched(reg_subkeys, TIMESTAMP_BATCH_SIZE):
+            timestamps = convert_wintimes(nk.last_modified for nk, _, _ in keys)
+            for (nk, subkey_path, _), timestamp in zip(keys, timestamps):
+                yield Subkey(
+                    subkey_name=nk.name,
+                    path=subkey_path or "\\",
+                    timestamp=timestamp,
+                    values=list(nk.iter_values(as_json=True)) if fetch_values and nk.values_count else [],
+                    values_count=nk.values_count,
+                )
+            subkey_count += len(keys)
+        logger.info(f"{subkey_count} subkeys were modified in the date range")
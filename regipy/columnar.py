@@ -0,0 +1,176 @@
+"""
+Export the keys and values of a hive as a table, to Parquet or Arrow IPC files.
+
+Every value is a row, with the path and the last modification time of its key. Keys without values are a row too,
+with no value columns, so every key is in the table. Rows are written in record batches, so memory use is bounded
+by the size of a batch and not of the hive. Requires pyarrow.
+"""
+
+import binascii
+import json
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Optional
+
+from construct import ConstError, StreamError
+
+from regipy.exceptions import RegipyGeneralException, RegistryParsingException
+from regipy.registry import NKRecord, RegistryHive
+from regipy.utils import convert_wintimes
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ModuleNotFoundError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_FORMAT = "parquet"
+ARROW_FORMAT = "arrow"
+OUTPUT_FORMATS = (PARQUET_FORMAT, ARROW_FORMAT)
+
+# A record batch is written when it has this many rows, or this many bytes of raw data
+RECORD_BATCH_SIZE = 64 * 1024
+RECORD_BATCH_MAX_DATA_SIZE = 64 * 1024**2
+
+COLUMNS = ("path", "timestamp", "value_name", "value_type", "value", "raw_data")
+
+
+@dataclass
+class KeyValueRow:
+    path: str
+    timestamp: int
+    value_name: Optional[str] = None
+    value_type: Optional[str] = None
+    value: Optional[str] = None
+    raw_data: Optional[bytes] = None
+
+
+def get_arrow_schema():
+    """
+    The schema of the exported table
+    """
+    return pyarrow.schema(
+        [
+            ("path", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("us", tz="UTC")),
+            ("value_name", pyarrow.string()),
+            ("value_type", pyarrow.string()),
+            ("value", pyarrow.string()),
+            ("raw_data", pyarrow.binary()),
+        ]
+    )
+
+
+def _value_to_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return binascii.b2a_hex(value).decode()
+    if isinstance(value, list):
+        return json.dumps(value)
+    return str(value)
+
+
+def _iter_key_nodes(registry_hive: RegistryHive, nk_record: NKRecord) -> Iterator[tuple[NKRecord, str]]:
+    # In the order of recurse_subkeys(): every key after its subkeys, and the key we started from last
+    for subkey, subkey_path, _ in registry_hive._walk_subkeys_depth_first(nk_record, None):
+        yield subkey, subkey_path
+    yield nk_record, "\\"
+
+
+def iter_key_value_rows(registry_hive: RegistryHive, nk_record=None, fetch_raw_data=True) -> Iterator[KeyValueRow]:
+    """
+    Iterate over the rows of the exported table, in the order of recurse_subkeys()
+    :param registry_hive: A RegistryHive object
+    :param nk_record: The key to start from, by default the root key
+    :param fetch_raw_data: If False, the raw_data column is empty
+    :return: KeyValueRow objects. The timestamp is the FILETIME of the key, as it is stored.
+    """
+    nk_record = nk_record or registry_hive.root
+    for key_node, path in _iter_key_nodes(registry_hive, nk_record):
+        last_modified = key_node.last_modified
+        if not key_node.values_count:
+            yield KeyValueRow(path=path, timestamp=last_modified)
+            continue
+
+        try:
+            for lazy_value in key_node.iter_lazy_values(as_json=True, trim_values=False):
+                try:
+                    raw_data = lazy_value.raw_data if fetch_raw_data else None
+                except (ConstError, StreamError) as ex:
+                    logger.error(f"Could not read the data of {lazy_value.name} at {path}: {ex}")
+                    raw_data = None
+                yield KeyValueRow(
+                    path=path,
+                    timestamp=last_modified,
+                    value_name=lazy_value.name,
+                    value_type=lazy_value.value_type,
+                    value=None if lazy_value.is_corrupted else _value_to_text(lazy_value.value),
+                    raw_data=raw_data,
+                )
+        except RegistryParsingException as ex:
+            logger.error(f"Could not parse the values of {path}: {ex}")
+
+
+def _iter_record_batches(rows: Iterator[KeyValueRow], schema, batch_size: int) -> Iterator:
+    columns = {name: [] for name in COLUMNS}
+    data_size = 0
+    for row in rows:
+        for name in COLUMNS:
+            columns[name].append(getattr(row, name))
+        data_size += len(row.raw_data or b"")
+        if len(columns["path"]) >= batch_size or data_size >= RECORD_BATCH_MAX_DATA_SIZE:
+            yield _build_record_batch(columns, schema)
+            columns = {name: [] for name in COLUMNS}
+            data_size = 0
+    if columns["path"]:
+        yield _build_record_batch(columns, schema)
+
+
+def _build_record_batch(columns, schema):
+    columns["timestamp"] = convert_wintimes(columns["timestamp"])
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(columns[name], type=schema.field(name).type) for name in COLUMNS], schema=schema
+    )
+
+
+def dump_hive_to_arrow(
+    registry_hive: RegistryHive,
+    output_path,
+    name_key_entry: Optional[NKRecord] = None,
+    output_format: str = PARQUET_FORMAT,
+    fetch_raw_data=True,
+    batch_size: int = RECORD_BATCH_SIZE,
+) -> int:
+    """
+    Write the keys and values of the hive to a Parquet or Arrow IPC file, one row per value
+    :param registry_hive: a RegistryHive object
+    :param output_path: Output path to save the table
+    :param name_key_entry: The NKRecord to start iterating from, by default the root key
+    :param output_format: One of OUTPUT_FORMATS
+    :param fetch_raw_data: If False, the raw_data column is empty, which makes the file much smaller
+    :param batch_size: The number of rows of every record batch
+    :return: The number of rows written
+    """
+    if pyarrow is None:
+        raise RegipyGeneralException("pyarrow is required to export to Parquet or Arrow, install regipy[arrow]")
+    if output_format not in OUTPUT_FORMATS:
+        raise RegipyGeneralException(f"Unknown output format {output_format}, expected one of {', '.join(OUTPUT_FORMATS)}")
+
+    schema = get_arrow_schema()
+    rows = iter_key_value_rows(registry_hive, name_key_entry, fetch_raw_data=fetch_raw_data)
+    if output_format == PARQUET_FORMAT:
+        writer = pyarrow.parquet.ParquetWriter(output_path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(output_path, schema)
+
+    rows_count = 0
+    with writer:
+        for record_batch in _iter_record_batches(rows, schema, batch_size):
+            writer.write_batch(record_batch)
+            rows_count += record_batch.num_rows
+    return rows_count
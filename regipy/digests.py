@@ -0,0 +1,168 @@
+"""
+Digests of the keys and of the subtrees of a hive, to find identical parts of two hives without decoding them.
+
+The key digest of a key is a hash of the names, types and raw data of its values. The subtree digest of a key is a
+hash of its timestamp, its key digest, and the names and subtree digests of its subkeys, so two keys have the same
+subtree digest only if all the keys under them have the same names, timestamps and values. The name of a key is
+part of the subtree digest of its parent, so the root keys of two hives can have the same digest even if their
+names differ.
+
+A digest is None if a part of what it covers could not be read, and a None digest is never equal to another digest.
+"""
+
+import hashlib
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Optional
+
+from construct import ConstError, StreamError
+
+from regipy.exceptions import RegipyException
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 16
+
+
+@dataclass(frozen=True)
+class KeyDigests:
+    key_digest: Optional[bytes]
+    subtree_digest: Optional[bytes]
+
+
+def _hash_name(digest, name: str):
+    # Names are prefixed with their length, so the boundaries between the hashed fields are unambiguous
+    encoded_name = name.encode("utf-8", errors="surrogatepass")
+    digest.update(len(encoded_name).to_bytes(4, "little"))
+    digest.update(encoded_name)
+
+
+def get_value_digest(lazy_value) -> Optional[bytes]:
+    """
+    A hash of the type and the raw data of a value
+    :param lazy_value: A LazyValue
+    :return: The digest, or None if the data could not be read
+    """
+    try:
+        raw_data = lazy_value.raw_data
+    except (ConstError, StreamError):
+        return None
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    _hash_name(digest, str(lazy_value.value_type))
+    digest.update(raw_data)
+    return digest.digest()
+
+
+def get_key_digest(lazy_values) -> Optional[bytes]:
+    """
+    A hash of the values of a key, in the order they are stored
+    :param lazy_values: The LazyValue objects of the key, as NKRecord.iter_lazy_values() yields them
+    :return: The digest, or None if the data of a value could not be read
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for lazy_value in lazy_values:
+        value_digest = get_value_digest(lazy_value)
+        if value_digest is None:
+            return None
+        _hash_name(digest, lazy_value.name)
+        digest.update(value_digest)
+    return digest.digest()
+
+
+def get_subtree_digest(
+    last_modified: int, key_digest: Optional[bytes], subkey_digests: list[tuple[str, Optional[bytes]]]
+) -> Optional[bytes]:
+    """
+    Combine the digests of a key and of its subkeys
+    :param last_modified: The FILETIME of the key, as it is stored
+    :param key_digest: The key digest of the key
+    :param subkey_digests: (name, subtree digest) tuples of the subkeys, in any order
+    :return: The subtree digest, or None if one of the digests is None
+    """
+    if key_digest is None or any(subtree_digest is None for _, subtree_digest in subkey_digests):
+        return None
+
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(last_modified.to_bytes(8, "little"))
+    digest.update(key_digest)
+    for name, subtree_digest in sorted(subkey_digests, key=lambda entry: (entry[0].upper(), entry[0])):
+        _hash_name(digest, name)
+        digest.update(subtree_digest)
+    return digest.digest()
+
+
+def get_nk_record_key_digest(nk_record) -> Optional[bytes]:
+    """
+    The key digest of an NKRecord, or None if its values could not be parsed
+    """
+    try:
+        return get_key_digest(nk_record.iter_lazy_values())
+    except RegipyException as ex:
+        logger.error(f"Could not hash the values of the key at {nk_record.offset}: {ex}")
+        return None
+
+
+class SubtreeDigestBuilder:
+    def __init__(self):
+        """
+        Computes subtree digests from keys that are added after all of their subkeys, as iter_key_paths() walks them.
+        Only the digests of the subkeys of keys that were not added yet are kept.
+        """
+        self._subkey_digests: dict[int, list[tuple[str, Optional[bytes]]]] = {}
+
+    def add(self, nk_record, key_digest: Optional[bytes], parent_offset: Optional[int]) -> Optional[bytes]:
+        """
+        Add a key, after all of its subkeys
+        :param nk_record: The NKRecord of the key
+        :param key_digest: Its key digest
+        :param parent_offset: The offset of its parent, None for the key the walk started from
+        :return: The subtree digest of the key
+        """
+        subkey_digests = self._subkey_digests.pop(nk_record.offset, [])
+
+        # A subkey that could not be parsed, or that was already walked from another key, is missing
+        if len(subkey_digests) == nk_record.subkey_count:
+            subtree_digest = get_subtree_digest(nk_record.last_modified, key_digest, subkey_digests)
+        else:
+            subtree_digest = None
+
+        if parent_offset is not None:
+            self._subkey_digests.setdefault(parent_offset, []).append((nk_record.name, subtree_digest))
+        return subtree_digest
+
+
+def _list_subkeys(nk_record) -> list:
+    try:
+        return list(nk_record.iter_subkeys() or [])
+    except (RegipyException, ConstError, StreamError) as ex:
+        logger.error(f"Could not parse the subkeys of the key at {nk_record.offset}: {ex}")
+        return []
+
+
+def iter_subtree_digests(nk_record) -> Iterator[tuple[int, KeyDigests]]:
+    """
+    Compute the digests of a key and of all the keys under it
+    :param nk_record: The NKRecord to start from
+    :return: (offset, KeyDigests) tuples, every key after its subkeys and nk_record last
+    """
+    builder = SubtreeDigestBuilder()
+
+    # Corrupted hives may link a key from several places, or in a loop
+    visited = {nk_record.offset}
+
+    # Every frame holds the subkeys left to walk of a key, the key itself and the offset of its parent
+    stack = [(iter(_list_subkeys(nk_record)), nk_record, None)]
+    while stack:
+        subkeys, parent, grandparent_offset = stack[-1]
+        subkey = next(subkeys, None)
+        if subkey is None:
+            stack.pop()
+            key_digest = get_nk_record_key_digest(parent)
+            yield parent.offset, KeyDigests(key_digest, builder.add(parent, key_digest, grandparent_offset))
+            continue
+
+        if subkey.offset in visited:
+            continue
+        visited.add(subkey.offset)
+        stack.append((iter(_list_subkeys(subkey)), subkey, parent.offset))
@@ -0,0 +1,186 @@
+"""
+Decoders for the cells that are parsed the most while traversing a hive (NK, VK and subkey lists),
+based on precompiled struct.Struct objects that unpack directly from a shared buffer.
+
+The construct definitions in regipy.structs remain the reference implementation: the NK and VK decoders
+return the same containers, and raise the same exceptions, as parsing with those definitions would.
+Offsets are absolute offsets in the hive buffer, pointing at the same place a stream would be at before
+calling parse_stream() with the matching construct definition.
+"""
+
+import struct
+from typing import NamedTuple
+
+from construct import ConstError, Container, StreamError
+
+from regipy.structs import (
+    KEY_NODE_FLAGS,
+    VALUE_KEY_FLAGS,
+    VALUE_KEY_SIGNATURE,
+    VALUE_TYPE_ENUM,
+)
+
+_CELL_SIZE = struct.Struct("<i")
+_UINT32 = struct.Struct("<I")
+_ELEMENT_COUNT = struct.Struct("<H")
+
+_CM_KEY_NODE = struct.Struct("<HQ4s13I4xHH")
+_VALUE_KEY = struct.Struct("<2sHIIIH2x")
+
+_LF_LH_ELEMENT = struct.Struct("<II")
+_INDEX_ELEMENT = struct.Struct("<I")
+
+
+class KeyNodeFields(NamedTuple):
+    """
+    The fixed size part of CM_KEY_NODE, as unpacked from the hive. Flags are kept as an integer.
+    """
+
+    flags: int
+    last_modified: int
+    access_bits: bytes
+    parent_key_offset: int
+    subkey_count: int
+    volatile_subkey_count: int
+    subkeys_list_offset: int
+    volatile_subkeys_list_offset: int
+    values_count: int
+    values_list_offset: int
+    security_key_offset: int
+    class_name_offset: int
+    largest_sk_name: int
+    largest_sk_class_name: int
+    largest_value_name: int
+    largest_value_data: int
+    key_name_size: int
+    class_name_size: int
+
+
+def _unpack_from(compiled_struct, buffer, offset):
+    try:
+        return compiled_struct.unpack_from(buffer, offset)
+    except struct.error as ex:
+        raise StreamError(f"Could not read {compiled_struct.size} bytes at offset {offset}: {ex}")
+
+
+def _read_bytes(buffer, offset, size):
+    data = bytes(buffer[offset : offset + size])
+    if len(data) != size:
+        raise StreamError(f"Could not read {size} bytes at offset {offset}, only {len(data)} available")
+    return data
+
+
+def parse_cell_size(buffer, offset) -> int:
+    """
+    Parse the size of a cell. Negative sizes mean the cell is allocated.
+    :param buffer: The hive buffer
+    :param offset: The offset of the cell header
+    """
+    return _unpack_from(_CELL_SIZE, buffer, offset)[0]
+
+
+def parse_uint32(buffer, offset) -> int:
+    return _unpack_from(_UINT32, buffer, offset)[0]
+
+
+def unpack_cm_key_node(buffer, offset) -> KeyNodeFields:
+    """
+    Unpack the fixed size part of a key node, without decoding the flags or reading the name
+    :param buffer: The hive buffer
+    :param offset: The offset of the key node, right after the "nk" signature
+    """
+    return KeyNodeFields._make(_unpack_from(_CM_KEY_NODE, buffer, offset))
+
+
+def read_key_name(buffer, offset, fields: KeyNodeFields) -> bytes:
+    """
+    Read the name of a key node
+    :param buffer: The hive buffer
+    :param offset: The offset of the key node, right after the "nk" signature
+    :param fields: The unpacked fields of the key node
+    """
+    return _read_bytes(buffer, offset + _CM_KEY_NODE.size, fields.key_name_size)
+
+
+def build_cm_key_node(fields: KeyNodeFields, key_name_string: bytes) -> Container:
+    """
+    Build the same container CM_KEY_NODE.parse_stream() would, from already unpacked fields
+    """
+    header = Container(fields._asdict())
+    header.flags = KEY_NODE_FLAGS._decode(fields.flags, None, None)
+    header.key_name_string = key_name_string
+    return header
+
+
+def parse_cm_key_node(buffer, offset) -> Container:
+    """
+    Equivalent of CM_KEY_NODE.parse_stream()
+    :param buffer: The hive buffer
+    :param offset: The offset of the key node, right after the "nk" signature
+    """
+    fields = unpack_cm_key_node(buffer, offset)
+    return build_cm_key_node(fields, read_key_name(buffer, offset, fields))
+
+
+def parse_value_key(buffer, offset) -> Container:
+    """
+    Equivalent of VALUE_KEY.parse_stream()
+    :param buffer: The hive buffer
+    :param offset: The offset of the value key, at the "vk" signature
+    """
+    # The signature is checked before anything else is read, so a truncated cell fails on the signature like it does
+    # with the construct definition
+    signature = bytes(buffer[offset : offset + len(VALUE_KEY_SIGNATURE)])
+    if signature != VALUE_KEY_SIGNATURE:
+        raise ConstError(f"parsing expected {VALUE_KEY_SIGNATURE!r} but parsed {signature!r}")
+
+    _, name_size, data_size, data_offset, data_type, flags = _unpack_from(_VALUE_KEY, buffer, offset)
+
+    return Container(
+        signature=signature,
+        name_size=name_size,
+        data_size=data_size,
+        data_offset=data_offset,
+        data_type=VALUE_TYPE_ENUM._decode(data_type, None, None),
+        flags=VALUE_KEY_FLAGS._decode(flags, None, None),
+        name=_read_bytes(buffer, offset + _VALUE_KEY.size, name_size),
+    )
+
+
+def _parse_elements(compiled_struct, buffer, offset):
+    element_count = _unpack_from(_ELEMENT_COUNT, buffer, offset)[0]
+    elements_offset = offset + _ELEMENT_COUNT.size
+    elements_size = element_count * compiled_struct.size
+    if elements_offset + elements_size > len(buffer):
+        raise StreamError(f"Could not read {element_count} elements at offset {elements_offset}")
+    return compiled_struct.iter_unpack(buffer[elements_offset : elements_offset + elements_size])
+
+
+def parse_lf_lh_sk_element(buffer, offset) -> list[tuple[int, int]]:
+    """
+    Equivalent of LF_LH_SK_ELEMENT.parse_stream()
+    :param buffer: The hive buffer
+    :param offset: The offset of the element count, right after the "lf" or "lh" signature
+    :return: A list of (key_node_offset, hash_value) tuples
+    """
+    return list(_parse_elements(_LF_LH_ELEMENT, buffer, offset))
+
+
+def parse_index_leaf(buffer, offset) -> list[int]:
+    """
+    Equivalent of INDEX_LEAF.parse_stream()
+    :param buffer: The hive buffer
+    :param offset: The offset of the element count, right after the "li" signature
+    :return: A list of key node offsets
+    """
+    return [x[0] for x in _parse_elements(_INDEX_ELEMENT, buffer, offset)]
+
+
+def parse_index_root(buffer, offset) -> list[int]:
+    """
+    Equivalent of INDEX_ROOT.parse_stream()
+    :param buffer: The hive buffer
+    :param offset: The offset of the element count, right after the "ri" signature
+    :return: A list of subkey list offsets
+    """
+    return [x[0] for x in _parse_elements(_INDEX_ELEMENT, buffer, offset)]
@@ -0,0 +1,334 @@
+"""
+A persistent SQLite index of the keys and values of a hive.
+
+The index is built once, with a full walk of the hive, and is tied to the SHA-1 of the hive. When the same hive is
+opened again with the index, key lookups, timestamp range queries and value name searches are index lookups instead
+of walks of the key tree. The index also keeps the key and subtree digests of every key (see regipy.digests), so
+comparing two indexed hives only walks the parts of them that differ.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Optional
+
+from construct import ConstError, StreamError
+
+from regipy.digests import KeyDigests, SubtreeDigestBuilder, get_key_digest
+from regipy.exceptions import RegipyException, RegistryParsingException
+from regipy.utils import batched
+
+logger = logging.getLogger(__name__)
+
+INDEX_SCHEMA_VERSION = 2
+
+# The file name of the index of a hive, when a directory of indexes is used
+INDEX_FILE_EXTENSION = ".regipy-index"
+
+# SQLite integers are signed
+MAX_INDEXED_TIMESTAMP = 2**63 - 1
+
+_SCHEMA = """
+CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE keys (
+    offset INTEGER NOT NULL UNIQUE,
+    parent_offset INTEGER,
+    path TEXT NOT NULL,
+    lookup_path TEXT NOT NULL,
+    last_modified INTEGER NOT NULL,
+    subkey_count INTEGER NOT NULL,
+    values_count INTEGER NOT NULL,
+    key_digest BLOB,
+    subtree_digest BLOB
+);
+CREATE TABLE key_values (
+    offset INTEGER NOT NULL,
+    key_offset INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    lookup_name TEXT NOT NULL,
+    value_type TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+# Created after the data is inserted, which is much faster than updating them on every insert
+_INDEXES = """
+CREATE INDEX keys_lookup_path ON keys (lookup_path);
+CREATE INDEX keys_last_modified ON keys (last_modified);
+CREATE INDEX key_values_lookup_name ON key_values (lookup_name);
+CREATE INDEX key_values_key_offset ON key_values (key_offset);
+"""
+
+# The number of rows inserted at once
+INSERT_BATCH_SIZE = 10000
+
+
+@dataclass
+class IndexedKey:
+    path: str
+    offset: int
+    last_modified: int
+    subkey_count: int
+    values_count: int
+
+
+@dataclass
+class IndexedValue:
+    path: str
+    key_offset: int
+    name: str
+    value_type: str
+    offset: int
+    size: int
+
+
+def get_lookup_path(key_path: str) -> str:
+    """
+    Normalize a key path the way RegistryHive.get_key() does: key names are case insensitive,
+    and paths without a leading backslash are relative to the root key
+    """
+    if key_path == "\\":
+        return ""
+    key_path_parts = key_path.split("\\")[1:] if "\\" in key_path else [key_path]
+    return "\\".join(key_path_parts).upper()
+
+
+def get_index_path(index_path: str, sha1: str) -> str:
+    """
+    Indexes can be kept in a directory, where they are named after the SHA-1 of their hive
+    :param index_path: The path of an index file, or of a directory of indexes
+    :param sha1: The SHA-1 of the hive
+    """
+    if os.path.isdir(index_path):
+        return os.path.join(index_path, f"{sha1}{INDEX_FILE_EXTENSION}")
+    return index_path
+
+
+def _list_subkeys(nk_record, path):
+    try:
+        return list(nk_record.iter_subkeys() or [])
+    except (RegipyException, ConstError, StreamError) as ex:
+        logger.error(f"Could not parse the subkeys of {path}: {ex}")
+        return []
+
+
+def iter_key_paths(registry_hive) -> Iterator[tuple[str, object, Optional[int]]]:
+    """
+    Walk the key tree of a hive in the order recurse_subkeys() does: every key after its subkeys, and the root key last
+    :param registry_hive: A RegistryHive object
+    :return: (path, NKRecord, parent offset) tuples. Paths are in the form recurse_subkeys() uses.
+    """
+    root = registry_hive.root
+
+    # Corrupted hives may link a key from several places, or in a loop
+    visited = {root.offset}
+
+    # Every frame holds the subkeys left to walk of a key, the key itself, its path and the offset of its parent
+    stack = [(iter(_list_subkeys(root, "\\")), root, "", None)]
+    while stack:
+        subkeys, parent, parent_path, grandparent_offset = stack[-1]
+        subkey = next(subkeys, None)
+        if subkey is None:
+            stack.pop()
+            yield parent_path or "\\", parent, grandparent_offset
+            continue
+
+        if subkey.offset in visited:
+            continue
+        visited.add(subkey.offset)
+
+        subkey_path = rf"{parent_path}\{subkey.name}"
+        if subkey.subkey_count:
+            stack.append((iter(_list_subkeys(subkey, subkey_path)), subkey, subkey_path, parent.offset))
+        else:
+            yield subkey_path, subkey, parent.offset
+
+
+def _iter_key_rows(registry_hive, value_rows) -> Iterator[tuple]:
+    digest_builder = SubtreeDigestBuilder()
+    for path, nk_record, parent_offset in iter_key_paths(registry_hive):
+        lazy_values = []
+        if nk_record.values_count:
+            try:
+                for lazy_value in nk_record.iter_lazy_values():
+                    lazy_values.append(lazy_value)
+                    value_rows.append(
+                        (
+                            lazy_value.offset,
+                            nk_record.offset,
+                            lazy_value.name,
+                            lazy_value.name.upper(),
+                            str(lazy_value.value_type),
+                            lazy_value.size,
+                        )
+                    )
+            except RegistryParsingException as ex:
+                logger.error(f"Could not index the values of {path}: {ex}")
+                lazy_values = None
+
+        key_digest = get_key_digest(lazy_values) if lazy_values is not None else None
+        yield (
+            nk_record.offset,
+            parent_offset,
+            path,
+            get_lookup_path(path),
+            min(nk_record.last_modified, MAX_INDEXED_TIMESTAMP),
+            nk_record.subkey_count,
+            nk_record.values_count,
+            key_digest,
+            digest_builder.add(nk_record, key_digest, parent_offset),
+        )
+
+
+class HiveIndex:
+    def __init__(self, index_path: str):
+        """
+        An index of the keys and values of a hive, as built by build_hive_index().
+        Every thread queries the index with a connection of its own, so it can be shared by threads.
+        :param index_path: The path of the index file
+        """
+        self.index_path = index_path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.metadata = dict(self._connection.execute("SELECT name, value FROM metadata"))
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # The connections are only used by the thread that opened them, but close() may be called by any thread
+            connection = sqlite3.connect(self.index_path, check_same_thread=False)
+            with self._lock:
+                self._connections.append(connection)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def sha1(self) -> str:
+        """
+        The SHA-1 of the hive this index was built from
+        """
+        return self.metadata["sha1"]
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def get_key_offset(self, key_path: str) -> Optional[int]:
+        """
+        Get the offset of a key node, in the same form as NKRecord.offset
+        :param key_path: The path of the key, relative to the root of the hive
+        :return: The offset, or None if there is no such key
+        """
+        row = self._connection.execute(
+            "SELECT offset FROM keys WHERE lookup_path = ? ORDER BY rowid LIMIT 1", (get_lookup_path(key_path),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_digests(self, offset: int) -> Optional[KeyDigests]:
+        """
+        Get the key digest and the subtree digest of a key, see regipy.digests
+        :param offset: The offset of the key node, in the same form as NKRecord.offset
+        :return: The digests, or None if the key is not in the index
+        """
+        row = self._connection.execute("SELECT key_digest, subtree_digest FROM keys WHERE offset = ?", (offset,)).fetchone()
+        return KeyDigests(*row) if row else None
+
+    def iter_keys_modified_between(self, start: int, end: int) -> Iterator[IndexedKey]:
+        """
+        Iterate over the keys whose last modification time is in a range, in the order of recurse_subkeys()
+        :param start: A FILETIME. Keys modified at this time are included
+        :param end: A FILETIME. Keys modified at this time are excluded
+        """
+        for row in self._connection.execute(
+            "SELECT path, offset, last_modified, subkey_count, values_count FROM keys "
+            "WHERE last_modified >= ? AND last_modified < ? ORDER BY rowid",
+            (min(start, MAX_INDEXED_TIMESTAMP), min(end, MAX_INDEXED_TIMESTAMP)),
+        ):
+            yield IndexedKey(*row)
+
+    def find_values(self, value_name: str) -> Iterator[IndexedValue]:
+        """
+        Find all the values with a given name, in the order of recurse_subkeys()
+        :param value_name: The name of the value, case insensitive
+        """
+        for row in self._connection.execute(
+            "SELECT keys.path, key_values.key_offset, key_values.name, key_values.value_type, key_values.offset, "
+            "key_values.size FROM key_values JOIN keys ON keys.offset = key_values.key_offset "
+            "WHERE key_values.lookup_name = ? ORDER BY keys.rowid, key_values.rowid",
+            (value_name.upper(),),
+        ):
+            yield IndexedValue(*row)
+
+
+def build_hive_index(registry_hive, index_path: str) -> HiveIndex:
+    """
+    Index all the keys and values of a hive. An existing index at the same path is replaced.
+    :param registry_hive: A RegistryHive object
+    :param index_path: The path of the index file, or of a directory of indexes
+    :return: The HiveIndex
+    """
+    sha1 = registry_hive.sha1
+    index_path = get_index_path(index_path, sha1)
+
+    # Build into a temporary file, so a failed build never leaves a partial index behind
+    temp_index_path = f"{index_path}.tmp"
+    if os.path.exists(temp_index_path):
+        os.remove(temp_index_path)
+
+    connection = sqlite3.connect(temp_index_path)
+    try:
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.executemany(
+                "INSERT INTO metadata (name, value) VALUES (?, ?)",
+                [
+                    ("schema_version", str(INDEX_SCHEMA_VERSION)),
+                    ("sha1", sha1),
+                    ("hive_path", str(registry_hive.hive_path)),
+                ],
+            )
+
+            value_rows: list[tuple] = []
+            for key_rows in batched(_iter_key_rows(registry_hive, value_rows), INSERT_BATCH_SIZE):
+                connection.executemany("INSERT INTO keys VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", key_rows)
+                connection.executemany("INSERT INTO key_values VALUES (?, ?, ?, ?, ?, ?)", value_rows)
+                value_rows.clear()
+            connection.executescript(_INDEXES)
+    finally:
+        connection.close()
+
+    os.replace(temp_index_path, index_path)
+    logger.info(f"Built index of {registry_hive.hive_path} at {index_path}")
+    return HiveIndex(index_path)
+
+
+def load_hive_index(index_path: str, sha1: str) -> Optional[HiveIndex]:
+    """
+    Load the index of a hive, if there is one that was built from the same hive
+    :param index_path: The path of the index file, or of a directory of indexes
+    :param sha1: The SHA-1 of the hive
+    :return: The HiveIndex, or None if there is no index or it was built from a different hive
+    """
+    index_path = get_index_path(index_path, sha1)
+    if not os.path.isfile(index_path):
+        return None
+
+    try:
+        hive_index = HiveIndex(index_path)
+    except sqlite3.DatabaseError as ex:
+        logger.warning(f"Could not load the index at {index_path}: {ex}")
+        return None
+
+    if hive_index.metadata.get("schema_version") != str(INDEX_SCHEMA_VERSION) or hive_index.metadata.get("sha1") != sha1:
+        logger.info(f"The index at {index_path} was built from a different hive or regipy version")
+        hive_index.close()
+        return None
+    return hive_index
@@ -0,0 +1,176 @@
+"""
+Dump a hive using several processes.
+
+The key tree is split at its first levels into work units, in the order recurse_subkeys() yields them.
+Every worker process opens the hive on its own (memory mapped, so the pages are shared through the page cache),
+writes the entries of its units to a JSON-lines shard, and the shards are concatenated in order.
+The result is identical to a single process dump_hive_to_json(), which writes the entries of recurse_subkeys().
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Optional
+
+from regipy.registry import NKRecord, RegistryHive
+from regipy.serialization import WRITE_BUFFER_SIZE, get_serializer, write_json_lines
+from regipy.utils import TIMESTAMP_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Each worker gets roughly this many tasks, so a big subtree does not leave the other workers idle
+TASKS_PER_WORKER = 8
+
+# The hive opened by the current worker process
+_worker_hive: Optional[RegistryHive] = None
+
+
+@dataclass
+class DumpUnit:
+    """
+    A key to dump, either with all of its subkeys or by itself
+    """
+
+    offset: int
+    path: str
+    parent_path: Optional[str]
+    with_subkeys: bool
+
+
+def plan_dump_units(nk_record: NKRecord, split_depth: int = 1) -> list[DumpUnit]:
+    """
+    Split the tree under nk_record into units, in the order recurse_subkeys() yields them
+    :param nk_record: The key to start from. It is not part of any unit.
+    :param split_depth: How many levels below nk_record to split. Keys at this depth are dumped with all of their subkeys.
+    """
+    units = []
+    # The keys above split_depth are yielded after their subkeys, so they are added when their subkeys are done
+    stack = [(nk_record.iter_subkeys() if nk_record.subkey_count else iter(()), None, None)]
+    while stack:
+        subkeys, parent_path, parent_unit = stack[-1]
+        subkey = next(subkeys, None)
+        if subkey is None:
+            stack.pop()
+            if parent_unit is not None:
+                units.append(parent_unit)
+            continue
+
+        subkey_path = rf"{parent_path}\{subkey.name}" if parent_path else f"\\{subkey.name}"
+        if subkey.subkey_count and len(stack) < split_depth:
+            stack.append(
+                (
+                    subkey.iter_subkeys(),
+                    subkey_path,
+                    DumpUnit(offset=subkey.offset, path=subkey_path, parent_path=parent_path, with_subkeys=False),
+                )
+            )
+        else:
+            units.append(DumpUnit(offset=subkey.offset, path=subkey_path, parent_path=parent_path, with_subkeys=True))
+    return units
+
+
+def _init_worker(hive_path, hive_type, partial_hive_path, primary_log_path, secondary_log_path):
+    global _worker_hive
+    _worker_hive = RegistryHive(
+        hive_path,
+        hive_type=hive_type,
+        partial_hive_path=partial_hive_path,
+        use_mmap=True,
+        primary_log_path=primary_log_path,
+        secondary_log_path=secondary_log_path,
+    )
+
+
+def _iter_unit_entries(registry_hive: RegistryHive, unit: DumpUnit, fetch_values: bool):
+    nk_record = registry_hive._get_nk_record_at(unit.offset)
+    if unit.with_subkeys:
+        yield from registry_hive.recurse_subkeys(
+            nk_record,
+            path_root=unit.path,
+            as_json=True,
+            is_init=False,
+            fetch_values=fetch_values,
+            timestamp_batch_size=TIMESTAMP_BATCH_SIZE,
+        )
+    yield registry_hive._get_subkey_entry(nk_record, unit.path, unit.parent_path, True, fetch_values)
+
+
+def _dump_units(units: list[DumpUnit], shard_path: str, fetch_values: bool, serializer) -> int:
+    with open(shard_path, mode="wb", buffering=WRITE_BUFFER_SIZE) as writer:
+        return sum(
+            write_json_lines(writer, _iter_unit_entries(_worker_hive, unit, fetch_values), serializer=serializer)
+            for unit in units
+        )
+
+
+def _split_tasks(units: list[DumpUnit], task_count: int) -> list[list[DumpUnit]]:
+    task_size = max(1, -(-len(units) // task_count))
+    return [units[i : i + task_size] for i in range(0, len(units), task_size)]
+
+
+def parallel_dump_hive_to_json(
+    registry_hive: RegistryHive,
+    output_path,
+    name_key_entry: NKRecord,
+    workers: Optional[int] = None,
+    fetch_values=True,
+    split_depth: Optional[int] = None,
+    serializer=None,
+) -> int:
+    """
+    Write the hive subkeys to a JSON-lines file using a process pool. The output is the same as dump_hive_to_json().
+    :param registry_hive: a RegistryHive object
+    :param output_path: Output path to save the JSON
+    :param name_key_entry: The NKRecord to start iterating from
+    :param workers: The number of worker processes, by default the number of CPUs
+    :param fetch_values: If False, subkey values will not be returned, but the iteration will be faster
+    :param split_depth: How many levels of the tree to split into work units. If None, one level is used
+                        unless it has too few keys to keep the workers busy, and then two.
+    :param serializer: The serializer to use, see regipy.serialization.get_serializer(). It is sent to the workers.
+    :return: The number of entries written
+    """
+    workers = workers or os.cpu_count() or 1
+    serializer = serializer or get_serializer()
+    if split_depth is None:
+        split_depth = 1 if name_key_entry.subkey_count >= workers * TASKS_PER_WORKER else 2
+
+    units = plan_dump_units(name_key_entry, split_depth=split_depth)
+    tasks = _split_tasks(units, workers * TASKS_PER_WORKER)
+    logger.info(f"Dumping {len(units)} units in {len(tasks)} tasks using {workers} workers")
+
+    entries_count = 0
+    shards_dir = tempfile.mkdtemp(prefix="regipy_dump_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        shard_paths = [os.path.join(shards_dir, f"{index}.jsonl") for index in range(len(tasks))]
+        initargs = (
+            registry_hive.hive_path,
+            registry_hive.hive_type,
+            registry_hive.partial_hive_path,
+            registry_hive.primary_log_path,
+            registry_hive.secondary_log_path,
+        )
+        with ExitStack() as exit_stack:
+            executor = exit_stack.enter_context(
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+            )
+            writer = exit_stack.enter_context(open(output_path, mode="wb", buffering=WRITE_BUFFER_SIZE))
+            results = executor.map(_dump_units, tasks, shard_paths, [fetch_values] * len(tasks), [serializer] * len(tasks))
+
+            # Results come back in submission order, so shards are merged as soon as the ones before them are done
+            for shard_path, shard_entries_count in zip(shard_paths, results):
+                with open(shard_path, mode="rb") as shard:
+                    shutil.copyfileobj(shard, writer, WRITE_BUFFER_SIZE)
+                os.remove(shard_path)
+                entries_count += shard_entries_count
+
+            # The key we started from comes last, like in recurse_subkeys()
+            entries_count += write_json_lines(
+                writer, [registry_hive._get_root_subkey_entry(name_key_entry, None, True)], serializer=serializer
+            )
+    finally:
+        shutil.rmtree(shards_dir, ignore_errors=True)
+    return entries_count
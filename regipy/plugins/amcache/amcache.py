@@ -46,6 +46,7 @@ class AmCachePlugin(Plugin):
     NAME = "amcache"
     DESCRIPTION = "Parse Amcache"
     COMPATIBLE_HIVE = AMCACHE_HIVE_TYPE
+    KEY_PATHS = (r"\Root\File", r"\Root\InventoryApplicationFile")
 
     def parse_amcache_file_entry(self, subkey):
         entry = {underscore(x.name): x.value for x in subkey.iter_values(as_json=self.as_json)}
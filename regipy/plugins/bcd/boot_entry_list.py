@@ -54,6 +54,7 @@ class BootEntryListPlugin(Plugin):
     NAME = "boot_entry_list"
     DESCRIPTION = "List the Windows BCD boot entries"
     COMPATIBLE_HIVE = BCD_HIVE_TYPE
+    KEY_PATHS = (BCD_OBJECTS_PATH,)
 
     def run(self) -> None:
         logger.debug("Started Boot Entry List Plugin...")
@@ -24,6 +24,7 @@ class AppKeysPlugin(Plugin):
     NAME = "appkeys"
     DESCRIPTION = "Parses application keyboard shortcuts"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (APPKEYS_PATH,)
 
     def run(self):
         logger.debug("Started AppKeys Plugin...")
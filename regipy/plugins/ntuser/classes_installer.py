@@ -13,6 +13,7 @@ class NtuserClassesInstallerPlugin(Plugin):
     NAME = "ntuser_classes_installer"
     DESCRIPTION = "List of installed software from NTUSER hive"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (CLASSES_INSTALLER_PATH,)
 
     def run(self):
         try:
@@ -72,6 +72,7 @@ class ComDlg32Plugin(Plugin):
     NAME = "comdlg32"
     DESCRIPTION = "Parses Open/Save dialog MRU lists"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (OPEN_SAVE_PIDL_MRU_PATH, OPEN_SAVE_MRU_PATH, LAST_VISITED_PIDL_MRU_PATH)
 
     def run(self):
         logger.debug("Started ComDlg32 Plugin...")
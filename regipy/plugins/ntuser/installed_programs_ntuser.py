@@ -14,6 +14,7 @@ class InstalledProgramsNTUserPlugin(Plugin):
     NAME = "installed_programs_ntuser"
     DESCRIPTION = "Retrieve list of installed programs and their install date from the NTUSER Hive"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (INSTALLED_SOFTWARE_PATH,)
 
     def _get_installed_software(self, subkey_path):
         try:
@@ -26,6 +26,7 @@ class MUICachePlugin(Plugin):
     NAME = "muicache"
     DESCRIPTION = "Parses MUI Cache (application display names)"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (MUICACHE_PATH_VISTA, MUICACHE_PATH_XP)
 
     def run(self):
         logger.debug("Started MUICache Plugin...")
@@ -14,6 +14,7 @@ class NetworkDrivesPlugin(Plugin):
     NAME = "network_drives_plugin"
     DESCRIPTION = "Parse the user's mapped network drives"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (NETWORK_DRIVES,)
 
     def run(self):
         try:
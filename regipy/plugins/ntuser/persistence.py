@@ -30,6 +30,7 @@ class NTUserPersistencePlugin(Plugin):
     NAME = "ntuser_persistence"
     DESCRIPTION = "Retrieve values from known persistence subkeys in NTUSER hive"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = tuple(PERSISTENCE_ENTRIES)
 
     def run(self):
         self.entries = get_subkey_values_from_list(
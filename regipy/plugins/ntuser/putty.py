@@ -30,6 +30,7 @@ class PuTTYPlugin(Plugin):
     NAME = "putty"
     DESCRIPTION = "Parses PuTTY sessions and SSH host keys"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (PUTTY_SESSIONS_PATH, PUTTY_SSH_HOST_KEYS_PATH, PUTTY_JUMPLIST_PATH)
 
     def run(self):
         logger.debug("Started PuTTY Plugin...")
@@ -48,6 +48,7 @@ class RecentDocsPlugin(Plugin):
     NAME = "recentdocs"
     DESCRIPTION = "Parses recently opened documents"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (RECENT_DOCS_PATH,)
 
     def run(self):
         logger.debug("Started RecentDocs Plugin...")
@@ -23,6 +23,7 @@ class RunMRUPlugin(Plugin):
     NAME = "runmru"
     DESCRIPTION = "Parses Run dialog MRU list"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (RUN_MRU_PATH,)
 
     def run(self):
         logger.debug("Started RunMRU Plugin...")
@@ -15,6 +15,7 @@ class ShellBagNtuserPlugin(Plugin):
     NAME = "ntuser_shellbag_plugin"
     DESCRIPTION = "Parse NTUSER Shellbag items"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (NTUSER_SHELLBAG,)
 
     @staticmethod
     def _parse_mru(mru_val):
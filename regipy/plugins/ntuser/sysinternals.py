@@ -27,6 +27,7 @@ class SysinternalsPlugin(Plugin):
     NAME = "sysinternals"
     DESCRIPTION = "Parses Sysinternals tools EULA acceptance"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (SYSINTERNALS_PATH,)
 
     def run(self):
         logger.debug("Started Sysinternals Plugin...")
@@ -17,6 +17,7 @@ class TSClientPlugin(Plugin):
     NAME = "terminal_services_history"
     DESCRIPTION = "Retrieve history of RDP connections"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (TSCLIENT_HISTORY_PATH,)
 
     def run(self):
         try:
@@ -16,6 +16,7 @@ class TypedPathsPlugin(Plugin):
     NAME = "typed_paths"
     DESCRIPTION = "Retrieve the typed Paths from the history"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (TYPED_PATHS_KEY_PATH,)
 
     def run(self):
         try:
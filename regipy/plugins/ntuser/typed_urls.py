@@ -16,6 +16,7 @@ class TypedUrlsPlugin(Plugin):
     NAME = "typed_urls"
     DESCRIPTION = "Retrieve the typed URLs from IE history"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (TYPED_URLS_KEY_PATH,)
 
     def run(self):
         try:
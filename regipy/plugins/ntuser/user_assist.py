@@ -64,6 +64,7 @@ class UserAssistPlugin(Plugin):
     NAME = "user_assist"
     DESCRIPTION = "Parse User Assist artifact"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = tuple(rf"{USER_ASSIST_KEY_PATH}\{guid}" for guid in GUIDS)
 
     def run(self):
         for guid in GUIDS:
@@ -16,6 +16,7 @@ class WinRARPlugin(Plugin):
     NAME = "winrar_plugin"
     DESCRIPTION = "Parse the WinRAR archive history"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (WINRAR_ARCHIVE_OPEN_HIST, WINRAR_ARCHIVE_CREATION_HIST, WINRAR_ARCHIVE_EXTRACT_HIST)
 
     def run(self):
         try:
@@ -14,6 +14,7 @@ class WinSCPSavedSessionsPlugin(Plugin):
     NAME = "winscp_saved_sessions"
     DESCRIPTION = "Retrieve list of WinSCP saved sessions"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (WINSCP_SAVED_SESSIONS_PATH,)
 
     def _get_winscp_saved_sessions(self, subkey_path):
         try:
@@ -16,6 +16,7 @@ class WordWheelQueryPlugin(Plugin):
     NAME = "word_wheel_query"
     DESCRIPTION = "Parse the word wheel query artifact"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (WORD_WHEEL_QUERY_KEY_PATH,)
 
     def run(self):
         try:
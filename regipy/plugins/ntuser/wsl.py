@@ -16,6 +16,7 @@ class WSLPlugin(Plugin):
     NAME = "wsl"
     DESCRIPTION = "Get WSL information"
     COMPATIBLE_HIVE = NTUSER_HIVE_TYPE
+    KEY_PATHS = (WSL_PATH,)
 
     def get_wsl_info(self, subkey, distribs=None):
         if distribs is None:
@@ -0,0 +1,134 @@
+"""
+Share key lookups between plugins.
+
+Plugins declare the keys they read in KEY_PATHS, and the keys they read under every control set in
+CONTROL_SET_KEY_PATHS. Before the plugins run, the planner resolves every unique declared key once, in path order,
+and the plugins then get their keys from a SharedKeysHive, which resolves every other key once too and shares the
+NKRecords between all the plugins.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Union
+
+from regipy.exceptions import RegipyException
+from regipy.index import get_lookup_path
+from regipy.registry import NKRecord, RegistryHive
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LookupStats:
+    # The keys the plugins asked for, including the keys RegistryHive.get_control_sets() would look up
+    requested: int = 0
+    # The unique keys the plugins asked for, every one of them was looked up in the hive once
+    resolved: int = 0
+    # The keys that were resolved ahead of time, but no plugin asked for
+    unused: int = 0
+
+    @property
+    def saved(self) -> int:
+        """
+        The lookups that were answered without looking the key up in the hive again
+        """
+        return self.requested - self.resolved
+
+
+class SharedKeysHive:
+    def __init__(self, registry_hive: RegistryHive):
+        """
+        A RegistryHive whose get_key() and get_control_sets() resolve every key once.
+        Everything else is passed to the hive, so it can be given to plugins instead of the hive.
+        :param registry_hive: A RegistryHive object
+        """
+        self._registry_hive = registry_hive
+        self._keys: dict[str, Union[NKRecord, RegipyException]] = {}
+        self._requested_keys: set[str] = set()
+        self._control_set_names = None
+        self.lookup_stats = LookupStats()
+
+    def __getattr__(self, name):
+        return getattr(self._registry_hive, name)
+
+    def _resolve(self, key_path: str, lookup_path: str):
+        if lookup_path not in self._keys:
+            self.lookup_stats.unused += 1
+            try:
+                self._keys[lookup_path] = self._registry_hive.get_key(key_path)
+            except RegipyException as ex:
+                self._keys[lookup_path] = ex
+        return self._keys[lookup_path]
+
+    def _request(self, key_path: str):
+        """
+        Resolve a key a plugin asked for, and count the lookup
+        """
+        lookup_path = get_lookup_path(key_path)
+        result = self._resolve(key_path, lookup_path)
+        self.lookup_stats.requested += 1
+        if lookup_path not in self._requested_keys:
+            self._requested_keys.add(lookup_path)
+            self.lookup_stats.resolved += 1
+            self.lookup_stats.unused -= 1
+        return result
+
+    def _get_control_set_paths(self, registry_path) -> list[str]:
+        if self._control_set_names is None:
+            self._control_set_names = []
+            for control_set in self.CONTROL_SETS:
+                result = self._resolve(control_set, get_lookup_path(control_set))
+                if not isinstance(result, RegipyException):
+                    self._control_set_names.append(result.name)
+        return [rf"\{control_set_name}\{registry_path}" for control_set_name in self._control_set_names]
+
+    def get_key(self, key_path: str) -> NKRecord:
+        result = self._request(key_path)
+        if isinstance(result, RegipyException):
+            # A new exception every time, so tracebacks do not pile up on a shared one
+            raise type(result)(*result.args)
+        return result
+
+    def get_control_sets(self, registry_path):
+        """
+        Like RegistryHive.get_control_sets(), but the control sets are only looked up once
+        """
+        # RegistryHive.get_control_sets() looks up every control set on every call
+        for control_set in self.CONTROL_SETS:
+            self._request(control_set)
+        return self._get_control_set_paths(registry_path)
+
+    def prefetch(self, key_paths):
+        """
+        Resolve keys before they are asked for. Keys that do not exist are remembered too.
+        The lookups are not counted as requested, and the keys no plugin asks for are counted as unused.
+        :param key_paths: Paths of keys, relative to the root of the hive
+        """
+        for key_path in key_paths:
+            self._resolve(key_path, get_lookup_path(key_path))
+
+
+def plan_key_paths(plugin_classes, registry_hive) -> list[str]:
+    """
+    Get the keys that a set of plugins declared, with the control set keys expanded under every control set
+    :param plugin_classes: Plugin classes
+    :param registry_hive: A RegistryHive or a SharedKeysHive
+    :return: The unique key paths, sorted so keys under the same parent are resolved one after the other
+    """
+    key_paths = {}
+    control_set_key_paths = set()
+    for plugin_class in plugin_classes:
+        for key_path in plugin_class.KEY_PATHS:
+            key_paths.setdefault(get_lookup_path(key_path), key_path)
+        control_set_key_paths.update(plugin_class.CONTROL_SET_KEY_PATHS)
+
+    # The control sets looked up for the plan are not requested by a plugin
+    if isinstance(registry_hive, SharedKeysHive):
+        get_control_sets = registry_hive._get_control_set_paths
+    else:
+        get_control_sets = registry_hive.get_control_sets
+    for relative_key_path in control_set_key_paths:
+        for key_path in get_control_sets(relative_key_path):
+            key_paths.setdefault(get_lookup_path(key_path), key_path)
+
+    return [key_paths[lookup_path] for lookup_path in sorted(key_paths)]
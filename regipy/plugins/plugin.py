@@ -13,6 +13,11 @@ class Plugin:
     DESCRIPTION: str = None
     COMPATIBLE_HIVE: str = None
 
+    # The keys the plugin reads, so they can be resolved once for all the plugins, see regipy.plugins.planner.
+    # KEY_PATHS are relative to the root of the hive, and CONTROL_SET_KEY_PATHS to every control set.
+    KEY_PATHS: tuple[str, ...] = ()
+    CONTROL_SET_KEY_PATHS: tuple[str, ...] = ()
+
     def __init_subclass__(cls):
         PLUGINS.add(cls)
 
@@ -23,6 +23,7 @@ class LocalSidPlugin(Plugin):
     NAME = "local_sid"
     DESCRIPTION = "Get the machine local SID"
     COMPATIBLE_HIVE = SAM_HIVE_TYPE
+    KEY_PATHS = (ACCOUNT_PATH,)
 
     def run(self) -> None:
         logger.debug("Started Machine Local SID Plugin...")
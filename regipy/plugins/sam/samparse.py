@@ -86,6 +86,7 @@ class SAMParsePlugin(Plugin):
     NAME = "samparse"
     DESCRIPTION = "Parses user accounts from SAM hive"
     COMPATIBLE_HIVE = SAM_HIVE_TYPE
+    KEY_PATHS = (SAM_USERS_PATH, SAM_NAMES_PATH)
 
     def run(self):
         logger.debug("Started SAM Parse Plugin...")
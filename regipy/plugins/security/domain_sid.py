@@ -25,6 +25,7 @@ class DomainSidPlugin(Plugin):
     NAME = "domain_sid"
     DESCRIPTION = "Get the machine domain name and SID"
     COMPATIBLE_HIVE = SECURITY_HIVE_TYPE
+    KEY_PATHS = (DOMAIN_NAME_PATH, DOMAIN_SID_PATH)
 
     def run(self) -> None:
         logger.debug("Started Machine Domain SID Plugin...")
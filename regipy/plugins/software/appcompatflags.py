@@ -34,6 +34,7 @@ class AppCompatFlagsPlugin(Plugin):
     NAME = "appcompat_flags"
     DESCRIPTION = "Parses application compatibility flags and layers"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (APPCOMPAT_LAYERS_PATH, APPCOMPAT_CUSTOM_PATH)
 
     def run(self):
         logger.debug("Started AppCompatFlags Plugin...")
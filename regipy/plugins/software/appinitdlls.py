@@ -33,6 +33,7 @@ class AppInitDLLsPlugin(Plugin):
     NAME = "appinit_dlls"
     DESCRIPTION = "Parses AppInit_DLLs persistence entries"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (APPINIT_DLLS_PATH, APPINIT_DLLS_WOW64_PATH)
 
     def run(self):
         logger.debug("Started AppInit_DLLs Plugin...")
@@ -36,6 +36,7 @@ class AppPathsPlugin(Plugin):
     NAME = "app_paths"
     DESCRIPTION = "Parses application paths registry entries"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (APP_PATHS_PATH, APP_PATHS_WOW64_PATH)
 
     def run(self):
         logger.debug("Started App Paths Plugin...")
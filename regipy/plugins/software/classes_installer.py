@@ -13,6 +13,7 @@ class SoftwareClassesInstallerPlugin(Plugin):
     NAME = "software_classes_installer"
     DESCRIPTION = "List of installed software from SOFTWARE hive"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (CLASSES_INSTALLER_PATH,)
 
     def run(self):
         try:
@@ -35,6 +35,12 @@ class WindowsDefenderPlugin(Plugin):
     NAME = "windows_defender"
     DESCRIPTION = "Parses Windows Defender configuration and exclusions"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (
+        DEFENDER_PATH,
+        rf"{DEFENDER_PATH}\Real-Time Protection",
+        DEFENDER_POLICY_PATH,
+        rf"{DEFENDER_POLICY_PATH}\Real-Time Protection",
+    )
 
     def run(self):
         logger.debug("Started Windows Defender Plugin...")
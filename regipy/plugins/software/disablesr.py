@@ -16,6 +16,7 @@ class DisableSRPlugin(Plugin):
     NAME = "disablesr_plugin"
     DESCRIPTION = "Gets the value that turns System Restore either on or off"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (SYS_RESTORE_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SOFTWARE_HIVE_TYPE
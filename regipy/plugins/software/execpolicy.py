@@ -37,6 +37,7 @@ class ExecutionPolicyPlugin(Plugin):
     NAME = "execution_policy"
     DESCRIPTION = "Parses PowerShell and script execution policies"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (PS_SHELL_IDS_PATH, PS_POLICY_PATH, WSH_SETTINGS_PATH)
 
     def run(self):
         logger.debug("Started Execution Policy Plugin...")
@@ -13,6 +13,7 @@ class ImageFileExecutionOptions(Plugin):
     NAME = "image_file_execution_options"
     DESCRIPTION = "Retrieve image file execution options - a persistence method"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (IMAGE_FILE_EXECUTION_OPTIONS,)
 
     def run(self):
         image_file_execution_options = self.registry_hive.get_key(IMAGE_FILE_EXECUTION_OPTIONS)
@@ -15,6 +15,7 @@ class InstalledProgramsSoftwarePlugin(Plugin):
     NAME = "installed_programs_software"
     DESCRIPTION = "Retrieve list of installed programs and their install date from the SOFTWARE Hive"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (X64_INSTALLED_SOFTWARE_PATH, X86_INSTALLED_SOFTWARE_PATH)
 
     def _get_installed_software(self, subkey_path):
         try:
@@ -15,6 +15,7 @@ class LastLogonPlugin(Plugin):
     NAME = "last_logon_plugin"
     DESCRIPTION = "Get the last logged on username"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (LAST_LOGON_KEY_PATH,)
 
     def run(self):
         try:
@@ -72,6 +72,7 @@ class NetworkListPlugin(Plugin):
     NAME = "networklist"
     DESCRIPTION = "Parses network connection history"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (PROFILES_PATH,)
 
     def run(self):
         logger.debug("Started NetworkList Plugin...")
@@ -25,6 +25,7 @@ class SoftwarePersistencePlugin(Plugin):
     NAME = "software_plugin"
     DESCRIPTION = "Retrieve values from known persistence subkeys in Software hive"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = tuple(PERSISTENCE_ENTRIES)
 
     def run(self):
         self.entries = get_subkey_values_from_list(self.registry_hive, PERSISTENCE_ENTRIES, as_json=self.as_json)
@@ -13,6 +13,7 @@ class PrintDemonPlugin(Plugin):
     NAME = "print_demon_plugin"
     DESCRIPTION = "Get list of installed printer ports, as could be taken advantage by cve-2020-1048"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (PORTS_KEY_PATH,)
 
     def run(self):
         try:
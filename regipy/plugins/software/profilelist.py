@@ -14,6 +14,7 @@ class ProfileListPlugin(Plugin):
     NAME = "profilelist_plugin"
     DESCRIPTION = "Parses information about user profiles found in the ProfileList key"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (PROFILE_LIST_KEY_PATH,)
 
     def run(self):
         logger.debug("Started profile list plugin...")
@@ -37,6 +37,7 @@ class PowerShellLoggingPlugin(Plugin):
     NAME = "powershell_logging"
     DESCRIPTION = "Parses PowerShell logging and execution policy"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (PS_POLICY_PATH, PS_SCRIPTBLOCK_PATH, PS_MODULE_PATH, rf"{PS_MODULE_PATH}\ModuleNames", PS_TRANSCRIPTION_PATH)
 
     def run(self):
         logger.debug("Started PowerShell Logging Plugin...")
@@ -16,6 +16,7 @@ class SppClientsPlugin(Plugin):
     NAME = "spp_clients_plugin"
     DESCRIPTION = "Determines volumes monitored by VSS"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (SPP_CLIENT_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SOFTWARE_HIVE_TYPE
@@ -16,6 +16,7 @@ class SusclientPlugin(Plugin):
     NAME = "susclient_plugin"
     DESCRIPTION = "Extracts SusClient* info, including HDD SN"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (WIN_VER_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SOFTWARE_HIVE_TYPE
@@ -14,6 +14,7 @@ class RASTracingPlugin(Plugin):
     NAME = "ras_tracing"
     DESCRIPTION = "Retrieve list of executables using ras"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (TRACING_PATH, X86_TRACING_PATH)
 
     def _get_installed_software(self, subkey_path):
         try:
@@ -13,6 +13,7 @@ class UACStatusPlugin(Plugin):
     NAME = "uac_plugin"
     DESCRIPTION = "Get the status of User Access Control"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (UAC_KEY_PATH,)
 
     def run(self):
         """
@@ -34,6 +34,7 @@ class WinVersionPlugin(Plugin):
     NAME = "winver_plugin"
     DESCRIPTION = "Get relevant OS information"
     COMPATIBLE_HIVE = SOFTWARE_HIVE_TYPE
+    KEY_PATHS = (WIN_VER_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SOFTWARE_HIVE_TYPE
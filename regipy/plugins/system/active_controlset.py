@@ -13,6 +13,7 @@ class ActiveControlSetPlugin(Plugin):
     NAME = "active_control_set"
     DESCRIPTION = "Get information on SYSTEM hive control sets"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    KEY_PATHS = (SELECT,)
 
     def run(self):
         subkey = self.registry_hive.get_key(SELECT)
@@ -27,6 +27,7 @@ class AppCertDLLsPlugin(Plugin):
     NAME = "appcert_dlls"
     DESCRIPTION = "Parses AppCertDLLs persistence entries"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (SESSION_MANAGER_PATH,)
 
     def run(self):
         logger.debug("Started AppCertDLLs Plugin...")
@@ -19,6 +19,7 @@ class BackupRestorePlugin(Plugin):
     NAME = "backuprestore_plugin"
     DESCRIPTION = "Gets the contents of the FilesNotToSnapshot, KeysNotToRestore, and FilesNotToBackup keys"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = tuple(BACKUPRESTORE_PATH)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
@@ -16,6 +16,7 @@ class BAMPlugin(Plugin):
     NAME = "background_activity_moderator"
     DESCRIPTION = "Get the computer name"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = tuple(BAM_PATH)
 
     def run(self):
         logger.debug("Started Computer Name Plugin...")
@@ -77,6 +77,7 @@ class BootKeyPlugin(Plugin):
     NAME = "bootkey"
     DESCRIPTION = "Get the Windows boot key"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (LSA_KEY_PATH,)
 
     def run(self):
         logger.debug("Started BootKey Plugin...")
@@ -16,6 +16,7 @@ class CodepagePlugin(Plugin):
     NAME = "codepage"
     DESCRIPTION = "Get codepage value"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (PROCESSOR_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
@@ -14,6 +14,7 @@ class ComputerNamePlugin(Plugin):
     NAME: str = "computer_name"
     DESCRIPTION = "Get the computer name"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (COMPUTER_NAME_PATH,)
 
     def run(self):
         logger.debug("Started Computer Name Plugin...")
@@ -23,6 +23,7 @@ class CrashDumpPlugin(Plugin):
     NAME = "crash_dump"
     DESCRIPTION = "Get crash control information"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (PROCESSOR_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
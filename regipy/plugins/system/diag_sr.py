@@ -16,6 +16,7 @@ class DiagSRPlugin(Plugin):
     NAME = "diag_sr"
     DESCRIPTION = "Get Diag\\SystemRestore values and data"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (DIAGSR_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
@@ -22,6 +22,7 @@ class DisableLastAccessPlugin(Plugin):
     NAME = "disable_last_access"
     DESCRIPTION = "Get NTFSDisableLastAccessUpdate value"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (LAST_ACCESS_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
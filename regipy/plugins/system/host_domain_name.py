@@ -13,6 +13,7 @@ class HostDomainNamePlugin(Plugin):
     NAME = "host_domain_name"
     DESCRIPTION = "Get the computer host and domain names"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (HOST_PARAMETERS_PATH,)
 
     def run(self):
         logger.debug("Started Host and Domain Name Plugin...")
@@ -32,6 +32,7 @@ class LSAPackagesPlugin(Plugin):
     NAME = "lsa_packages"
     DESCRIPTION = "Parses LSA security packages configuration"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (LSA_PATH, rf"{LSA_PATH}\OSConfig")
 
     def run(self):
         logger.debug("Started LSA Packages Plugin...")
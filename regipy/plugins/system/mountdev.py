@@ -98,6 +98,7 @@ class MountedDevicesPlugin(Plugin):
     NAME = "mounted_devices"
     DESCRIPTION = "Parses mounted device information"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    KEY_PATHS = (MOUNTED_DEVICES_PATH,)
 
     def run(self):
         logger.debug("Started MountedDevices Plugin...")
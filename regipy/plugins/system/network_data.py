@@ -15,6 +15,7 @@ class NetworkDataPlugin(Plugin):
     NAME = "network_data"
     DESCRIPTION = "Get network data from many interfaces"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (INTERFACES_PATH,)
 
     def get_network_info(self, subkey, interfaces=None):
         if interfaces is None:
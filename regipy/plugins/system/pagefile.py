@@ -29,6 +29,7 @@ class PagefilePlugin(Plugin):
     NAME = "pagefile"
     DESCRIPTION = "Parses pagefile configuration"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (MEMORY_MANAGEMENT_PATH,)
 
     def run(self):
         logger.debug("Started Pagefile Plugin...")
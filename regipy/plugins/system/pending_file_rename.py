@@ -32,6 +32,7 @@ class PendingFileRenamePlugin(Plugin):
     NAME = "pending_file_rename"
     DESCRIPTION = "Parses pending file rename operations"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (SESSION_MANAGER_PATH,)
 
     def run(self):
         logger.debug("Started Pending File Rename Plugin...")
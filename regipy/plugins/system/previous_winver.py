@@ -34,6 +34,7 @@ class PreviousWinVersionPlugin(Plugin):
     NAME = "previous_winver_plugin"
     DESCRIPTION = "Get previous relevant OS information"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    KEY_PATHS = (WIN_VER_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
@@ -20,6 +20,7 @@ class ProcessorArchitecturePlugin(Plugin):
     NAME = "processor_architecture"
     DESCRIPTION = "Get processor architecture info from the System's environment key"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (PROCESSOR_PATH,)
 
     def can_run(self):
         return self.registry_hive.hive_type == SYSTEM_HIVE_TYPE
@@ -14,6 +14,7 @@ class RoutesPlugin(Plugin):
     NAME = "routes"
     DESCRIPTION = "Get list of routes"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (ROUTES_PATH,)
 
     def run(self):
         logger.debug("Started Routes Plugin...")
@@ -15,6 +15,7 @@ class SafeBootConfigurationPlugin(Plugin):
     NAME = "safeboot_configuration"
     DESCRIPTION = "Get safeboot configuration"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (SAFEBOOT_NETWORK_PATH, SAFEBOOT_MINIMAL_PATH)
 
     def _get_safeboot_entries(self, subkey_path):
         entries = []
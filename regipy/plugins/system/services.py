@@ -18,6 +18,7 @@ class ServicesPlugin(Plugin):
     NAME = "services"
     DESCRIPTION = "Enumerate the services in the SYSTEM hive"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (SERVICES_PATH,)
 
     def run(self):
         self.entries = {}
@@ -29,6 +29,7 @@ class SharesPlugin(Plugin):
     NAME = "shares"
     DESCRIPTION = "Parses network share configuration"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (LANMAN_SHARES_PATH,)
 
     def run(self):
         logger.debug("Started Shares Plugin...")
@@ -13,6 +13,7 @@ class ShimCachePlugin(Plugin):
     NAME = "shimcache"
     DESCRIPTION = "Parse Shimcache artifact"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (COMPUTER_NAME_PATH,)
 
     def run(self):
         logger.debug("Started Shim Cache Plugin...")
@@ -14,6 +14,7 @@ class ShutdownPlugin(Plugin):
     NAME = "shutdown"
     DESCRIPTION = "Get shutdown data"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (SHUTDOWN_DATA_PATH,)
 
     def run(self):
         self.entries = {}
@@ -13,6 +13,7 @@ class TimezoneDataPlugin(Plugin):
     NAME = "timezone_data"
     DESCRIPTION = "Get timezone data"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (TZ_DATA_PATH,)
 
     def run(self):
         self.entries = {}
@@ -15,6 +15,7 @@ class TimezoneDataPlugin2(Plugin):
     NAME = "timezone_data2"
     DESCRIPTION = "Get timezone data"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (TZ_DATA_PATH,)
 
     def run(self):
         self.entries = {}
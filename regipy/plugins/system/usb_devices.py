@@ -36,6 +36,7 @@ class USBDevicesPlugin(Plugin):
     NAME = "usb_devices"
     DESCRIPTION = "Parses USB device connection history"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (ENUM_USB_PATH,)
 
     def run(self):
         logger.debug("Started USB Devices Plugin...")
@@ -22,6 +22,7 @@ class USBSTORPlugin(Plugin):
     NAME = "usbstor_plugin"
     DESCRIPTION = "Parse the connected USB devices history"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (USBSTOR_KEY_PATH,)
 
     def run(self):
         try:
@@ -14,6 +14,7 @@ class WDIGESTPlugin(Plugin):
     NAME = "wdigest"
     DESCRIPTION = "Get WDIGEST configuration"
     COMPATIBLE_HIVE = SYSTEM_HIVE_TYPE
+    CONTROL_SET_KEY_PATHS = (WDIGEST_PATH,)
 
     def run(self):
         logger.debug("Started WDIGEST Plugin...")
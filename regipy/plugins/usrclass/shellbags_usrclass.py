@@ -16,6 +16,7 @@ class ShellBagUsrclassPlugin(Plugin):
     NAME = "usrclass_shellbag_plugin"
     DESCRIPTION = "Parse USRCLASS Shellbag items"
     COMPATIBLE_HIVE = USRCLASS_HIVE_TYPE
+    KEY_PATHS = (USRCLASS_SHELLBAG,)
 
     @staticmethod
     def _parse_mru(mru_val):
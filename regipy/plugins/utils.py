@@ -1,14 +1,16 @@
-import json
 import logging
-from dataclasses import asdict
 from typing import Any, Callable, Union
 
 from regipy import NKRecord
+from regipy.parallel import parallel_dump_hive_to_json
+from regipy.plugins.planner import SharedKeysHive, plan_key_paths
 from regipy.plugins.plugin import PLUGINS
 from regipy.plugins.validation_status import (
     is_plugin_validated,
     warn_unvalidated_plugin,
 )
+from regipy.serialization import WRITE_BUFFER_SIZE, write_json_lines
+from regipy.utils import TIMESTAMP_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +61,8 @@ def dump_hive_to_json(
     name_key_entry: NKRecord,
     verbose=False,
     fetch_values=True,
+    workers=1,
+    serializer=None,
 ):
     """
     Write the hive subkeys to a JSON-lines file, one line per entry.
@@ -66,23 +70,34 @@ def dump_hive_to_json(
     :param output_path: Output path to save the JSON
     :param name_key_entry: The NKRecord to start iterating from
     :param verbose: verbosity
+    :param workers: If more than 1, split the work between this many processes. The output is the same.
+    :param serializer: The serializer to use, see regipy.serialization.get_serializer()
     :return: The result, as dict
     """
-    with open(output_path, mode="w") as writer:
-        for subkey_count, entry in enumerate(
-            registry_hive.recurse_subkeys(name_key_entry, as_json=True, fetch_values=fetch_values)
-        ):
-            writer.write(
-                json.dumps(
-                    asdict(entry),
-                    separators=(
-                        ",",
-                        ":",
-                    ),
-                )
+    if workers > 1:
+        entries_count = parallel_dump_hive_to_json(
+            registry_hive,
+            output_path,
+            name_key_entry,
+            workers=workers,
+            fetch_values=fetch_values,
+            serializer=serializer,
+        )
+    else:
+        with open(output_path, mode="wb", buffering=WRITE_BUFFER_SIZE) as writer:
+            entries_count = write_json_lines(
+                writer,
+                registry_hive.recurse_subkeys(
+                    name_key_entry,
+                    as_json=True,
+                    fetch_values=fetch_values,
+                    timestamp_batch_size=TIMESTAMP_BATCH_SIZE,
+                ),
+                serializer=serializer,
             )
-            writer.write("\n")
-        return subkey_count
+
+    # The index of the last entry is returned, as it always was
+    return entries_count - 1
 
 
 def run_relevant_plugins(
@@ -94,7 +109,10 @@ def run_relevant_plugins(
     """
     Execute the relevant plugins on the hive
 
-    :param registry_hive: a RegistryHive object
+    The keys the plugins declare are resolved once before they run, and every key the plugins look up is shared
+    between them. To get the lookup statistics, pass a SharedKeysHive and read its lookup_stats afterwards.
+
+    :param registry_hive: a RegistryHive object, or a SharedKeysHive
     :param as_json: Whether to return result as json
     :param plugins: List of plugin to execute (names according to the NAME field in each plugin)
     :param include_unvalidated: Whether to include plugins that don't have validation test cases.
@@ -102,7 +120,10 @@ def run_relevant_plugins(
                                 Unvalidated plugins may return incomplete or inaccurate data.
     :return: The result, as dict
     """
-    plugin_results = {}
+    if not isinstance(registry_hive, SharedKeysHive):
+        registry_hive = SharedKeysHive(registry_hive)
+
+    relevant_plugins = []
     for plugin_class in PLUGINS:
         plugin = plugin_class(registry_hive, as_json=as_json)
 
@@ -119,9 +140,22 @@ def run_relevant_plugins(
             warn_unvalidated_plugin(plugin.NAME)
 
         if plugin.can_run():
-            try:
-                plugin.run()
-                plugin_results[plugin.NAME] = plugin.entries
-            except ModuleNotFoundError:
-                logger.error(f"Plugin {plugin.NAME} has missing dependencies")
+            relevant_plugins.append(plugin)
+
+    registry_hive.prefetch(plan_key_paths([type(plugin) for plugin in relevant_plugins], registry_hive))
+
+    plugin_results = {}
+    for plugin in relevant_plugins:
+        try:
+            plugin.run()
+            plugin_results[plugin.NAME] = plugin.entries
+        except ModuleNotFoundError:
+            logger.error(f"Plugin {plugin.NAME} has missing dependencies")
+
+    lookup_stats = registry_hive.lookup_stats
+    logger.info(
+        f"{len(relevant_plugins)} plugins looked up {lookup_stats.requested} keys, "
+        f"{lookup_stats.resolved} were resolved in the hive and {lookup_stats.saved} lookups were saved. "
+        f"{lookup_stats.unused} keys were resolved ahead of time but not used"
+    )
     return plugin_results
@@ -1,29 +1,195 @@
+"""
+Recover a hive by replaying its transaction logs.
+
+The logs are replayed into a DirtyPageMap, which only holds the pages that the logs changed, keyed by their offset in
+the hive, and reads every other page from the unchanged hive. The recovered hive is then either written to disk
+(apply_transaction_logs), or opened in memory as a copy on write mapping of the hive with the dirty pages applied
+(open_recovered_hive_stream, used by RegistryHive when it is given transaction logs), so the hive is never copied.
+"""
+
 import logging
+import mmap
 import os
-from io import BytesIO
+import re
+from collections.abc import Iterator
 
 from construct import Int32ul
 
-from regipy import boomerang_stream
 from regipy.exceptions import RegistryRecoveryException
 from regipy.hive_types import DIRT_TRANSACTION_LOG_MAGIC, HVLE_TRANSACTION_LOG_MAGIC
-from regipy.registry import RegistryHive
-from regipy.structs import REGF_HEADER_SIZE, TRANSACTION_LOG
+from regipy.structs import REGF_HEADER, REGF_HEADER_SIZE, TRANSACTION_LOG
+from regipy.utils import HiveCursor, boomerang_stream, calculate_marvin32, get_stream_buffer, open_hive_stream
 
 logger = logging.getLogger(__name__)
 
+# HvLE logs hold whole hive pages, DIRT logs hold the 512 bytes sectors marked in their bitmap
+HIVE_PAGE_SIZE = 4096
+LOG_SECTOR_SIZE = 512
+
+# The log entries of HvLE logs are hashed with Marvin32, with this seed
+HVLE_HASH_SEED = 0x82EF4D887A4E55C5
+# The size of the header of a log entry, before the dirty page references
+HVLE_HEADER_SIZE = 40
+# hash_2 covers the header of a log entry up to and including hash_1
+HVLE_HASH_2_COVERED_SIZE = 32
+
+
+class DirtyPageMap:
+    def __init__(self, hive_buffer, page_size: int = HIVE_PAGE_SIZE):
+        """
+        The pages of a hive that were changed by transaction logs, over the data of the unchanged hive
+        :param hive_buffer: A view over the data of the hive, as returned by get_stream_buffer(). It is never written to.
+        :param page_size: The size of the pages that are kept. Writes that only cover a part of a page copy the rest of
+                          the page from the hive.
+        """
+        self.hive_buffer = hive_buffer
+        self.page_size = page_size
+
+        # The data of every dirty page, by its offset in the hive
+        self.pages = {}
+
+        # Logs may grow the hive, the data between its end and the dirty pages after it is zeros
+        self.size = len(hive_buffer)
+
+    def __len__(self):
+        return self.size
+
+    def _get_page(self, page_offset: int):
+        page = self.pages.get(page_offset)
+        if page is None:
+            page = bytes(self.hive_buffer[page_offset : page_offset + self.page_size])
+            page = page.ljust(self.page_size, b"\x00")
+        return page
+
+    def write(self, offset: int, data):
+        """
+        Write data to the recovered hive. Whole pages are kept as views over the data, without copying it.
+        :param offset: The offset in the hive
+        :param data: A bytes-like object
+        """
+        data = memoryview(data)
+        end = offset + len(data)
+        position = offset
+        while position < end:
+            page_offset = position - position % self.page_size
+            offset_in_page = position - page_offset
+            length = min(self.page_size - offset_in_page, end - position)
+            chunk = data[position - offset : position - offset + length]
+            if length == self.page_size:
+                self.pages[page_offset] = chunk
+            else:
+                page = bytearray(self._get_page(page_offset))
+                page[offset_in_page : offset_in_page + length] = chunk
+                self.pages[page_offset] = page
+            position += length
+        self.size = max(self.size, end)
+
+    def read(self, offset: int, size: int) -> bytes:
+        """
+        Read data from the recovered hive
+        """
+        size = max(0, min(size, self.size - offset))
+        data = bytearray()
+        position = offset
+        while position < offset + size:
+            page_offset = position - position % self.page_size
+            length = min(page_offset + self.page_size, offset + size) - position
+            page = self._get_page(page_offset)
+            data += page[position - page_offset : position - page_offset + length]
+            position += length
+        return bytes(data)
+
+    def iter_dirty_pages(self):
+        """
+        :return: (offset, data) tuples of the dirty pages, sorted by offset and cut at the end of the hive
+        """
+        for page_offset in sorted(self.pages):
+            yield page_offset, self.pages[page_offset][: self.size - page_offset]
+
+    def apply(self, buffer):
+        """
+        Write the dirty pages to a writable buffer of the recovered size, that holds the data of the hive
+        """
+        for page_offset, page in self.iter_dirty_pages():
+            buffer[page_offset : page_offset + len(page)] = page
+
+    def flush(self, path):
+        """
+        Write the recovered hive to a file, the unchanged parts of the hive are written from the hive buffer
+        :param path: The path of the file
+        """
+        with open(path, "wb") as f:
+            position = 0
+            for page_offset, page in self.iter_dirty_pages():
+                f.write(self.hive_buffer[position:page_offset])
+                f.seek(page_offset)
+                f.write(page)
+                position = page_offset + len(page)
+            f.write(self.hive_buffer[position:])
+            # Anything between the end of the hive and the last dirty page is zeros
+            f.truncate(self.size)
+
+
+def _is_log_entry_valid(log_entry: bytes, parsed_hvle_block) -> bool:
+    if len(log_entry) != parsed_hvle_block.log_size:
+        return False
+    # hash_2 covers the start of the entry, up to and including hash_1
+    if calculate_marvin32(log_entry[:HVLE_HASH_2_COVERED_SIZE], HVLE_HASH_SEED) != parsed_hvle_block.hash_2:
+        return False
+    # hash_1 covers the dirty page references and the dirty pages
+    return calculate_marvin32(log_entry[HVLE_HEADER_SIZE:], HVLE_HASH_SEED) == parsed_hvle_block.hash_1
+
+
+def _get_bit_runs(byte: int) -> tuple[tuple[int, int], ...]:
+    runs = []
+    bit = 0
+    while bit < 8:
+        if byte >> bit & 1:
+            first_bit = bit
+            while bit < 8 and byte >> bit & 1:
+                bit += 1
+            runs.append((first_bit, bit - first_bit))
+        else:
+            bit += 1
+    return tuple(runs)
+
 
-def _parse_hvle_block(hive_path, transaction_log_stream, log_size, expected_sequence_number):
-    """
+# The runs of set bits of every byte value, as (first bit, number of bits) tuples, least significant bit first
+_BYTE_BIT_RUNS = tuple(_get_bit_runs(byte) for byte in range(256))
 
-    :param hive_path:
-    :param transaction_log_stream:
-    :param log_size:
-    :param expected_sequence_number:
-    :return:
+
+def _iter_dirty_sector_runs(bitmap: bytes) -> Iterator[tuple[int, int]]:
+    """
+    Decode the bitmap of a DIRT transaction log, a bit per sector of the hive bins
+    :param bitmap: The bitmap
+    :return: (first sector, number of sectors) tuples of the runs of dirty sectors
+    """
+    run_start = run_end = None
+    # Only the bytes with dirty sectors are decoded, and a byte at a time
+    for match in re.finditer(rb"[^\x00]+", bitmap):
+        for byte_index in range(match.start(), match.end()):
+            for first_bit, bits_count in _BYTE_BIT_RUNS[bitmap[byte_index]]:
+                first_sector = byte_index * 8 + first_bit
+                if first_sector == run_end:
+                    run_end += bits_count
+                    continue
+                if run_end is not None:
+                    yield run_start, run_end - run_start
+                run_start, run_end = first_sector, first_sector + bits_count
+    if run_end is not None:
+        yield run_start, run_end - run_start
+
+
+def _parse_hvle_block(dirty_page_map, transaction_log_stream, log_size, expected_sequence_number):
+    """
+    Replay the HvLE log entries of a transaction log
+    :param dirty_page_map: The DirtyPageMap to write the dirty pages to
+    :param transaction_log_stream: The transaction log, at the start of the first log entry
+    :param log_size: The size of the transaction log
+    :param expected_sequence_number: The secondary sequence number of the hive
+    :return: The number of dirty pages that were recovered
     """
     recovered_dirty_pages_count = 0
-    restored_hive_buffer = BytesIO(open(hive_path, "rb").read())
 
     hvle_block_start_offset = transaction_log_stream.tell()
 
@@ -36,46 +202,52 @@ def _parse_hvle_block(hive_path, transaction_log_stream, log_size, expected_sequ
 
         logger.info(f"Parsing HvLE block at {hex(hvle_block_start_offset)}")
         parsed_hvle_block = TRANSACTION_LOG.parse_stream(transaction_log_stream)
+        dirty_pages_offset = transaction_log_stream.tell() - hvle_block_start_offset
         logger.info(f"Currently at start of dirty pages: {transaction_log_stream.tell()}")
         logger.info(f"seq number: {parsed_hvle_block.sequence_number}")
         logger.info(f"dirty pages: {parsed_hvle_block.dirty_pages_count}")
 
+        transaction_log_stream.seek(hvle_block_start_offset)
+        log_entry = transaction_log_stream.read(parsed_hvle_block.log_size)
+        if not _is_log_entry_valid(log_entry, parsed_hvle_block):
+            # The size of an invalid entry cannot be trusted to find the next one, so the rest of the log is ignored
+            logger.warning(
+                f"The hashes of the HvLE block at {hex(hvle_block_start_offset)} do not match, "
+                f"ignoring it and the blocks after it"
+            )
+            break
+
         if parsed_hvle_block.sequence_number == expected_sequence_number:
             logger.info("This hvle block holds valid dirty blocks")
             expected_sequence_number += 1
 
+        log_entry = memoryview(log_entry)
         for dirty_page_entry in parsed_hvle_block.dirty_pages_references:
             # Write the actual dirty page to the original hive
             target_offset = REGF_HEADER_SIZE + dirty_page_entry.offset
-            restored_hive_buffer.seek(target_offset)
-            transaction_log_stream_offset = transaction_log_stream.tell()
-            dirty_page_buffer = transaction_log_stream.read(dirty_page_entry.size)
-            restored_hive_buffer.write(dirty_page_buffer)
+            dirty_page_map.write(target_offset, log_entry[dirty_pages_offset : dirty_pages_offset + dirty_page_entry.size])
             logger.info(
                 f"Restored {dirty_page_entry.size} bytes to offset {hex(target_offset)} "
-                f"from offset {hex(transaction_log_stream_offset)}"
+                f"from offset {hex(hvle_block_start_offset + dirty_pages_offset)}"
             )
+            dirty_pages_offset += dirty_page_entry.size
             recovered_dirty_pages_count += 1
 
         # TODO: update hive flags from hvle to original header
 
         # Update sequence numbers are at offsets 4 & 8:
-        restored_hive_buffer.seek(4)
-        restored_hive_buffer.write(Int32ul.build(expected_sequence_number))
-        restored_hive_buffer.write(Int32ul.build(expected_sequence_number))
+        dirty_page_map.write(4, Int32ul.build(expected_sequence_number) * 2)
 
         # Update hbins size from hvle to original header at offset 40
-        restored_hive_buffer.seek(40)
-        restored_hive_buffer.write(Int32ul.build(parsed_hvle_block.hive_bin_size))
+        dirty_page_map.write(40, Int32ul.build(parsed_hvle_block.hive_bin_size))
 
         transaction_log_stream.seek(hvle_block_start_offset + parsed_hvle_block.log_size)
         hvle_block_start_offset = hvle_block_start_offset + parsed_hvle_block.log_size
 
-    return restored_hive_buffer, recovered_dirty_pages_count
+    return recovered_dirty_pages_count
 
 
-def _parse_dirt_block(hive_path, transaction_log, hbins_data_size):
-    restored_hive_buffer = BytesIO(open(hive_path, "rb").read())
+def _parse_dirt_block(dirty_page_map, transaction_log, hbins_data_size):
     recovered_dirty_pages_count = 0
 
     dirty_vector_length = hbins_data_size // 4096
@@ -87,42 +259,38 @@ def _parse_dirt_block(hive_path, transaction_log, hbins_data_size):
     primary_file_base = 4096
     bitmap = transaction_log.read(dirty_vector_length)
 
-    bit_counter = 0
-    bitmap_offset = 0
-
-    # Tuples of offset in primary and offset in transaction log
-    offsets = []
-    while bit_counter < dirty_vector_length * 8:
-        is_bit_set = ((bitmap[bit_counter // 8] >> (bit_counter % 8)) & 1) != 0
-        if is_bit_set:
-            # We skip the basic block for the offsets
-            registry_offset = primary_file_base + (bit_counter * 512)
-
-            # And also the DIRT signature in the transaction log
-            transaction_log_offset = log_file_base + (bitmap_offset * 512)
+    # The dirty sectors follow each other in the transaction log, so every run of dirty sectors is copied at once
+    transaction_log_sector = 0
+    for first_sector, sectors_count in _iter_dirty_sector_runs(bitmap):
+        # We skip the basic block for the offsets
+        registry_offset = primary_file_base + first_sector * LOG_SECTOR_SIZE
 
-            offsets.append((registry_offset, transaction_log_offset))
-            bitmap_offset += 1
+        # And also the DIRT signature in the transaction log
+        transaction_log_offset = log_file_base + transaction_log_sector * LOG_SECTOR_SIZE
 
-        bit_counter += 1
+        size = sectors_count * LOG_SECTOR_SIZE
+        logger.debug(f"Reading {size} bytes from {transaction_log_offset} writing to {registry_offset}")
 
-    for registry_offset, transaction_log_offset in offsets:
-        logger.debug(f"Reading 512 bytes from {transaction_log_offset} writing to {registry_offset}")
-
-        restored_hive_buffer.seek(registry_offset)
         transaction_log.seek(transaction_log_offset)
+        dirty_page_map.write(registry_offset, transaction_log.read(size))
 
-        restored_hive_buffer.write(transaction_log.read(512))
+        transaction_log_sector += sectors_count
+        recovered_dirty_pages_count += sectors_count
+    return recovered_dirty_pages_count
 
-        recovered_dirty_pages_count += 1
-    return restored_hive_buffer, recovered_dirty_pages_count
+
+def _get_transaction_log_magic(transaction_log_path) -> bytes:
+    with open(transaction_log_path, "rb") as transaction_log:
+        # Skip the REGF header
+        transaction_log.seek(512, 0)
+        return transaction_log.read(4)
 
 
-def _parse_transaction_log(registry_hive, hive_path, transaction_log_path):
+def _parse_transaction_log(dirty_page_map, hive_header, transaction_log_path):
     log_size = os.path.getsize(transaction_log_path)
     logger.info(f"Log Size: {log_size}")
 
-    expected_sequence_number = registry_hive.header.secondary_sequence_num
+    expected_sequence_number = hive_header.secondary_sequence_num
 
     with open(transaction_log_path, "rb") as transaction_log:
         # Skip the REGF header
@@ -134,16 +302,68 @@ def _parse_transaction_log(registry_hive, hive_path, transaction_log_path):
 
         if magic == HVLE_TRANSACTION_LOG_MAGIC:
             # This is an HvLE block
-            restored_hive_buffer, recovered_dirty_pages_count = _parse_hvle_block(
-                hive_path, transaction_log, log_size, expected_sequence_number
-            )
+            recovered_dirty_pages_count = _parse_hvle_block(dirty_page_map, transaction_log, log_size, expected_sequence_number)
         elif magic == DIRT_TRANSACTION_LOG_MAGIC:
             # This is an old transaction log - DIRT
-            hbins_data_size = registry_hive.header.hive_bins_data_size
-            restored_hive_buffer, recovered_dirty_pages_count = _parse_dirt_block(hive_path, transaction_log, hbins_data_size)
+            hbins_data_size = hive_header.hive_bins_data_size
+            recovered_dirty_pages_count = _parse_dirt_block(dirty_page_map, transaction_log, hbins_data_size)
         else:
             raise RegistryRecoveryException(f"The transaction log vector magic was not expected: {magic}")
-    return restored_hive_buffer, recovered_dirty_pages_count
+    return recovered_dirty_pages_count
+
+
+def replay_transaction_logs(hive_buffer, primary_log_path, secondary_log_path=None) -> tuple[DirtyPageMap, int]:
+    """
+    Replay transaction logs over a hive, without changing it
+    :param hive_buffer: A view over the data of the hive, as returned by get_stream_buffer()
+    :param primary_log_path: The path to the primary log path
+    :param secondary_log_path: The path to the secondary log path (optional). It is replayed before the primary log.
+    :return: A DirtyPageMap of the recovered hive, and the number of dirty pages that were recovered
+    """
+    # Both logs are replayed with the sequence number and the hive bins size of the original hive
+    hive_header = REGF_HEADER.parse_stream(HiveCursor(hive_buffer))
+
+    transaction_log_paths = [secondary_log_path, primary_log_path] if secondary_log_path else [primary_log_path]
+    transaction_log_magics = [_get_transaction_log_magic(path) for path in transaction_log_paths]
+    page_size = LOG_SECTOR_SIZE if DIRT_TRANSACTION_LOG_MAGIC in transaction_log_magics else HIVE_PAGE_SIZE
+    dirty_page_map = DirtyPageMap(hive_buffer, page_size=page_size)
+
+    recovered_dirty_pages_total_count = 0
+    for transaction_log_path in transaction_log_paths:
+        recovered_dirty_pages_count = _parse_transaction_log(dirty_page_map, hive_header, transaction_log_path)
+        logger.info(f"Recovered {recovered_dirty_pages_count} pages from transaction log {transaction_log_path}")
+        recovered_dirty_pages_total_count += recovered_dirty_pages_count
+    return dirty_page_map, recovered_dirty_pages_total_count
+
+
+def open_recovered_hive_stream(hive_path, primary_log_path, secondary_log_path=None) -> tuple[mmap.mmap, int]:
+    """
+    Memory map a hive with its transaction logs replayed over it. The hive is mapped copy on write, so the file is not
+    changed and only the recovered pages take memory.
+    :param hive_path: The path to the original hive
+    :param primary_log_path: The path to the primary log path
+    :param secondary_log_path: The path to the secondary log path (optional)
+    :return: The memory map of the recovered hive, and the number of dirty pages that were recovered
+    """
+    with open(hive_path, "rb") as f:
+        stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    hive_buffer = memoryview(stream)
+    dirty_page_map, recovered_dirty_pages_count = replay_transaction_logs(
+        hive_buffer, primary_log_path, secondary_log_path=secondary_log_path
+    )
+
+    if len(dirty_page_map) > len(stream):
+        # A file mapping cannot grow, so a hive that the logs grew is copied into an anonymous mapping
+        recovered_stream = mmap.mmap(-1, len(dirty_page_map))
+        recovered_stream.write(hive_buffer)
+        hive_buffer.release()
+        stream.close()
+        stream = recovered_stream
+        hive_buffer = memoryview(stream)
+
+    dirty_page_map.apply(hive_buffer)
+    hive_buffer.release()
+    return stream, recovered_dirty_pages_count
 
 
 def apply_transaction_logs(
@@ -162,38 +382,18 @@ def apply_transaction_logs(
     :param verbose: verbosity
     :return:
     """
-    recovered_dirty_pages_total_count = 0
-
     if not restored_hive_path:
         restored_hive_path = f"{hive_path}.restored"
 
-    registry_hive = RegistryHive(hive_path)
-
-    if secondary_log_path:
-        registry_hive = RegistryHive(hive_path)
-        restored_hive_buffer, recovered_dirty_pages_count = _parse_transaction_log(registry_hive, hive_path, secondary_log_path)
-        # Write to disk the modified registry hive
-        with open(restored_hive_path, "wb") as f:
-            restored_hive_buffer.seek(0)
-            f.write(restored_hive_buffer.read())
-
-        recovered_dirty_pages_total_count += recovered_dirty_pages_count
-        logger.info(f"Recovered {recovered_dirty_pages_count} pages from secondary transaction log")
-
-    # Parse the primary transaction log
-    log_size = os.path.getsize(primary_log_path)
-    logger.info(f"Log Size: {log_size}")
-
-    # If no secondary transaction log was give, apply the first transaction log on the original hive
-    target_hive = restored_hive_path if secondary_log_path else hive_path
-    restored_hive_buffer, recovered_dirty_pages_count = _parse_transaction_log(registry_hive, target_hive, primary_log_path)
-    logger.info(f"Recovered {recovered_dirty_pages_count} pages from primary transaction log")
-
-    recovered_dirty_pages_total_count += recovered_dirty_pages_count
+    with open_hive_stream(hive_path, use_mmap=True) as stream:
+        hive_buffer = get_stream_buffer(stream)
+        dirty_page_map, recovered_dirty_pages_total_count = replay_transaction_logs(
+            hive_buffer, primary_log_path, secondary_log_path=secondary_log_path
+        )
 
-    # Write to disk the modified registry hive
-    with open(restored_hive_path, "wb") as f:
-        restored_hive_buffer.seek(0)
-        f.write(restored_hive_buffer.read())
+        # Written to a temporary file first, as the restored hive may replace the hive that is read
+        dirty_page_map.flush(f"{restored_hive_path}.tmp")
+        hive_buffer.release()
+    os.replace(f"{restored_hive_path}.tmp", restored_hive_path)
 
     return restored_hive_path, recovered_dirty_pages_total_count
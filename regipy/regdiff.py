@@ -1,13 +1,59 @@
+"""
+Compare two hives.
+
+The key trees of both hives are walked together. The subkeys of every key that is in both hives are sorted by name
+and merged, so keys that are only in one of the hives are found without looking up any path, and every key of each
+hive is visited once. The values of keys that are in both hives are hashed, and only decoded if their hashes differ.
+When the digests of both hives are available (see regipy.digests), subtrees with the same digest in both hives are
+skipped without walking them.
+"""
+
+import heapq
+import itertools
 import logging
 import os
-from typing import Any
+from collections.abc import Iterator
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
-from regipy.exceptions import RegistryKeyNotFoundException
-from regipy.registry import NKRecord, RegistryHive
-from regipy.utils import calculate_sha1, convert_wintime
+from regipy.digests import get_value_digest
+from regipy.exceptions import RegipyGeneralException, RegistryKeyNotFoundException, RegistryParsingException
+from regipy.registry import LazyValue, LIRecord, NKRecord, RegistryHive
+from regipy.utils import (
+    TIMESTAMP_BATCH_SIZE,
+    batched,
+    calculate_sha1,
+    convert_wintime,
+    convert_wintimes,
+    trim_registry_data_for_error_msg,
+)
 
 logger = logging.getLogger(__name__)
 
+# The changes of a key between two consecutive snapshots
+KEY_ADDED = "added"
+KEY_REMOVED = "removed"
+KEY_MODIFIED = "modified"
+
+
+@dataclass
+class KeyChange:
+    # The index of the snapshot in which the key was changed, compared to the snapshot before it
+    snapshot_index: int
+    change: str
+    # The timestamp of the key in that snapshot, None if the key was removed
+    timestamp: Optional[str] = None
+    new_values: list[str] = field(default_factory=list)
+    deleted_values: list[str] = field(default_factory=list)
+    modified_values: list[str] = field(default_factory=list)
+
+
+@dataclass
+class KeyHistory:
+    path: str
+    changes: list[KeyChange]
+
 
 def get_subkeys_and_timestamps(registry_hive):
     subkeys_and_timestamps = set()
@@ -31,7 +77,7 @@ def get_timestamp_for_subkeys(registry_hive, subkey_list):
         except RegistryKeyNotFoundException:
             logger.exception(f"Could not obtain timestamp for subkey {subkey_path}")
             continue
-        yield subkey_path, convert_wintime(subkey.header.last_modified, as_json=True)
+        yield subkey_path, convert_wintime(subkey.last_modified, as_json=True)
 
 
 def _get_name_value_tuples(subkey: NKRecord) -> set[tuple[str, Any]]:
@@ -52,99 +98,425 @@ def _get_name_value_tuples(subkey: NKRecord) -> set[tuple[str, Any]]:
     return values_tuple
 
 
-def compare_hives(first_hive_path, second_hive_path, verbose=False):
-    # The list will contain tuples, in the following format: (Difference type, first value, second value, description)
-    found_differences = []
+def _get_sorted_subkeys(nk_record: NKRecord) -> list[tuple[tuple[str, str], NKRecord]]:
+    """
+    The subkeys of a key, sorted by their names, with the names they are sorted by
+    """
+    # Subkey lists are stored sorted by their uppercase names, so this sort usually only confirms the order
+    subkeys = [
+        ((subkey.name.upper(), subkey.name), subkey)
+        for subkey in nk_record.iter_subkeys() or ()
+        if not isinstance(subkey, LIRecord)
+    ]
+    subkeys.sort(key=lambda entry: entry[0])
+    return subkeys
+
+
+def _get_subkey_path(parent_path: Optional[str], name: str) -> str:
+    # The same paths as recurse_subkeys(), where the subkeys of the root key have no parent path
+    return rf"{parent_path}\{name}" if parent_path else f"\\{name}"
+
+
+def _iter_subtree_keys(nk_record: NKRecord, path: str) -> Iterator[tuple[NKRecord, str]]:
+    """
+    Walk a key and its subkeys, with their paths, each key before its subkeys
+    """
+    stack = [(nk_record, path)]
+    while stack:
+        subkey, subkey_path = stack.pop()
+        # A corrupted name can contain backslashes, and then the key and its subkeys cannot be found by their paths
+        if "\\" in subkey.name:
+            logger.warning(f"Skipping {trim_registry_data_for_error_msg(subkey_path)}, its name contains a backslash")
+            continue
+
+        yield subkey, subkey_path
+        stack.extend((child, _get_subkey_path(subkey_path, child.name)) for _, child in reversed(_get_sorted_subkeys(subkey)))
+
+
+def _iter_subtree_timestamps(nk_record: NKRecord, path: str) -> Iterator[tuple[str, str]]:
+    """
+    Yield the path and the timestamp of a key and of all of its subkeys
+    """
+    for keys in batched(_iter_subtree_keys(nk_record, path), TIMESTAMP_BATCH_SIZE):
+        timestamps = convert_wintimes((subkey.last_modified for subkey, _ in keys), as_json=True)
+        for (_, subkey_path), timestamp in zip(keys, timestamps):
+            yield subkey_path, timestamp
+
+
+def _get_value_digests(nk_record: NKRecord) -> list[tuple[LazyValue, Optional[bytes]]]:
+    return [(lazy_value, get_value_digest(lazy_value)) for lazy_value in nk_record.iter_lazy_values(as_json=True)]
+
+
+def _values_are_identical(first_value_digests, second_value_digests) -> bool:
+    if len(first_value_digests) != len(second_value_digests):
+        return False
+    for (first_value, first_digest), (second_value, second_digest) in zip(first_value_digests, second_value_digests):
+        if first_digest is None or first_value.name != second_value.name or first_digest != second_digest:
+            return False
+    return True
+
+
+def _iter_new_values(first_nk_record: NKRecord, second_nk_record: NKRecord, path, ts_1, ts_2):
+    """
+    The new_value differences of two keys, with one difference per element of list values
+    """
+    # Compare values between the subkeys
+    first_subkey_values = set()
+    second_subkey_values = set()
+
+    if first_nk_record.values_count:
+        first_subkey_values = _get_name_value_tuples(first_nk_record)
+
+    if second_nk_record.values_count:
+        second_subkey_values = _get_name_value_tuples(second_nk_record)
+
+    # If one hive or the other contain values, and they are different, compare values
+    if (first_subkey_values or second_subkey_values) and (first_subkey_values != second_subkey_values):
+        first_hive_value_names = {x[0] for x in first_subkey_values}
+        second_hive_value_names = {x[0] for x in second_subkey_values}
+
+        values_in_first_but_not_in_second = first_hive_value_names - second_hive_value_names
+        values_in_second_but_not_in_first = second_hive_value_names - first_hive_value_names
+
+        # If there are value names that are present in the first subkey but not the second
+        # Iterate over all values in the first subkey
+        # If the value name is one of those that is not on the second subkey, add it to the set
+        if values_in_first_but_not_in_second:
+            for n, d in get_values_from_tuples(first_subkey_values, values_in_first_but_not_in_second):
+                yield "new_value", f"{n}: {d} @ {ts_1}", None, path
+
+        if values_in_second_but_not_in_first:
+            for n, d in get_values_from_tuples(second_subkey_values, values_in_second_but_not_in_first):
+                yield "new_value", None, f"{n}: {d} @ {ts_2}", path
+
+
+def _iter_value_changes(first_value_digests, second_value_digests, path, ts_1, ts_2):
+    """
+    The new_value, deleted_value and modified_value differences of two keys, with one difference per value
+    """
+    # Corrupted values are skipped, as iter_values() does
+    first_values = {value.name: (value, digest) for value, digest in first_value_digests if not value.is_corrupted}
+    second_values = {value.name: (value, digest) for value, digest in second_value_digests if not value.is_corrupted}
+
+    for name, (value, _) in first_values.items():
+        if name not in second_values:
+            yield "deleted_value", f"{name}: {value.value} @ {ts_1}", None, path
+
+    for name, (second_value, second_digest) in second_values.items():
+        if name not in first_values:
+            yield "new_value", None, f"{name}: {second_value.value} @ {ts_2}", path
+            continue
+
+        first_value, first_digest = first_values[name]
+        if first_digest is not None and first_digest == second_digest:
+            continue
+        if (first_value.value_type, first_value.value) != (second_value.value_type, second_value.value):
+            yield (
+                "modified_value",
+                f"{name}: {first_value.value} @ {ts_1}",
+                f"{name}: {second_value.value} @ {ts_2}",
+                path,
+            )
+
+
+def _iter_key_differences(
+    first_nk_record: NKRecord, second_nk_record: NKRecord, path: str, detailed: bool, values_are_identical=False
+):
+    """
+    Compare the values of a key that is in both hives
+    """
+    # The key digests are the same
+    if values_are_identical:
+        return
+
+    ts_1 = convert_wintime(first_nk_record.last_modified)
+    ts_2 = convert_wintime(second_nk_record.last_modified)
+
+    # Without detailed differences, only the values of keys that were modified are compared
+    if ts_1 == ts_2 and not detailed:
+        return
+
+    first_value_digests = _get_value_digests(first_nk_record)
+    second_value_digests = _get_value_digests(second_nk_record)
+    if _values_are_identical(first_value_digests, second_value_digests):
+        return
+
+    if detailed:
+        yield from _iter_value_changes(first_value_digests, second_value_digests, path, ts_1, ts_2)
+    else:
+        yield from _iter_new_values(first_nk_record, second_nk_record, path, ts_1, ts_2)
+
 
+def iter_registry_hive_differences(
+    first_registry_hive: RegistryHive, second_registry_hive: RegistryHive, detailed=False, use_digests=None
+) -> Iterator[tuple[str, Any, Any, str]]:
+    """
+    Compare two hives, and yield the differences as they are found.
+    Both key trees are walked together, merging the subkeys of every key that is in both hives by name,
+    so every key of each hive is visited once. Values are only decoded if their hashes differ.
+    :param first_registry_hive: A RegistryHive object
+    :param second_registry_hive: A RegistryHive object
+    :param detailed: By default, the values of the keys whose timestamps differ are compared, and value names that are
+                     only in one of the keys are new_value differences, with one difference per element of list values.
+                     If True, the values of all the keys in both hives are compared, keys and values that are only in
+                     the first hive are deleted_subkey and deleted_value differences, and values whose data or type
+                     changed are modified_value differences.
+    :param use_digests: Whether to skip the subtrees that have the same digests in both hives, and the values of keys
+                        that have the same key digests (see RegistryHive.get_digests()). By default, digests are only
+                        used if both hives have them, for example from their indexes. If True, the digests are computed
+                        if needed, which walks both hives once, and they are kept on the hives for the next comparisons.
+    :return: Tuples of (difference type, first value, second value, description)
+    """
+    if use_digests is None:
+        use_digests = first_registry_hive.has_digests and second_registry_hive.has_digests
+
+    if first_registry_hive.header.hive_bins_data_size != second_registry_hive.header.hive_bins_data_size:
+        yield (
+            "different_hive_bin_data_size",
+            first_registry_hive.header.hive_bins_data_size,
+            second_registry_hive.header.hive_bins_data_size,
+            "",
+        )
+
+    first_only_subkey = "deleted_subkey" if detailed else "new_subkey"
+
+    # Pairs of keys that are in both hives, with their path. The path of the root key is None, as in recurse_subkeys()
+    stack = [(first_registry_hive.root, second_registry_hive.root, None)]
+    while stack:
+        first_nk_record, second_nk_record, path = stack.pop()
+        values_are_identical = False
+        if use_digests:
+            first_digests = first_registry_hive.get_digests(first_nk_record)
+            second_digests = second_registry_hive.get_digests(second_nk_record)
+            # Nothing under these keys is different
+            if first_digests.subtree_digest is not None and first_digests.subtree_digest == second_digests.subtree_digest:
+                continue
+            values_are_identical = (
+                first_digests.key_digest is not None and first_digests.key_digest == second_digests.key_digest
+            )
+
+        key_path = path or "\\"
+        try:
+            yield from _iter_key_differences(first_nk_record, second_nk_record, key_path, detailed, values_are_identical)
+        except RegistryParsingException as ex:
+            logger.error(f"Could not compare the values of {trim_registry_data_for_error_msg(key_path)}: {ex}")
+
+        first_subkeys = _get_sorted_subkeys(first_nk_record)
+        second_subkeys = _get_sorted_subkeys(second_nk_record)
+        common_subkeys = []
+        first_index = second_index = 0
+        while first_index < len(first_subkeys) or second_index < len(second_subkeys):
+            first_sort_key, first_subkey = first_subkeys[first_index] if first_index < len(first_subkeys) else (None, None)
+            second_sort_key, second_subkey = (
+                second_subkeys[second_index] if second_index < len(second_subkeys) else (None, None)
+            )
+
+            if second_subkey is None or (first_subkey is not None and first_sort_key < second_sort_key):
+                first_subkey_path = _get_subkey_path(path, first_subkey.name)
+                for subkey_path, ts in _iter_subtree_timestamps(first_subkey, first_subkey_path):
+                    yield first_only_subkey, ts, None, subkey_path
+                first_index += 1
+            elif first_subkey is None or second_sort_key < first_sort_key:
+                second_subkey_path = _get_subkey_path(path, second_subkey.name)
+                for subkey_path, ts in _iter_subtree_timestamps(second_subkey, second_subkey_path):
+                    yield "new_subkey", None, ts, subkey_path
+                second_index += 1
+            else:
+                common_subkeys.append((first_subkey, second_subkey, _get_subkey_path(path, first_subkey.name)))
+                first_index += 1
+                second_index += 1
+
+        # Reversed, so the subkeys are compared in order
+        stack.extend(reversed(common_subkeys))
+
+
+def iter_hive_differences(
+    first_hive_path, second_hive_path, detailed=False, index_path=None
+) -> Iterator[tuple[str, Any, Any, str]]:
+    """
+    Compare two hive files, and yield the differences as they are found. See iter_registry_hive_differences()
+    :param first_hive_path: The path of the first hive
+    :param second_hive_path: The path of the second hive
+    :param detailed: Whether to report modified and deleted values, see iter_registry_hive_differences()
+    :param index_path: A directory of indexes (see RegistryHive.build_index()). The indexes of the hives are built
+                       if they are not there, and their digests are used to skip the identical parts of the hives.
+    :return: Tuples of (difference type, first value, second value, description)
+    """
     # Compare hash, verify they are indeed different
     first_hive_sha1 = calculate_sha1(first_hive_path)
     second_hive_sha1 = calculate_sha1(second_hive_path)
 
     if first_hive_sha1 == second_hive_sha1:
         logger.info("Hives have the same hash!")
-        return found_differences
+        return
 
-    # Compare header parameters
-    first_registry_hive = RegistryHive(first_hive_path)
-    second_registry_hive = RegistryHive(second_hive_path)
-    if first_registry_hive.header.hive_bins_data_size != second_registry_hive.header.hive_bins_data_size:
-        found_differences.append(
-            (
-                "different_hive_bin_data_size",
-                first_registry_hive.header.hive_bins_data_size,
-                second_registry_hive.header.hive_bins_data_size,
-                "",
-            )
-        )
+    logger.info(f"Comparing {os.path.basename(first_hive_path)} and {os.path.basename(second_hive_path)}")
+    with RegistryHive(first_hive_path) as first_registry_hive, RegistryHive(second_hive_path) as second_registry_hive:
+        if index_path:
+            for registry_hive in (first_registry_hive, second_registry_hive):
+                if not registry_hive.load_index(index_path):
+                    registry_hive.build_index(index_path)
+        yield from iter_registry_hive_differences(first_registry_hive, second_registry_hive, detailed=detailed)
 
-    # Enumerate subkeys for each hive and start comparing
-    logger.info(f"Enumerating subkeys in {os.path.basename(first_hive_path)}")
-    first_hive_subkeys = get_subkeys_and_timestamps(first_registry_hive)
 
-    logger.info(f"Enumerating subkeys in {os.path.basename(second_hive_path)}")
-    second_hive_subkeys = get_subkeys_and_timestamps(second_registry_hive)
+def compare_hives(first_hive_path, second_hive_path, verbose=False, detailed=False, index_path=None):
+    """
+    Compare two hive files
+    :param first_hive_path: The path of the first hive
+    :param second_hive_path: The path of the second hive
+    :param verbose: Unused, kept for compatibility
+    :param detailed: Whether to report modified and deleted values, see iter_registry_hive_differences()
+    :param index_path: A directory of indexes to use and build, see iter_hive_differences()
+    :return: A list of tuples, in the following format: (Difference type, first value, second value, description)
+    """
+    return list(iter_hive_differences(first_hive_path, second_hive_path, detailed=detailed, index_path=index_path))
 
-    # Get a set of keys present in one hive and not the other and vice versa
-    first_hive_subkey_names = {x[0] for x in first_hive_subkeys if x[0] is not None}
-    second_hive_subkey_names = {x[0] for x in second_hive_subkeys if x[0] is not None}
 
-    found_differences.extend(
-        ("new_subkey", ts, None, subkey_path)
-        for subkey_path, ts in get_timestamp_for_subkeys(
-            first_registry_hive, first_hive_subkey_names - second_hive_subkey_names
-        )
-    )
+def _merge_subkeys(nk_records: list[Optional[NKRecord]]) -> Iterator[tuple[str, list[Optional[NKRecord]]]]:
+    """
+    Merge the sorted subkeys of the same key in several hives
+    :param nk_records: The key in every hive, None in the hives where it does not exist
+    :return: (name, subkeys) tuples, in order, with the subkey in every hive, or None where it does not exist
+    """
+    sorted_subkeys = [
+        [(sort_key, index, subkey) for sort_key, subkey in _get_sorted_subkeys(nk_record)]
+        for index, nk_record in enumerate(nk_records)
+        if nk_record is not None
+    ]
+    for sort_key, entries in itertools.groupby(
+        heapq.merge(*sorted_subkeys, key=lambda entry: entry[:2]), key=lambda entry: entry[0]
+    ):
+        subkeys: list[Optional[NKRecord]] = [None] * len(nk_records)
+        for _, index, subkey in entries:
+            subkeys[index] = subkey
+        yield sort_key[1], subkeys
+
 
-    found_differences.extend(
-        ("new_subkey", None, ts, subkey_path)
-        for subkey_path, ts in get_timestamp_for_subkeys(
-            second_registry_hive, second_hive_subkey_names - first_hive_subkey_names
+def _get_named_value_digests(nk_record: NKRecord) -> dict[str, Optional[bytes]]:
+    return {lazy_value.name: get_value_digest(lazy_value) for lazy_value in nk_record.iter_lazy_values()}
+
+
+def _get_key_changes(
+    registry_hives: list[RegistryHive], nk_records: list[Optional[NKRecord]], path: str, detailed: bool, use_digests: bool
+) -> list[KeyChange]:
+    """
+    Compare a key in every snapshot with the same key in the snapshot before it
+    """
+    changes = []
+    value_digests: dict[int, dict[str, Optional[bytes]]] = {}
+
+    def get_value_digests(index):
+        if index not in value_digests:
+            value_digests[index] = _get_named_value_digests(nk_records[index])
+        return value_digests[index]
+
+    for index in range(1, len(nk_records)):
+        previous_nk_record, nk_record = nk_records[index - 1], nk_records[index]
+        if nk_record is None:
+            if previous_nk_record is not None:
+                changes.append(KeyChange(index, KEY_REMOVED))
+            continue
+
+        timestamp = convert_wintime(nk_record.last_modified, as_json=True)
+        if previous_nk_record is None:
+            changes.append(KeyChange(index, KEY_ADDED, timestamp))
+            continue
+
+        is_modified = previous_nk_record.last_modified != nk_record.last_modified
+        # Without detailed changes, only the values of keys that were modified are compared
+        if not is_modified and not detailed:
+            continue
+
+        if use_digests:
+            previous_key_digest = registry_hives[index - 1].get_digests(previous_nk_record).key_digest
+            if (
+                previous_key_digest is not None
+                and previous_key_digest == registry_hives[index].get_digests(nk_record).key_digest
+            ):
+                if is_modified:
+                    changes.append(KeyChange(index, KEY_MODIFIED, timestamp))
+                continue
+
+        try:
+            previous_values, values = get_value_digests(index - 1), get_value_digests(index)
+        except RegistryParsingException as ex:
+            logger.error(f"Could not compare the values of {trim_registry_data_for_error_msg(path)}: {ex}")
+            previous_values, values = {}, {}
+
+        key_change = KeyChange(
+            index,
+            KEY_MODIFIED,
+            timestamp,
+            new_values=[name for name in values if name not in previous_values],
+            deleted_values=[name for name in previous_values if name not in values],
+            # A value whose data could not be read is reported as modified
+            modified_values=[
+                name
+                for name, digest in values.items()
+                if name in previous_values and (digest is None or digest != previous_values[name])
+            ],
         )
-    )
-
-    # Remove duplicate keys from each of the sets
-    first_hive_diff_subkeys = first_hive_subkeys - second_hive_subkeys
-    second_hive_diff_subkeys = second_hive_subkeys - first_hive_subkeys
-
-    # Find subkeys that exist in both hives, but were modified. Look for new values and subkeys
-    for path_1, ts_1 in first_hive_diff_subkeys:
-        for path_2, ts_2 in second_hive_diff_subkeys:
-            if path_1 and path_1 == path_2 and ts_1 != ts_2:
-                first_subkey_nk_record = first_registry_hive.get_key(path_1)
-                second_subkey_nk_record = second_registry_hive.get_key(path_2)
-
-                # Compare values between the subkeys
-                first_subkey_values = set()
-                second_subkey_values = set()
-
-                if first_subkey_nk_record.values_count:
-                    first_subkey_values = _get_name_value_tuples(first_subkey_nk_record)
-
-                if second_subkey_nk_record.values_count:
-                    second_subkey_values = _get_name_value_tuples(second_subkey_nk_record)
-
-                # If one hive or the other contain values, and they are different, compare values
-                if (first_subkey_values or second_subkey_values) and (first_subkey_values != second_subkey_values):
-                    first_hive_value_names = {x[0] for x in first_subkey_values}
-                    second_hive_value_names = {x[0] for x in second_subkey_values}
-
-                    values_in_first_but_not_in_second = first_hive_value_names - second_hive_value_names
-                    values_in_second_but_not_in_first = second_hive_value_names - first_hive_value_names
-
-                    # If there are value names that are present in the first subkey but not the second
-                    # Iterate over all values in the first subkey
-                    # If the value name is one of those that is not on the second subkey, add it to the set
-                    if values_in_first_but_not_in_second:
-                        found_differences.extend(
-                            ("new_value", f"{n}: {d} @ {ts_1}", None, path_1)
-                            for n, d in get_values_from_tuples(first_subkey_values, values_in_first_but_not_in_second)
-                        )
-
-                    if values_in_second_but_not_in_first:
-                        found_differences.extend(
-                            ("new_value", None, f"{n}: {d} @ {ts_2}", path_1)
-                            for n, d in get_values_from_tuples(second_subkey_values, values_in_second_but_not_in_first)
-                        )
-
-                # We do not compare subkeys for each subkey, because we would have detected those.
-    return found_differences
+        if is_modified or key_change.new_values or key_change.deleted_values or key_change.modified_values:
+            changes.append(key_change)
+    return changes
+
+
+def iter_snapshot_changes(registry_hives: list[RegistryHive], detailed=False, use_digests=None) -> Iterator[KeyHistory]:
+    """
+    Compare snapshots of the same hive, and yield the history of every key that changed in any of them.
+    The key trees of all the snapshots are walked together, so every key of each snapshot is visited once,
+    and only the subkeys of the keys being compared are kept in memory.
+    :param registry_hives: RegistryHive objects of the snapshots, from the oldest to the newest
+    :param detailed: By default, the values of a key are only compared if its timestamp changed.
+                     If True, the values of all the keys are compared.
+    :param use_digests: Whether to skip the subtrees that have the same digests in all the snapshots,
+                        see iter_registry_hive_differences(). By default, if all the snapshots have digests.
+    :return: KeyHistory objects, every key before its subkeys, with the changes of the key compared to
+             the snapshot before them. Keys that did not change are not yielded.
+    """
+    if len(registry_hives) < 2:
+        raise RegipyGeneralException("At least two snapshots are required")
+
+    if use_digests is None:
+        use_digests = all(registry_hive.has_digests for registry_hive in registry_hives)
+
+    # Keys with their path, in every snapshot. The path of the root key is None, as in recurse_subkeys()
+    stack = [(None, [registry_hive.root for registry_hive in registry_hives])]
+    while stack:
+        path, nk_records = stack.pop()
+        if use_digests and all(nk_record is not None for nk_record in nk_records):
+            subtree_digests = {
+                registry_hive.get_digests(nk_record).subtree_digest
+                for registry_hive, nk_record in zip(registry_hives, nk_records)
+            }
+            # Nothing under this key changed
+            if len(subtree_digests) == 1 and None not in subtree_digests:
+                continue
+
+        key_path = path or "\\"
+        changes = _get_key_changes(registry_hives, nk_records, key_path, detailed, use_digests)
+        if changes:
+            yield KeyHistory(key_path, changes)
+
+        subkeys = [(_get_subkey_path(path, name), subkeys) for name, subkeys in _merge_subkeys(nk_records)]
+        # Reversed, so the subkeys are compared in order
+        stack.extend(reversed(subkeys))
+
+
+def compare_snapshots(hive_paths, detailed=False, index_path=None) -> Iterator[KeyHistory]:
+    """
+    Compare snapshots of the same hive, see iter_snapshot_changes(). The hives are memory mapped.
+    :param hive_paths: The paths of the snapshots, from the oldest to the newest
+    :param detailed: Whether to compare the values of all the keys, see iter_snapshot_changes()
+    :param index_path: A directory of indexes, whose digests are used to skip the subtrees that did not change.
+                       The indexes of the snapshots are built if they are not there.
+    :return: KeyHistory objects
+    """
+    with ExitStack() as exit_stack:
+        registry_hives = []
+        for hive_path in hive_paths:
+            registry_hive = exit_stack.enter_context(RegistryHive(hive_path, use_mmap=True))
+            if index_path and not registry_hive.load_index(index_path):
+                registry_hive.build_index(index_path)
+            registry_hives.append(registry_hive)
+        yield from iter_snapshot_changes(registry_hives, detailed=detailed)
@@ -1,63 +1,89 @@
 import binascii
 import datetime as dt
+import hashlib
 import logging
-from dataclasses import asdict, dataclass, field
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from io import BytesIO
 from typing import Optional, Union
 
 from construct import (
-    Bytes,
     ConstError,
+    Container,
     CString,
     EnumIntegerString,
     GreedyRange,
-    Int32sl,
     Int32ul,
     Int64ul,
     StreamError,
 )
 
+from regipy.digests import KeyDigests, iter_subtree_digests
 from regipy.exceptions import (
     NoRegistrySubkeysException,
-    RegipyGeneralException,
     RegistryKeyNotFoundException,
     RegistryParsingException,
     RegistryValueNotFoundException,
     UnidentifiedHiveException,
 )
+from regipy.fast_parsers import (
+    KeyNodeFields,
+    build_cm_key_node,
+    parse_cell_size,
+    parse_index_leaf,
+    parse_index_root,
+    parse_lf_lh_sk_element,
+    parse_uint32,
+    parse_value_key,
+    read_key_name,
+    unpack_cm_key_node,
+)
 from regipy.hive_types import SUPPORTED_HIVE_TYPES
+from regipy.index import HiveIndex, IndexedValue, build_hive_index, iter_key_paths, load_hive_index
+from regipy.recovery import open_recovered_hive_stream
 from regipy.security_utils import convert_sid, get_acls
+from regipy.serialization import value_to_dict
 from regipy.structs import (
     BIG_DATA_BLOCK,
-    CM_KEY_NODE,
+    BIG_DATA_SEGMENT_SIZE,
+    BIG_DATA_SIGNATURE,
     DEFAULT_VALUE,
     FAST_LEAF_SIGNATURE,
     HASH_LEAF_SIGNATURE,
     HBIN_HEADER,
-    INDEX_LEAF,
     INDEX_ROOT,
     INDEX_ROOT_SIGNATURE,
+    KEY_COMP_NAME,
+    KEY_NODE_FLAGS,
     LEAF_INDEX_SIGNATURE,
-    LF_LH_SK_ELEMENT,
     REGF_HEADER,
     REGF_HEADER_SIZE,
     SECURITY_DESCRIPTOR,
     SID,
-    VALUE_KEY,
     VALUE_TYPE_ENUM,
     SECURITY_KEY_v1_1,
 )
 from regipy.utils import (
     MAX_LEN,
-    boomerang_stream,
+    HiveCursor,
+    batched,
+    boomerang_stream,  # noqa: F401 - importable from regipy
+    calculate_key_name_hash,
     convert_wintime,
+    convert_wintimes,
+    get_stream_buffer,
     identify_hive_type,
+    open_hive_stream,
     trim_registry_data_for_error_msg,
     try_decode_binary,
 )
 
 logger = logging.getLogger(__name__)
 
+# The default number of key paths RegistryHive.get_key remembers
+KEY_CACHE_SIZE = 4096
+
 
 @dataclass
 class Cell:
@@ -96,6 +122,57 @@ class Value:
     is_corrupted: bool = False
 
 
+class LazyValue:
+    """
+    A value of a key, whose data is only read and decoded when it is accessed.
+    The decoded data is kept, so it is decoded once per object.
+    """
+
+    __slots__ = ("name", "value_type", "offset", "size", "_nk_record", "_vk", "_decode_options", "_decoded")
+
+    def __init__(self, nk_record, vk, offset, name, value_type, as_json=False, max_len=MAX_LEN, trim_values=True):
+        self.name = name
+        self.value_type = value_type
+        self.offset = offset
+        self.size = vk.data_size
+        self._nk_record = nk_record
+        self._vk = vk
+        self._decode_options = (as_json, max_len, trim_values)
+        self._decoded = None
+
+    def _decode(self):
+        if self._decoded is None:
+            self._decoded = self._nk_record._decode_value(self._vk, self.value_type, self.offset, *self._decode_options)
+        return self._decoded
+
+    @property
+    def value(self):
+        return self._decode()[0]
+
+    @property
+    def is_corrupted(self) -> bool:
+        return self._decode()[1]
+
+    @property
+    def raw_data(self) -> bytes:
+        """
+        The data of the value as it is stored, without decoding it. Big data values are joined from their segments.
+        """
+        data = self._nk_record.read_value(self._vk, self._nk_record._stream, buffer=self._nk_record._buffer).value
+        if self._vk.data_size < 0x80000000 and self.size > BIG_DATA_SEGMENT_SIZE and data[:2] == BIG_DATA_SIGNATURE:
+            return self._nk_record.read_big_data(data, self.size)
+        return data
+
+    def to_value(self) -> Optional[Value]:
+        """
+        Decode the data, and return it as a Value. Corrupted values are None.
+        """
+        actual_value, is_corrupted = self._decode()
+        if is_corrupted:
+            return None
+        return Value(name=self.name, value_type=self.value_type, value=actual_value)
+
+
 @dataclass
 class Subkey:
     subkey_name: str
@@ -116,10 +193,71 @@ class RIRecord:
         self.header = INDEX_ROOT.parse_stream(stream)
 
 
+class KeyPathCache:
+    """
+    A bounded, least recently used mapping of normalized key paths to the offsets of their key nodes.
+    hits counts the lookups that were resolved from the cache, partial_hits the ones that continued from
+    a cached intermediate path, and misses the ones that had to start from the root key.
+    It can be shared by threads.
+    """
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._offsets: OrderedDict[tuple[str, ...], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def get(self, key_path_parts: tuple[str, ...]) -> Optional[int]:
+        with self._lock:
+            offset = self._offsets.get(key_path_parts)
+            if offset is not None:
+                self._offsets.move_to_end(key_path_parts)
+            return offset
+
+    def put(self, key_path_parts: tuple[str, ...], offset: int):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._offsets[key_path_parts] = offset
+            self._offsets.move_to_end(key_path_parts)
+            if len(self._offsets) > self.max_size:
+                self._offsets.popitem(last=False)
+
+    def count(self, counter: str):
+        """
+        Count a lookup
+        :param counter: "hits", "partial_hits" or "misses"
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._offsets.clear()
+            self.hits = 0
+            self.partial_hits = 0
+            self.misses = 0
+
+
 class RegistryHive:
     CONTROL_SETS = [r"\ControlSet001", r"\ControlSet002"]
 
-    def __init__(self, hive_path, hive_type=None, partial_hive_path=None):
+    def __init__(
+        self,
+        hive_path,
+        hive_type=None,
+        partial_hive_path=None,
+        use_mmap=None,
+        key_cache_size=KEY_CACHE_SIZE,
+        index_path=None,
+        primary_log_path=None,
+        secondary_log_path=None,
+    ):
         """
         Represents a registry hive
         :param hive_path: Path to the registry hive
@@ -128,21 +266,45 @@ class RegistryHive:
         :param partial_hive_path: The path from which the partial hive actually starts, for example:
                                   hive_type=ntuser partial_hive_path="/Software" would mean
                                   this is actually a HKCU hive, starting from HKCU/Software
+        :param use_mmap: Memory map the hive instead of reading it into memory, so resident memory only grows
+                         with the pages that are actually accessed. If None, only hives bigger than
+                         MMAP_THRESHOLD are memory mapped.
+        :param key_cache_size: The number of key paths get_key remembers, including intermediate paths. 0 disables it.
+        :param index_path: The path of an index built with build_index(), or of a directory of indexes.
+                           It is used if it was built from the same hive, see load_index().
+        :param primary_log_path: A transaction log to replay over the hive. The hive is recovered in memory, as
+                                 apply_transaction_logs() would restore it, and is always memory mapped.
+                                 The hive file is not changed, use save() to write the recovered hive.
+        :param secondary_log_path: A second transaction log, replayed before the primary log
         """
 
+        self.hive_path = hive_path
         self.partial_hive_path = None
         self.hive_type = None
 
-        with open(hive_path, "rb") as f:
-            self._stream = BytesIO(f.read())
+        self.primary_log_path = primary_log_path
+        self.secondary_log_path = secondary_log_path
+        self.recovered_dirty_pages_count = 0
 
-        with boomerang_stream(self._stream) as s:
-            self.header = REGF_HEADER.parse_stream(s)
+        if primary_log_path:
+            self._stream, self.recovered_dirty_pages_count = open_recovered_hive_stream(
+                hive_path, primary_log_path, secondary_log_path=secondary_log_path
+            )
+        else:
+            self._stream = open_hive_stream(hive_path, use_mmap=use_mmap)
+        self.is_mmap = not isinstance(self._stream, BytesIO)
+
+        # A zero-copy view over the whole hive, shared by all the records parsed from it
+        self._buffer = get_stream_buffer(self._stream)
 
-            # Get the first cell in root HBin, which is the root NKRecord:
-            root_hbin = self.get_hbin_at_offset()
-            root_hbin_cell = next(root_hbin.iter_cells(s))
-            self.root = NKRecord(root_hbin_cell, s)
+        # Records are parsed from the buffer, or with a HiveCursor of their own, and never move the stream,
+        # so a hive can be read by several threads, and by interleaved generators
+        self.header = REGF_HEADER.parse_stream(HiveCursor(self._buffer))
+
+        # Get the first cell in root HBin, which is the root NKRecord:
+        root_hbin = self.get_hbin_at_offset()
+        root_hbin_cell = next(root_hbin.iter_cells(HiveCursor(self._buffer)))
+        self.root = NKRecord(root_hbin_cell, self._stream, buffer=self._buffer)
         self.name = self.header.file_name
 
         if hive_type:
@@ -161,6 +323,109 @@ class RegistryHive:
         if partial_hive_path:
             self.partial_hive_path = partial_hive_path
 
+        self.key_cache = KeyPathCache(max_size=key_cache_size)
+
+        self._sha1 = None
+
+        # The digests of the keys computed so far, by the offset of their key node
+        self._digests: dict[int, KeyDigests] = {}
+
+        self.index = None
+        if index_path:
+            self.load_index(index_path)
+
+    @property
+    def sha1(self) -> str:
+        """
+        The SHA-1 of the hive file, as calculated by calculate_sha1()
+        """
+        if self._sha1 is None:
+            self._sha1 = hashlib.sha1(self._buffer).hexdigest()
+        return self._sha1
+
+    def build_index(self, index_path) -> HiveIndex:
+        """
+        Index the keys and values of the hive into an SQLite database, and use it for get_key() and find_values()
+        :param index_path: The path of the index file, or of a directory of indexes,
+                           where the index will be named after the SHA-1 of the hive
+        :return: The HiveIndex
+        """
+        if self.index is not None:
+            self.index.close()
+        self.index = build_hive_index(self, index_path)
+        return self.index
+
+    def load_index(self, index_path) -> bool:
+        """
+        Use an index built with build_index(), if it was built from the same hive
+        :param index_path: The path of the index file, or of a directory of indexes
+        :return: Whether the index was loaded
+        """
+        hive_index = load_hive_index(index_path, self.sha1)
+        if hive_index is None:
+            return False
+
+        if self.index is not None:
+            self.index.close()
+        self.index = hive_index
+        return True
+
+    @property
+    def has_digests(self) -> bool:
+        """
+        Whether get_digests() can return the digests of the root key without computing the digests of the whole hive
+        """
+        return self.index is not None or self.root.offset in self._digests
+
+    def get_digests(self, nk_record=None) -> KeyDigests:
+        """
+        Get the key digest and the subtree digest of a key, see regipy.digests.
+        They are read from the index if one is loaded. Otherwise they are computed for the key and all the keys under
+        it on first use, and kept on the hive, so the subtree is walked once.
+        :param nk_record: An NKRecord of this hive, by default the root key
+        """
+        nk_record = nk_record or self.root
+        if self.index is not None:
+            digests = self.index.get_digests(nk_record.offset)
+            if digests is not None:
+                return digests
+
+        digests = self._digests.get(nk_record.offset)
+        if digests is None:
+            self._digests.update(iter_subtree_digests(nk_record))
+            digests = self._digests[nk_record.offset]
+        return digests
+
+    def save(self, path):
+        """
+        Write the data of the hive to a file, with the transaction logs the hive was opened with applied
+        :param path: The path of the file
+        """
+        with open(path, "wb") as f:
+            f.write(self._buffer)
+
+    def close(self):
+        """
+        Release the hive data. Records parsed from this hive can no longer be used afterwards.
+        Views over the hive data that are still referenced, such as big data segments, stay valid, and the hive data
+        is only freed when the last of them is. Calling close() again then frees it at once.
+        """
+        try:
+            if self.index is not None:
+                self.index.close()
+        finally:
+            try:
+                self._buffer.release()
+                self._stream.close()
+            except BufferError:
+                logger.debug("Views over the hive data are still referenced, it is freed when they are released")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def recurse_subkeys(
         self,
         nk_record=None,
@@ -168,6 +433,9 @@ class RegistryHive:
         as_json=False,
         is_init=True,
         fetch_values=True,
+        max_depth=None,
+        breadth_first=False,
+        timestamp_batch_size=1,
     ):
         """
         Recurse over a subkey, and yield all of its subkeys and values
@@ -176,76 +444,194 @@ class RegistryHive:
                           from ControlSet001 and not SYSTEM, there is no way to know that.
                           This string will be added as prefix to all paths.
         :param as_json: Whether to normalize the data as JSON or not
+        :param is_init: Whether to yield nk_record itself as well
         :param fetch_values: If False, subkey values will not be returned, but the iteration will be faster
+        :param max_depth: If given, do not go deeper than this many levels below nk_record
+        :param breadth_first: Yield nk_record first, and then its subkeys level by level.
+                              By default each subkey is yielded after all of its own subkeys, and nk_record is last.
+        :param timestamp_batch_size: Convert the timestamps of this many subkeys at once, for example
+                                     TIMESTAMP_BATCH_SIZE. The subkeys of a batch are walked before the first of them
+                                     is yielded, so this is for callers that read the whole tree.
+                                     Only used for depth first iteration.
         """
         # If None, will start iterating from Root NK entry
         if not nk_record:
             nk_record = self.root
 
-        # Iterate over subkeys
-        if nk_record.header.subkey_count:
-            for subkey in nk_record.iter_subkeys():
-                if path_root:
-                    subkey_path = rf"{path_root}\{subkey.name}" if path_root else rf"\{subkey.name}"
+        if breadth_first:
+            if is_init:
+                yield self._get_root_subkey_entry(nk_record, path_root, as_json)
+            if max_depth != 0:
+                yield from self._iter_subkeys_breadth_first(nk_record, path_root, as_json, fetch_values, max_depth)
+        else:
+            if max_depth != 0:
+                yield from self._iter_subkeys_depth_first(
+                    nk_record, path_root, as_json, fetch_values, max_depth, timestamp_batch_size
+                )
+            if is_init:
+                yield self._get_root_subkey_entry(nk_record, path_root, as_json)
+
+    def _iter_subkeys_depth_first(self, nk_record, path_root, as_json, fetch_values, max_depth, timestamp_batch_size):
+        """
+        Yield the subkeys of nk_record, each one after its own subkeys.
+        """
+        walk = self._walk_subkeys_depth_first(nk_record, path_root, max_depth)
+        if timestamp_batch_size <= 1:
+            for subkey, subkey_path, parent_path in walk:
+                yield self._get_subkey_entry(subkey, subkey_path, parent_path, as_json, fetch_values)
+            return
+
+        for keys in batched(walk, timestamp_batch_size):
+            timestamps = convert_wintimes((subkey.last_modified for subkey, _, _ in keys), as_json=as_json)
+            for (subkey, subkey_path, parent_path), timestamp in zip(keys, timestamps):
+                yield self._get_subkey_entry(subkey, subkey_path, parent_path, as_json, fetch_values, timestamp)
+
+    def _walk_subkeys_depth_first(self, nk_record, path_root, max_depth=None):
+        """
+        Walk the subkeys of nk_record, each one after its own subkeys.
+        Uses an explicit stack, so deep trees do not pile up generator frames or hit the recursion limit.
+        :return: (NKRecord, path, parent path) tuples
+        """
+        if not nk_record.subkey_count:
+            return
+
+        # Every frame holds the subkeys being iterated, the path of their parent, and the parent itself,
+        # with the path of its own parent, so it can be yielded once all of its subkeys were
+        stack = [(nk_record.iter_subkeys(), path_root, None, None)]
+        while stack:
+            subkeys, parent_path, parent, grandparent_path = stack[-1]
+            subkey = next(subkeys, None)
+            if subkey is None:
+                stack.pop()
+                if parent is not None:
+                    yield parent, parent_path, grandparent_path
+                continue
+
+            # Leaf Index records do not contain subkeys
+            if isinstance(subkey, LIRecord):
+                continue
+
+            subkey_path = rf"{parent_path}\{subkey.name}" if parent_path else f"\\{subkey.name}"
+            if subkey.subkey_count and (max_depth is None or len(stack) < max_depth):
+                stack.append((subkey.iter_subkeys(), subkey_path, subkey, parent_path))
+            else:
+                yield subkey, subkey_path, parent_path
+
+    def iter_keys_modified_between(self, start, end, nk_record=None, path_root=None, as_json=False, fetch_values=True):
+        """
+        Yield the keys whose last modification time is in a range, with the same entries recurse_subkeys() would yield
+        for them, in the same order. Values are only decoded for the keys in the range.
+        If an index is loaded and the whole hive is queried, the keys are looked up in the index instead.
+        :param start: A FILETIME (an integer, as in NKRecord.last_modified). Keys modified at this time are included
+        :param end: A FILETIME. Keys modified at this time are excluded
+        :param nk_record: an instance of NKRecord from which to start iterating, if None, will start from Root
+        :param path_root: A prefix for all the paths, see recurse_subkeys()
+        :param as_json: Whether to normalize the data as JSON or not
+        :param fetch_values: If False, subkey values will not be returned, but the iteration will be faster
+        """
+        for subkey, subkey_path, parent_path in self.iter_key_nodes_modified_between(start, end, nk_record, path_root):
+            if subkey_path is None:
+                yield self._get_root_subkey_entry(subkey, path_root, as_json)
+            else:
+                yield self._get_subkey_entry(subkey, subkey_path, parent_path, as_json, fetch_values)
+
+    def iter_key_nodes_modified_between(self, start, end, nk_record=None, path_root=None):
+        """
+        Walk the keys whose last modification time is in a range, like iter_keys_modified_between(), without building
+        their entries. Callers that only need some of the keys, or convert their timestamps in batches, use it to
+        avoid decoding the values of every key.
+        :param start: A FILETIME (an integer, as in NKRecord.last_modified). Keys modified at this time are included
+        :param end: A FILETIME. Keys modified at this time are excluded
+        :param nk_record: an instance of NKRecord from which to start iterating, if None, will start from Root
+        :param path_root: A prefix for all the paths, see recurse_subkeys()
+        :return: (NKRecord, path, parent path) tuples, in the order of recurse_subkeys(). The path of nk_record
+                 itself is None.
+        """
+        if not nk_record:
+            nk_record = self.root
+
+        if self.index is not None and nk_record.offset == self.root.offset and not path_root:
+            for indexed_key in self.index.iter_keys_modified_between(start, end):
+                if indexed_key.offset == nk_record.offset:
+                    yield nk_record, None, None
                 else:
-                    subkey_path = f"\\{subkey.name}"
+                    parent_path = indexed_key.path.rpartition("\\")[0]
+                    yield self._get_nk_record_at(indexed_key.offset), indexed_key.path, parent_path or None
+            return
 
+        # The timestamp is compared as it is stored, so there is no date to build for the keys out of the range
+        for subkey, subkey_path, parent_path in self._walk_subkeys_depth_first(nk_record, path_root):
+            if start <= subkey.last_modified < end:
+                yield subkey, subkey_path, parent_path
+
+        if start <= nk_record.last_modified < end:
+            yield nk_record, None, None
+
+    def _iter_subkeys_breadth_first(self, nk_record, path_root, as_json, fetch_values, max_depth):
+        """
+        Yield the subkeys of nk_record level by level
+        """
+        queue = deque([(nk_record, path_root, 1)])
+        while queue:
+            parent, parent_path, depth = queue.popleft()
+            if not parent.subkey_count:
+                continue
+
+            for subkey in parent.iter_subkeys():
                 # Leaf Index records do not contain subkeys
                 if isinstance(subkey, LIRecord):
                     continue
 
-                if subkey.subkey_count:
-                    yield from self.recurse_subkeys(
-                        nk_record=subkey,
-                        path_root=subkey_path,
-                        as_json=as_json,
-                        is_init=False,
-                        fetch_values=fetch_values,
-                    )
+                subkey_path = rf"{parent_path}\{subkey.name}" if parent_path else f"\\{subkey.name}"
+                yield self._get_subkey_entry(subkey, subkey_path, parent_path, as_json, fetch_values)
+                if max_depth is None or depth < max_depth:
+                    queue.append((subkey, subkey_path, depth + 1))
+
+    def _get_subkey_entry(self, subkey, subkey_path, parent_path, as_json, fetch_values, timestamp=None):
+        values = []
+        if fetch_values and subkey.values_count:
+            try:
+                if as_json:
+                    values = [value_to_dict(x) for x in subkey.iter_values(as_json=as_json)]
+                else:
+                    values = list(subkey.iter_values(as_json=as_json))
+            except RegistryParsingException:
+                logger.exception(f"Failed to parse hive value at path: {trim_registry_data_for_error_msg(parent_path)}")
+
+        if timestamp is None:
+            timestamp = convert_wintime(subkey.last_modified, as_json=as_json)
+        return Subkey(
+            subkey_name=subkey.name,
+            path=subkey_path,
+            timestamp=timestamp,
+            values=values,
+            values_count=subkey.values_count,
+            actual_path=(f"{self.partial_hive_path}{subkey_path}" if self.partial_hive_path else None),
+        )
 
+    def _get_root_subkey_entry(self, nk_record, path_root, as_json):
+        # Get the values of the subkey
+        values = []
+        if nk_record.values_count:
+            try:
+                if as_json:
+                    values = [value_to_dict(x) for x in nk_record.iter_values(as_json=as_json)]
+                else:
+                    values = list(nk_record.iter_values(as_json=as_json))
+            except RegistryParsingException as ex:
+                logger.exception(f"Failed to parse hive value at path: {trim_registry_data_for_error_msg(path_root)}: {ex}")
                 values = []
-                if fetch_values and subkey.values_count:
-                    try:
-                        if as_json:
-                            values = [asdict(x) for x in subkey.iter_values(as_json=as_json)]
-                        else:
-                            values = list(subkey.iter_values(as_json=as_json))
-                    except RegistryParsingException:
-                        logger.exception(f"Failed to parse hive value at path: {trim_registry_data_for_error_msg(path_root)}")
-
-                ts = convert_wintime(subkey.header.last_modified)
-                yield Subkey(
-                    subkey_name=subkey.name,
-                    path=subkey_path,
-                    timestamp=ts.isoformat() if as_json else ts,
-                    values=values,
-                    values_count=subkey.values_count,
-                    actual_path=(f"{self.partial_hive_path}{subkey_path}" if self.partial_hive_path else None),
-                )
 
-        if is_init:
-            # Get the values of the subkey
-            values = []
-            if nk_record.values_count:
-                try:
-                    if as_json:
-                        values = [asdict(x) for x in nk_record.iter_values(as_json=as_json)]
-                    else:
-                        values = list(nk_record.iter_values(as_json=as_json))
-                except RegistryParsingException as ex:
-                    logger.exception(f"Failed to parse hive value at path: {trim_registry_data_for_error_msg(path_root)}: {ex}")
-                    values = []
-
-            ts = convert_wintime(nk_record.header.last_modified)
-            subkey_path = path_root or "\\"
-            yield Subkey(
-                subkey_name=nk_record.name,
-                path=subkey_path,
-                timestamp=ts.isoformat() if as_json else ts,
-                values=values,
-                values_count=len(values),
-                actual_path=(f"{self.partial_hive_path}\\{subkey_path}" if self.partial_hive_path else None),
-            )
+        ts = convert_wintime(nk_record.last_modified)
+        subkey_path = path_root or "\\"
+        return Subkey(
+            subkey_name=nk_record.name,
+            path=subkey_path,
+            timestamp=ts.isoformat() if as_json else ts,
+            values=values,
+            values_count=len(values),
+            actual_path=(f"{self.partial_hive_path}\\{subkey_path}" if self.partial_hive_path else None),
+        )
 
     def get_hbin_at_offset(self, offset=0):
         """
@@ -253,8 +639,7 @@ class RegistryHive:
         If not offset is given, will return the root Hbin
         :return:
         """
-        self._stream.seek(REGF_HEADER_SIZE + offset)
-        return HBin(self._stream)
+        return HBin(HiveCursor(self._buffer, REGF_HEADER_SIZE + offset))
 
     def get_key(self, key_path):
         if self.partial_hive_path:
@@ -275,6 +660,43 @@ class RegistryHive:
         else:
             key_path_parts = [key_path]
 
+        # Key names are case insensitive
+        cache_key = tuple(path_part.upper() for path_part in key_path_parts)
+        offset = self.key_cache.get(cache_key)
+        if offset is not None:
+            self.key_cache.count("hits")
+            return self._get_nk_record_at(offset)
+
+        # Continue from the longest path that was already resolved
+        cached_depth = len(cache_key) - 1
+        subkey = self.root
+        while cached_depth:
+            offset = self.key_cache.get(cache_key[:cached_depth])
+            if offset is not None:
+                subkey = self._get_nk_record_at(offset)
+                break
+            cached_depth -= 1
+
+        self.key_cache.count("partial_hits" if cached_depth else "misses")
+
+        if self.index is not None:
+            offset = self.index.get_key_offset(key_path)
+            if offset is None:
+                # Walk the path, to raise the same error as without the index
+                return self._walk_key_path(key_path, key_path_parts)
+            self.key_cache.put(cache_key, offset)
+            return self._get_nk_record_at(offset)
+
+        for depth in range(cached_depth, len(key_path_parts)):
+            subkey = subkey.get_subkey(key_path_parts[depth], raise_on_missing=False)
+            if not subkey:
+                # Walk again from root, to raise the same error whether parts of the path were cached or not
+                return self._walk_key_path(key_path, key_path_parts)
+            self.key_cache.put(cache_key[: depth + 1], subkey.offset)
+        return subkey
+
+    def _walk_key_path(self, key_path, key_path_parts):
+        key_path_parts = list(key_path_parts)
         previous_key_name = []
 
         subkey = self.root.get_subkey(key_path_parts.pop(0), raise_on_missing=False)
@@ -294,6 +716,44 @@ class RegistryHive:
                 raise RegistryKeyNotFoundException(f"Did not find {path_part} at {new_path}")
         return subkey
 
+    def _get_nk_record_at(self, offset):
+        """
+        Get the NKRecord of a key node
+        :param offset: The offset of the key node, right after the "nk" signature
+        """
+        # Skip back over the NK signature and the cell size
+        cell_size = parse_cell_size(self._buffer, offset - 6) * -1
+        return NKRecord(Cell(cell_type="nk", offset=offset, size=cell_size), self._stream, buffer=self._buffer)
+
+    def find_values(self, value_name):
+        """
+        Find all the values with a given name, without reading their data.
+        This is an index lookup if an index is loaded, and a walk of the key tree otherwise.
+        :param value_name: The name of the value, case insensitive
+        :return: IndexedValue objects, in the order of recurse_subkeys()
+        """
+        if self.index is not None:
+            yield from self.index.find_values(value_name)
+            return
+
+        lookup_name = value_name.upper()
+        for path, nk_record, _ in iter_key_paths(self):
+            if not nk_record.values_count:
+                continue
+            try:
+                for lazy_value in nk_record.iter_lazy_values():
+                    if lazy_value.name.upper() == lookup_name:
+                        yield IndexedValue(
+                            path=path,
+                            key_offset=nk_record.offset,
+                            name=lazy_value.name,
+                            value_type=str(lazy_value.value_type),
+                            offset=lazy_value.offset,
+                            size=lazy_value.size,
+                        )
+            except RegistryParsingException as ex:
+                logger.error(f"Could not parse the values of {path}: {ex}")
+
     def get_control_sets(self, registry_path):
         """
         Get the optional control sets for a registry hive
@@ -315,30 +775,110 @@ class RegistryHive:
 class HBin:
     def __init__(self, stream):
         """
-        :param stream: a stream at the start of the hbin block
+        :param stream: a stream at the start of the hbin block, preferably a HiveCursor
         """
         self.header = HBIN_HEADER.parse_stream(stream)
         self.hbin_data_offset = stream.tell()
 
     def iter_cells(self, stream):
-        stream.seek(self.hbin_data_offset)
-        offset = stream.tell()
-        while offset < self.hbin_data_offset + self.header.size - HBIN_HEADER.sizeof():
-            hbin_cell_size = Int32sl.parse_stream(stream)
+        """
+        Iterate over the allocated cells of the hbin. The cells are read from the data of the stream,
+        without moving it.
+        :param stream: The hive stream, or a HiveCursor over the hive
+        :return: Cell objects, whose offset is right after the cell size and the cell signature
+        """
+        buffer = get_stream_buffer(stream)
+        offset = self.hbin_data_offset
+        hbin_end_offset = self.hbin_data_offset - HBIN_HEADER.sizeof() + self.header.size
+        while offset + 4 <= hbin_end_offset:
+            hbin_cell_size = parse_cell_size(buffer, offset)
+
+            # A cell can not be empty, the rest of the hbin can not be trusted
+            if not hbin_cell_size:
+                logger.warning(f"Found a cell of size 0 at offset {offset}, skipping the rest of the hbin")
+                return
 
             # If the cell size is positive, it means it is unallocated. We are not interested in those on a regular run
-            if hbin_cell_size >= 0:
-                continue
+            if hbin_cell_size < 0:
+                cell_type = bytes(buffer[offset + 4 : offset + 6])
 
-            bytes_to_read = (hbin_cell_size * -1) - 4
+                # Yield the cell
+                yield Cell(cell_type=cell_type.decode(errors="replace"), offset=offset + 6, size=-hbin_cell_size - 4)
 
-            cell_type = Bytes(2).parse_stream(stream)
+            # Go to the next cell
+            offset += abs(hbin_cell_size)
 
-            # Yield the cell
-            yield Cell(cell_type=cell_type.decode(), offset=stream.tell(), size=bytes_to_read)
 
-            # Go to the next cell
-            offset += stream.tell() + bytes_to_read
+def get_value_name(vk) -> str:
+    """
+    Decode the name of a parsed VK record
+    """
+    if vk.name_size == 0:
+        return "(default)"
+    elif vk.flags.VALUE_COMP_NAME:
+        # Compressed (ASCII) value name
+        return vk.name.decode("ascii", errors="replace")
+
+    # Unicode (UTF-16) value name
+    value_name = vk.name.decode("utf-16-le", errors="replace")
+    logger.debug(f'Unicode value name identified: "{value_name}"')
+    return value_name
+
+
+def get_value_type(vk, actual_vk_offset) -> Optional[str]:
+    """
+    Get the data type of a parsed VK record, as used to decode its data
+    :return: The name of the data type, or None for data types that are not supported
+    """
+    # If the value is bigger than this value, it means this is a DEVPROP structure
+    # https://doxygen.reactos.org/d0/dba/devpropdef_8h_source.html
+    # https://sourceforge.net/p/mingw-w64/mingw-w64/ci/668a1d3e85042c409e0c292e621b3dc0aa26177c/tree/
+    # mingw-w64-headers/include/devpropdef.h?diff=dd86a3b7594dadeef9d6a37c4b6be3ca42ef7e94
+    # We currently do not support these, We are going to make the best effort to dump as string.
+    # This int casting will always work because the data_type is construct's EnumIntegerString
+    if int(vk.data_type) > 0xFFFF0000:
+        data_type = VALUE_TYPE_ENUM.parse(Int32ul.build(int(vk.data_type) & 0xFFFF))
+        logger.info(f"Value at {hex(actual_vk_offset)} contains DEVPROP structure of type {data_type}")
+
+    # Skip this unknown data type, research pending :)
+    # TODO: Add actual parsing
+    elif int(vk.data_type) == 0x200000:
+        logger.info(f"Skipped unknown data type value at {actual_vk_offset}")
+        return None
+    else:
+        data_type = str(vk.data_type)
+    return data_type
+
+
+def _filter_subkey_candidates(signature, elements, key_name):
+    """
+    Use the hash values of an LH or LF record to drop the subkeys which cannot be named key_name
+    :param signature: The signature of the subkey list
+    :param elements: (key_node_offset, hash_value) tuples
+    :param key_name: The name of the subkey that is looked up
+    :return: The offsets of the key nodes which may be named key_name
+    """
+    # Windows upper cases names with its own table, hashes and hints can only be relied on for ASCII names
+    if not key_name.isascii():
+        return [key_node_offset for key_node_offset, _ in elements]
+
+    if signature == HASH_LEAF_SIGNATURE:
+        name_hash = calculate_key_name_hash(key_name)
+        return [key_node_offset for key_node_offset, hash_value in elements if hash_value == name_hash]
+
+    if signature == FAST_LEAF_SIGNATURE:
+        # The hint holds the first four characters of the name as stored, padded with null bytes
+        name_hint = key_name[:4].upper().encode("ascii")
+        return [
+            key_node_offset
+            for key_node_offset, hint in elements
+            if all(
+                hint_char == name_char or not 0 < hint_char < 0x80
+                for hint_char, name_char in zip(hint.to_bytes(4, "little").upper(), name_hint)
+            )
+        ]
+
+    return [key_node_offset for key_node_offset, _ in elements]
 
 
 class NKRecord:
@@ -346,52 +886,118 @@ class NKRecord:
     The NKRecord represents a Name Key entry
     """
 
-    def __init__(self, cell, stream):
-        stream.seek(cell.offset)
-        self.header = CM_KEY_NODE.parse_stream(stream)
+    # NKRecords are created for every key that is traversed, so they only hold the offset of the key node.
+    # The fixed size part of the key node is unpacked the first time one of its fields is accessed,
+    # and the name and the full header are only decoded when asked for.
+    __slots__ = ("_stream", "_buffer", "_cell_offset", "_fields", "_name", "_header")
+
+    def __init__(self, cell, stream, buffer=None):
         self._stream = stream
+        self._buffer = buffer if buffer is not None else get_stream_buffer(stream)
+        self._cell_offset = cell.offset
+        self._fields = None
+        self._name = None
+        self._header = None
+
+    @property
+    def offset(self) -> int:
+        """
+        The offset of the key node in the hive, right after the "nk" signature
+        """
+        return self._cell_offset
+
+    @property
+    def fields(self) -> KeyNodeFields:
+        if self._fields is None:
+            self._fields = unpack_cm_key_node(self._buffer, self._cell_offset)
+        return self._fields
+
+    @property
+    def header(self) -> Container:
+        if self._header is None:
+            fields = self.fields
+            self._header = build_cm_key_node(fields, read_key_name(self._buffer, self._cell_offset, fields))
+        return self._header
+
+    @property
+    def name(self) -> str:
+        if self._name is None:
+            fields = self.fields
+            key_name_string = read_key_name(self._buffer, self._cell_offset, fields)
+
+            # Sometimes the key names are ASCII and sometimes UTF-16 little endian
+            if fields.flags & KEY_COMP_NAME:
+                # Compressed (ASCII) key name
+                self._name = key_name_string.decode("ascii", errors="replace")
+            else:
+                # Unicode (UTF-16) key name
+                self._name = key_name_string.decode("utf-16-le", errors="replace")
+                logger.debug(f'Unicode key name identified: "{self._name}"')
+        return self._name
 
-        # Sometimes the key names are ASCII and sometimes UTF-16 little endian
-        if self.header.flags.KEY_COMP_NAME:
-            # Compressed (ASCII) key name
-            self.name = self.header.key_name_string.decode("ascii", errors="replace")
-        else:
-            # Unicode (UTF-16) key name
-            self.name = self.header.key_name_string.decode("utf-16-le", errors="replace")
-            logger.debug(f'Unicode key name identified: "{self.name}"')
+    @property
+    def subkey_count(self) -> int:
+        return self.fields.subkey_count
+
+    @property
+    def values_count(self) -> int:
+        return self.fields.values_count
+
+    @property
+    def volatile_subkeys_count(self) -> int:
+        return self.fields.volatile_subkey_count
 
-        self.subkey_count = self.header.subkey_count
-        self.values_count = self.header.values_count
-        self.volatile_subkeys_count = self.header.volatile_subkey_count
+    @property
+    def last_modified(self) -> int:
+        """
+        The raw FILETIME of the last modification of the key
+        """
+        return self.fields.last_modified
+
+    @property
+    def flags(self) -> Container:
+        return KEY_NODE_FLAGS._decode(self.fields.flags, None, None)
+
+    @property
+    def security_key_offset(self) -> int:
+        return self.fields.security_key_offset
+
+    @property
+    def class_name_offset(self) -> int:
+        return self.fields.class_name_offset
 
     def get_subkey(self, key_name, raise_on_missing=True):
         if not self.subkey_count and raise_on_missing:
-            raise NoRegistrySubkeysException(f"No subkeys for {self.header.key_name_string}")
-
-        for subkey in self.iter_subkeys():
-            # This should not happen
-            if not isinstance(subkey, NKRecord):
-                raise RegipyGeneralException(f"Unknown record type: {subkey}")
+            raise NoRegistrySubkeysException(f"No subkeys for {self.name}")
 
-            if subkey.name.upper() == key_name.upper():
+        if self.subkey_count:
+            subkey = self._find_subkey(key_name)
+            if subkey is not None:
                 return subkey
 
         if raise_on_missing:
-            raise NoRegistrySubkeysException(f"No subkey {key_name} for {self.header.key_name_string}")
+            raise NoRegistrySubkeysException(f"No subkey {key_name} for {self.name}")
 
     def iter_subkeys(self):
-        if not self.header.subkey_count:
+        if not self.subkey_count:
             return None
 
+        for subkey_list_offset in self._iter_subkey_lists():
+            _, elements = self._parse_subkeys(subkey_list_offset)
+            for key_node_offset, _ in elements:
+                yield self._get_nk_record(key_node_offset)
+
+    def _iter_subkey_lists(self):
+        """
+        Yield the offsets of the LI, LF and LH records that contain the subkeys of this key
+        """
         # Go to the offset where the subkey list starts (+4 is because of the cell header)
-        target_offset = REGF_HEADER_SIZE + 4 + self.header.subkeys_list_offset
-        self._stream.seek(target_offset)
+        target_offset = REGF_HEADER_SIZE + 4 + self.fields.subkeys_list_offset
 
         # Read the signature
-        try:
-            signature = Bytes(2).parse_stream(self._stream)
-        except StreamError as ex:
-            raise RegistryParsingException(f"Bad subkey at offset {target_offset}: {ex}")
+        signature = bytes(self._buffer[target_offset : target_offset + 2])
+        if len(signature) != 2:
+            raise RegistryParsingException(f"Bad subkey at offset {target_offset}: could not read the list signature")
 
         # LF,  LH and RI contain subkeys
         if signature in [
@@ -399,56 +1005,105 @@ class NKRecord:
             FAST_LEAF_SIGNATURE,
             LEAF_INDEX_SIGNATURE,
         ]:
-            yield from self._parse_subkeys(self._stream, signature=signature)
+            yield target_offset
         # RI contains pointers to arrays of subkeys
         elif signature == INDEX_ROOT_SIGNATURE:
-            ri_record = RIRecord(self._stream)
-            if ri_record.header.element_count > 0:
-                for element in ri_record.header.elements:
-                    # We skip 6 because of the signature as well as the cell header
-                    element_target_offset = REGF_HEADER_SIZE + 4 + element.subkey_list_offset
-                    self._stream.seek(element_target_offset)
-                    yield from self._parse_subkeys(self._stream)
+            for subkey_list_offset in parse_index_root(self._buffer, target_offset + 2):
+                # We skip 4 because of the cell header
+                yield REGF_HEADER_SIZE + 4 + subkey_list_offset
 
-    @staticmethod
-    def _parse_subkeys(stream, signature=None):
+    def _parse_subkeys(self, offset):
         """
         Parse an LI , LF or LH Record
-        :param stream: A stream at the header of the LH or LF entry, skipping the signature
-        :return:
+        :param offset: The offset of the record signature
+        :return: The signature, and a list of (key_node_offset, hash_value) tuples. LI records have no hash values.
         """
-        if not signature:
-            signature = stream.read(2)
-
+        signature = bytes(self._buffer[offset : offset + 2])
         if signature in [HASH_LEAF_SIGNATURE, FAST_LEAF_SIGNATURE]:
-            subkeys = LF_LH_SK_ELEMENT.parse_stream(stream)
+            elements = parse_lf_lh_sk_element(self._buffer, offset + 2)
         elif signature == LEAF_INDEX_SIGNATURE:
-            subkeys = INDEX_LEAF.parse_stream(stream)
+            elements = [(key_node_offset, None) for key_node_offset in parse_index_leaf(self._buffer, offset + 2)]
         else:
-            raise RegistryParsingException(f"Expected a known signature, got: {signature} at offset {stream.tell()}")
+            raise RegistryParsingException(f"Expected a known signature, got: {signature} at offset {offset + 2}")
+        return signature, elements
 
-        for subkey in subkeys.elements:
-            stream.seek(REGF_HEADER_SIZE + subkey.key_node_offset)
+    def _get_nk_record(self, key_node_offset):
+        cell_offset = REGF_HEADER_SIZE + key_node_offset
 
-            # This cell should always be allocated, therefor we expect a negative size
-            cell_size = Int32sl.parse_stream(stream) * -1
+        # This cell should always be allocated, therefor we expect a negative size
+        cell_size = parse_cell_size(self._buffer, cell_offset) * -1
 
-            # We read to this offset and skip 2 bytes, because that is the cell size we just read
-            nk_cell = Cell(cell_type="nk", offset=stream.tell() + 2, size=cell_size)
-            nk_record = NKRecord(cell=nk_cell, stream=stream)
-            yield nk_record
+        # Skip the cell size and the NK signature
+        nk_cell = Cell(cell_type="nk", offset=cell_offset + 6, size=cell_size)
+        return NKRecord(cell=nk_cell, stream=self._stream, buffer=self._buffer)
+
+    def _find_subkey(self, key_name):
+        """
+        Find a subkey by name, decoding as few key nodes as possible.
+        LH records store a hash of each subkey name and LF records its first four characters, so most subkeys
+        are skipped without reading their key node. Subkey lists are sorted by the upper cased name: the list of an RI
+        record which should contain the subkey, and the position in an LI record, are found with a binary search.
+        The rest of the subkeys are checked as well if the subkey is not where it is expected to be.
+        :param key_name: The name of the subkey, case insensitive
+        :return: An NKRecord, or None if there is no such subkey
+        """
+        upper_key_name = key_name.upper()
+        subkey_lists = [self._parse_subkeys(offset) for offset in self._iter_subkey_lists()]
+        if not subkey_lists:
+            return None
+
+        if len(subkey_lists) > 1 and all(elements for _, elements in subkey_lists):
+            last_subkeys = [elements[-1][0] for _, elements in subkey_lists]
+            expected_list = self._bisect_subkeys(last_subkeys, upper_key_name)
+            if expected_list < len(subkey_lists):
+                subkey_lists.insert(0, subkey_lists.pop(expected_list))
+        elif subkey_lists[0][0] == LEAF_INDEX_SIGNATURE:
+            key_node_offsets = [key_node_offset for key_node_offset, _ in subkey_lists[0][1]]
+            expected_position = self._bisect_subkeys(key_node_offsets, upper_key_name)
+            if expected_position < len(key_node_offsets):
+                subkey = self._get_nk_record(key_node_offsets[expected_position])
+                if subkey.name.upper() == upper_key_name:
+                    return subkey
+
+        for signature, elements in subkey_lists:
+            for key_node_offset in _filter_subkey_candidates(signature, elements, key_name):
+                subkey = self._get_nk_record(key_node_offset)
+                if subkey.name.upper() == upper_key_name:
+                    return subkey
+        return None
+
+    def _bisect_subkeys(self, key_node_offsets, upper_key_name):
+        """
+        Find the position of the first subkey which is not sorted before the given name
+        """
+        low, high = 0, len(key_node_offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_nk_record(key_node_offsets[middle]).name.upper() < upper_key_name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
 
     @staticmethod
-    def read_value(vk, stream):
+    def read_value(vk, stream, buffer=None):
         """
         Read a registry value
         :param vk: A parse VK record
         :param stream: The registry stream
+        :param buffer: A view over the hive data. If given, the data is sliced from it instead of read from the stream
         :return: A VKRecord
         """
-        stream.seek(REGF_HEADER_SIZE + 4 + vk.data_offset)
         data_type = vk.data_type
-        data = stream.read(vk.data_size)
+        data_offset = REGF_HEADER_SIZE + 4 + vk.data_offset
+        if vk.data_size >= 0x80000000:
+            # The data is contained in the data_offset field, there is nothing to read from the hive
+            data = Int32ul.build(vk.data_offset)[: vk.data_size - 0x80000000]
+        elif buffer is not None:
+            data = bytes(buffer[data_offset : data_offset + vk.data_size])
+        else:
+            stream.seek(data_offset)
+            data = stream.read(vk.data_size)
         return VKRecord(
             value_type=data_type,
             value_type_str=str(data_type),
@@ -456,27 +1111,40 @@ class NKRecord:
             size=vk.data_size,
         )
 
-    @staticmethod
-    def _parse_indirect_block(stream, value):
-        # This is an indirect datablock (Bigger than 16344, therefor we handle it differently)
+    def iter_big_data_segments(self, big_data_block, size):
+        """
+        Iterate over the segments of an indirect datablock (values bigger than 16344 bytes), without copying them.
+        The segments are views over the hive data, and are only valid as long as the hive is open.
+        :param big_data_block: The data of the VK record, which starts with the "db" signature
+        :param size: The size of the value
+        :return: memoryview objects, in order
+        """
         # The value inside the vk entry actually contains a pointer to the buffers containing the data
-        big_data_block_header = BIG_DATA_BLOCK.parse(value.value)
+        big_data_block_header = BIG_DATA_BLOCK.parse(big_data_block)
 
-        # Go to the start of the segment offset list
-        stream.seek(REGF_HEADER_SIZE + big_data_block_header.offset_to_list_of_segments)
-        buffer = BytesIO()
+        # Get the offset of the segment list. We skip 4 because of Cell Header
+        segment_list_offset = REGF_HEADER_SIZE + 4 + big_data_block_header.offset_to_list_of_segments
 
         # Read them sequentially until we got all the size of the VK
-        value_size = value.size
-        while value_size > 0:
-            data_segment_offset = Int32ul.parse_stream(stream)
-            with boomerang_stream(stream) as tmpstream:
-                tmpstream.seek(REGF_HEADER_SIZE + 4 + data_segment_offset)
-                tmpbuffer = tmpstream.read(min(0x3FD8, value_size))
-                value_size -= len(tmpbuffer)
-                buffer.write(tmpbuffer)
-        buffer.seek(0)
-        return buffer.read()
+        for segment_index in range(big_data_block_header.number_of_segments):
+            if size <= 0:
+                break
+            data_segment_offset = REGF_HEADER_SIZE + 4 + parse_uint32(self._buffer, segment_list_offset + segment_index * 4)
+            segment = self._buffer[data_segment_offset : data_segment_offset + min(BIG_DATA_SEGMENT_SIZE, size)]
+            if not segment:
+                logger.error(f"Big data segment at {data_segment_offset} is outside of the hive")
+                break
+            size -= len(segment)
+            yield segment
+
+    def read_big_data(self, big_data_block, size) -> bytes:
+        """
+        Read the data of an indirect datablock (values bigger than 16344 bytes)
+        :param big_data_block: The data of the VK record, which starts with the "db" signature
+        :param size: The size of the value
+        """
+        # join() sizes the result once, and copies every segment straight from the hive into it
+        return b"".join(self.iter_big_data_segments(big_data_block, size))
 
     def iter_values(self, as_json=False, max_len=MAX_LEN, trim_values=True):
         """
@@ -486,118 +1154,118 @@ class NKRecord:
         :param trim_values: whether to trim values to MAX_LEN
         :return: List of values for the subkey
         """
+        for lazy_value in self.iter_lazy_values(as_json=as_json, max_len=max_len, trim_values=trim_values):
+            value = lazy_value.to_value()
+            if value is not None:
+                yield value
+
+    def iter_lazy_values(self, as_json=False, max_len=MAX_LEN, trim_values=True):
+        """
+        Get the values of a subkey, without reading their data. The data is read and decoded on LazyValue.value
+        :param as_json: Whether to normalize the data as JSON or not
+        :param max_len: Max length of value to return
+        :param trim_values: whether to trim values to MAX_LEN
+        :return: LazyValue objects
+        """
         if not self.values_count:
             return
 
         # Get the offset of the values key. We skip 4 because of Cell Header
-        target_offset = REGF_HEADER_SIZE + 4 + self.header.values_list_offset
-        self._stream.seek(target_offset)
+        target_offset = REGF_HEADER_SIZE + 4 + self.fields.values_list_offset
 
-        for _ in range(self.values_count):
-            is_corrupted = False
+        for value_index in range(self.values_count):
+            vk_list_entry_offset = target_offset + value_index * 4
             try:
-                vk_offset = Int32ul.parse_stream(self._stream)
+                vk_offset = parse_uint32(self._buffer, vk_list_entry_offset)
             except StreamError:
-                logger.info(f"Skipping bad registry VK at {self._stream.tell()}")
-                raise RegistryParsingException(f"Bad registry VK at {self._stream.tell()}")
+                logger.info(f"Skipping bad registry VK at {vk_list_entry_offset}")
+                raise RegistryParsingException(f"Bad registry VK at {vk_list_entry_offset}")
+
+            actual_vk_offset = REGF_HEADER_SIZE + 4 + vk_offset
+            try:
+                vk = parse_value_key(self._buffer, actual_vk_offset)
+            except (ConstError, StreamError):
+                logger.error(f"Could not parse VK at {actual_vk_offset}, registry hive is probably corrupted.")
+                return
+
+            value_name = get_value_name(vk)
+            data_type = get_value_type(vk, actual_vk_offset)
+            if data_type is None:
+                continue
 
-            with boomerang_stream(self._stream) as substream:
-                actual_vk_offset = REGF_HEADER_SIZE + 4 + vk_offset
-                substream.seek(actual_vk_offset)
+            yield LazyValue(
+                nk_record=self,
+                vk=vk,
+                offset=actual_vk_offset,
+                name=value_name,
+                value_type=data_type,
+                as_json=as_json,
+                max_len=max_len,
+                trim_values=trim_values,
+            )
+
+    def _decode_value(self, vk, data_type, actual_vk_offset, as_json, max_len, trim_values):
+        """
+        Read and decode the data of a value
+        :return: The decoded value, and whether the value is corrupted
+        """
+        value = self.read_value(vk, self._stream, buffer=self._buffer)
+
+        if data_type in ["REG_SZ", "REG_EXPAND", "REG_EXPAND_SZ"]:
+            if vk.data_size >= 0x80000000:
+                # data is contained in the data_offset field
+                value.size -= 0x80000000
+                actual_value = vk.data_offset
+            elif vk.data_size > BIG_DATA_SEGMENT_SIZE and value.value[:2] == BIG_DATA_SIGNATURE:
+                data = self.read_big_data(value.value, value.size)
+                actual_value = try_decode_binary(data, as_json=as_json, trim_values=trim_values)
+            else:
+                actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
+        elif data_type in ["REG_BINARY", "REG_NONE"]:
+            if vk.data_size >= 0x80000000:
+                # data is contained in the data_offset field
+                actual_value = vk.data_offset
+            elif vk.data_size > BIG_DATA_SEGMENT_SIZE and value.value[:2] == BIG_DATA_SIGNATURE:
                 try:
-                    vk = VALUE_KEY.parse_stream(substream)
-                except (ConstError, StreamError):
-                    logger.error(f"Could not parse VK at {substream.tell()}, registry hive is probably corrupted.")
-                    return
-
-                value = self.read_value(vk, substream)
-
-                if vk.name_size == 0:
-                    value_name = "(default)"
-                elif vk.flags.VALUE_COMP_NAME:
-                    # Compressed (ASCII) value name
-                    value_name = vk.name.decode("ascii", errors="replace")
-                else:
-                    # Unicode (UTF-16) value name
-                    value_name = vk.name.decode("utf-16-le", errors="replace")
-                    logger.debug(f'Unicode value name identified: "{value_name}"')
-
-                # If the value is bigger than this value, it means this is a DEVPROP structure
-                # https://doxygen.reactos.org/d0/dba/devpropdef_8h_source.html
-                # https://sourceforge.net/p/mingw-w64/mingw-w64/ci/668a1d3e85042c409e0c292e621b3dc0aa26177c/tree/
-                # mingw-w64-headers/include/devpropdef.h?diff=dd86a3b7594dadeef9d6a37c4b6be3ca42ef7e94
-                # We currently do not support these, We are going to make the best effort to dump as string.
-                # This int casting will always work because the data_type is construct's EnumIntegerString
-                if int(vk.data_type) > 0xFFFF0000:
-                    data_type = VALUE_TYPE_ENUM.parse(Int32ul.build(int(vk.data_type) & 0xFFFF))
-                    logger.info(f"Value at {hex(actual_vk_offset)} contains DEVPROP structure of type {data_type}")
-
-                # Skip this unknown data type, research pending :)
-                # TODO: Add actual parsing
-                elif int(vk.data_type) == 0x200000:
-                    logger.info(f"Skipped unknown data type value at {actual_vk_offset}")
-                    continue
-                else:
-                    data_type = str(vk.data_type)
-
-                if data_type in ["REG_SZ", "REG_EXPAND", "REG_EXPAND_SZ"]:
-                    if vk.data_size >= 0x80000000:
-                        # data is contained in the data_offset field
-                        value.size -= 0x80000000
-                        actual_value = vk.data_offset
-                    elif vk.data_size > 0x3FD8 and value.value[:2] == b"db":
-                        data = self._parse_indirect_block(substream, value)
-                        actual_value = try_decode_binary(data, as_json=as_json, trim_values=trim_values)
-                    else:
-                        actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
-                elif data_type in ["REG_BINARY", "REG_NONE"]:
-                    if vk.data_size >= 0x80000000:
-                        # data is contained in the data_offset field
-                        actual_value = vk.data_offset
-                    elif vk.data_size > 0x3FD8 and value.value[:2] == b"db":
-                        try:
-                            actual_value = self._parse_indirect_block(substream, value)
-
-                            actual_value = (
-                                try_decode_binary(actual_value, as_json=True, trim_values=trim_values)
-                                if as_json
-                                else actual_value
-                            )
-                        except ConstError:
-                            logger.error(f"Bad value at {actual_vk_offset}")
-                            continue
-                    else:
-                        # Return the actual data
-                        actual_value = binascii.b2a_hex(value.value).decode()[:max_len] if trim_values else value.value
-                elif data_type == "REG_SZ":
-                    actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
-                elif data_type == "REG_DWORD":
-                    # If the data size is bigger than 0x80000000, data is actually stored in the VK data offset.
-                    actual_value = vk.data_offset if vk.data_size >= 0x80000000 else Int32ul.parse(value.value)
-                elif data_type == "REG_QWORD":
-                    actual_value = vk.data_offset if vk.data_size >= 0x80000000 else Int64ul.parse(value.value)
-                elif data_type == "REG_MULTI_SZ":
-                    parsed_value = GreedyRange(CString("utf-16-le")).parse(value.value)
-                    # Because the ListContainer object returned by Construct cannot be turned into a list,
-                    # we do this trick
-                    actual_value = [x for x in parsed_value if x]
-                # We currently dumps this as hex string or raw
-                # TODO: Add actual parsing
-                elif data_type in [
-                    "REG_RESOURCE_REQUIREMENTS_LIST",
-                    "REG_RESOURCE_LIST",
-                ]:
-                    actual_value = binascii.b2a_hex(value.value).decode()[:max_len] if trim_values else value.value
-                elif data_type == "REG_FILETIME":
-                    actual_value = convert_wintime(Int64ul.parse(value.value), as_json=as_json)
-                else:
-                    actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
-                yield Value(
-                    name=value_name,
-                    value_type=data_type,
-                    value=actual_value,
-                    is_corrupted=is_corrupted,
-                )
+                    actual_value = self.read_big_data(value.value, value.size)
+
+                    actual_value = (
+                        try_decode_binary(actual_value, as_json=True, trim_values=trim_values) if as_json else actual_value
+                    )
+                except ConstError:
+                    logger.error(f"Bad value at {actual_vk_offset}")
+                    return None, True
+            else:
+                # Return the actual data
+                actual_value = binascii.b2a_hex(value.value).decode()[:max_len] if trim_values else value.value
+        elif data_type == "REG_SZ":
+            actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
+        elif data_type == "REG_DWORD":
+            # If the data size is bigger than 0x80000000, data is actually stored in the VK data offset.
+            actual_value = vk.data_offset if vk.data_size >= 0x80000000 else Int32ul.parse(value.value)
+        elif data_type == "REG_QWORD":
+            actual_value = vk.data_offset if vk.data_size >= 0x80000000 else Int64ul.parse(value.value)
+        elif data_type == "REG_MULTI_SZ":
+            parsed_value = GreedyRange(CString("utf-16-le")).parse(value.value)
+            # Because the ListContainer object returned by Construct cannot be turned into a list,
+            # we do this trick
+            actual_value = [x for x in parsed_value if x]
+        # We currently dumps this as hex string or raw
+        # TODO: Add actual parsing
+        elif data_type in [
+            "REG_RESOURCE_REQUIREMENTS_LIST",
+            "REG_RESOURCE_LIST",
+        ]:
+            actual_value = binascii.b2a_hex(value.value).decode()[:max_len] if trim_values else value.value
+        elif data_type == "REG_FILETIME":
+            # A FILETIME does not fit in the data offset field, so inline or shorter data is corrupted
+            if vk.data_size >= 0x80000000 or len(value.value) < Int64ul.sizeof():
+                logger.error(f"Bad FILETIME value at {actual_vk_offset}")
+                return None, True
+            actual_value = convert_wintime(Int64ul.parse(value.value), as_json=as_json)
+        else:
+            actual_value = try_decode_binary(value.value, as_json=as_json, trim_values=trim_values)
+        return actual_value, False
 
     def get_value(
         self,
@@ -615,9 +1283,10 @@ class NKRecord:
         :return:
         """
         value_name = value_name if case_sensitive else value_name.lower()
-        for value in self.iter_values(as_json=as_json, trim_values=False):
+        # Only the data of the value that was asked for is decoded
+        for value in self.iter_lazy_values(as_json=as_json, trim_values=False):
             v = value.name if case_sensitive else value.name.lower()
-            if v == value_name:
+            if v == value_name and not value.is_corrupted:
                 return value.value
 
         if raise_on_missing:
@@ -628,35 +1297,34 @@ class NKRecord:
         return list(self.iter_values(as_json=as_json, trim_values=trim_values))
 
     def get_security_key_info(self):
-        self._stream.seek(REGF_HEADER_SIZE + self.header.security_key_offset)
+        s = HiveCursor(self._buffer, REGF_HEADER_SIZE + self.security_key_offset)
         # TODO: If parsing fails, parse with SECURITY_KEY_v1_2
-        security_key = SECURITY_KEY_v1_1.parse_stream(self._stream)
+        security_key = SECURITY_KEY_v1_1.parse_stream(s)
         security_descriptor = SECURITY_DESCRIPTOR.parse(security_key.security_descriptor)
 
-        with boomerang_stream(self._stream) as s:
-            security_base_offset = REGF_HEADER_SIZE + self.header.security_key_offset + 24
+        security_base_offset = REGF_HEADER_SIZE + self.security_key_offset + 24
 
-            s.seek(security_base_offset + security_descriptor.owner)
-            owner_sid = convert_sid(SID.parse_stream(s))
+        s.seek(security_base_offset + security_descriptor.owner)
+        owner_sid = convert_sid(SID.parse_stream(s))
 
-            s.seek(security_base_offset + security_descriptor.group)
-            group_sid = convert_sid(SID.parse_stream(s))
+        s.seek(security_base_offset + security_descriptor.group)
+        group_sid = convert_sid(SID.parse_stream(s))
 
-            sacl_aces = None
-            if security_descriptor.offset_sacl > 0:
-                s.seek(security_base_offset + security_descriptor.offset_sacl)
-                sacl_aces = get_acls(s)
+        sacl_aces = None
+        if security_descriptor.offset_sacl > 0:
+            s.seek(security_base_offset + security_descriptor.offset_sacl)
+            sacl_aces = get_acls(s)
 
-            dacl_aces = None
-            if security_descriptor.offset_dacl > 0:
-                s.seek(security_base_offset + security_descriptor.offset_dacl)
-                dacl_aces = get_acls(s)
-            return {
-                "owner": owner_sid,
-                "group": group_sid,
-                "dacl": dacl_aces,
-                "sacl": sacl_aces,
-            }
+        dacl_aces = None
+        if security_descriptor.offset_dacl > 0:
+            s.seek(security_base_offset + security_descriptor.offset_dacl)
+            dacl_aces = get_acls(s)
+        return {
+            "owner": owner_sid,
+            "group": group_sid,
+            "dacl": dacl_aces,
+            "sacl": sacl_aces,
+        }
 
     def get_class_name(self) -> str:
         """
@@ -665,10 +1333,8 @@ class NKRecord:
         """
 
         # Get the offset of the class name string. We skip 4 because of Cell Header
-        read_offset = REGF_HEADER_SIZE + 4 + self.header.class_name_offset
-
-        self._stream.seek(read_offset)
-        class_name = self._stream.read(self.header.class_name_size)
+        read_offset = REGF_HEADER_SIZE + 4 + self.class_name_offset
+        class_name = bytes(self._buffer[read_offset : read_offset + self.fields.class_name_size])
 
         return class_name.decode("utf-16-le", errors="replace")
 
@@ -679,6 +1345,6 @@ class NKRecord:
             "value_count": self.values_count,
             "values": ({x["name"]: x["value"] for x in self.iter_values()} if self.values_count else None),
             "subkeys": ({x["name"] for x in self.iter_subkeys()} if self.subkey_count else None),
-            "timestamp": convert_wintime(self.header.last_modified, as_json=True),
+            "timestamp": convert_wintime(self.last_modified, as_json=True),
             "volatile_subkeys": self.volatile_subkeys_count,
         }
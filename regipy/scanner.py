@@ -0,0 +1,169 @@
+"""
+Scan the cells of a hive sequentially, hbin by hbin, instead of following the key tree.
+
+Reading the hive from start to end is much friendlier to the CPU caches and to the disk than chasing offsets,
+which makes it the fast way to export all the keys of a hive. Key paths are reconstructed afterwards from the
+parent_key_offset of every key node.
+"""
+
+import logging
+import struct
+from collections.abc import Iterator
+from typing import Optional
+
+from regipy.registry import Cell, NKRecord, RegistryHive, Subkey
+from regipy.structs import HBIN_HEADER, REGF_HEADER_SIZE
+
+logger = logging.getLogger(__name__)
+
+HBIN_SIGNATURE = b"hbin"
+HBIN_ALIGNMENT = 0x1000
+
+# The signatures of the cells that have a structure. Other cells hold data: value data, value lists, class names...
+CELL_TYPES = ("nk", "vk", "sk", "lf", "lh", "ri", "li", "db")
+
+_HBIN_HEADER = struct.Struct("<4sII")
+_CELL_SIZE = struct.Struct("<i")
+_HBIN_HEADER_SIZE = HBIN_HEADER.sizeof()
+
+# The key node is right after the cell size and the "nk" signature
+_NK_RECORD_OFFSET = 6
+
+
+def iter_hbins(registry_hive: RegistryHive) -> Iterator[tuple[int, int]]:
+    """
+    Iterate over the hbins of the hive, in the order they are stored
+    :param registry_hive: A RegistryHive object
+    :return: (offset, size) tuples. The offset is absolute, and points at the hbin header.
+    """
+    buffer = registry_hive._buffer
+    hbins_end_offset = min(REGF_HEADER_SIZE + registry_hive.header.hive_bins_data_size, len(buffer))
+
+    offset = REGF_HEADER_SIZE
+    while offset + _HBIN_HEADER_SIZE <= hbins_end_offset:
+        signature, _, size = _HBIN_HEADER.unpack_from(buffer, offset)
+        if signature != HBIN_SIGNATURE or size < HBIN_ALIGNMENT or size % HBIN_ALIGNMENT:
+            # hbins are always aligned, so look for the next one
+            logger.warning(f"Bad hbin at offset {offset}, skipping to the next page")
+            offset += HBIN_ALIGNMENT
+            continue
+
+        yield offset, min(size, hbins_end_offset - offset)
+        offset += size
+
+
+def iter_hbin_cells(registry_hive: RegistryHive) -> Iterator[tuple[int, int]]:
+    """
+    Iterate over all the cells of the hive, allocated or not, in one forward pass
+    :param registry_hive: A RegistryHive object
+    :return: (offset, size) tuples. The offset is absolute, and points at the cell size.
+             The size is negative for allocated cells, like it is stored.
+    """
+    buffer = registry_hive._buffer
+    unpack_cell_size = _CELL_SIZE.unpack_from
+    for hbin_offset, hbin_size in iter_hbins(registry_hive):
+        offset = hbin_offset + _HBIN_HEADER_SIZE
+        hbin_end_offset = hbin_offset + hbin_size
+        while offset + _CELL_SIZE.size <= hbin_end_offset:
+            cell_size = unpack_cell_size(buffer, offset)[0]
+            if not cell_size or offset + abs(cell_size) > hbin_end_offset:
+                logger.warning(f"Bad cell size {cell_size} at offset {offset}, skipping the rest of the hbin")
+                break
+
+            yield offset, cell_size
+            offset += abs(cell_size)
+
+
+def iter_allocated_cells(registry_hive: RegistryHive, cell_types=CELL_TYPES) -> Iterator[Cell]:
+    """
+    Iterate over the allocated cells of the given types, in one forward pass
+    :param registry_hive: A RegistryHive object
+    :param cell_types: The cell signatures to yield
+    :return: Cell objects. Like HBin.iter_cells(), the offset is right after the cell size and the signature.
+    """
+    buffer = registry_hive._buffer
+    cell_signatures = {cell_type.encode(): cell_type for cell_type in cell_types}
+    for offset, cell_size in iter_hbin_cells(registry_hive):
+        if cell_size > 0:
+            continue
+
+        cell_type = cell_signatures.get(bytes(buffer[offset + 4 : offset + 6]))
+        if cell_type is not None:
+            yield Cell(offset=offset + 6, cell_type=cell_type, size=-cell_size - 4)
+
+
+def iter_key_nodes(registry_hive: RegistryHive) -> Iterator[NKRecord]:
+    """
+    Iterate over all the allocated key nodes of the hive, in the order they are stored
+    """
+    for cell in iter_allocated_cells(registry_hive, cell_types=("nk",)):
+        yield NKRecord(cell, registry_hive._stream, buffer=registry_hive._buffer)
+
+
+def get_parent_offset(nk_record: NKRecord) -> int:
+    """
+    Get the offset of the parent of a key node, in the same form as NKRecord.offset
+    """
+    return REGF_HEADER_SIZE + nk_record.fields.parent_key_offset + _NK_RECORD_OFFSET
+
+
+def reconstruct_key_paths(key_nodes, root_offset: int) -> dict[int, Optional[str]]:
+    """
+    Resolve the path of every key node, by following parent_key_offset up to the root key
+    :param key_nodes: NKRecord objects
+    :param root_offset: The offset of the root key node, in the same form as NKRecord.offset
+    :return: A mapping of key node offsets to paths, in the form recurse_subkeys() uses.
+             Keys whose parent chain does not lead to the root key have no path (None).
+    """
+    names = {}
+    parents = {}
+    for nk_record in key_nodes:
+        names[nk_record.offset] = nk_record.name
+        parents[nk_record.offset] = get_parent_offset(nk_record)
+
+    paths: dict[int, Optional[str]] = {root_offset: ""}
+    for offset in names:
+        # Walk up until a key with a known path, then fill in the paths on the way back down
+        chain = []
+        current = offset
+        while current not in paths:
+            if current not in names or current in chain:
+                # A missing parent, or a loop
+                break
+            chain.append(current)
+            current = parents[current]
+
+        path = paths.get(current)
+        for chain_offset in reversed(chain):
+            path = None if path is None else rf"{path}\{names[chain_offset]}"
+            paths[chain_offset] = path
+
+    paths[root_offset] = "\\"
+    return paths
+
+
+def iter_subkeys_linear(registry_hive: RegistryHive, as_json=False, fetch_values=True) -> Iterator[Subkey]:
+    """
+    Export all the keys of the hive in the order they are stored in, instead of walking the key tree.
+    Every key is yielded once, with the same entry recurse_subkeys() would yield for it.
+    Allocated keys that are not connected to the root key are skipped.
+    :param registry_hive: A RegistryHive object
+    :param as_json: Whether to normalize the data as JSON or not
+    :param fetch_values: If False, subkey values will not be returned, but the iteration will be faster
+    """
+    key_nodes = list(iter_key_nodes(registry_hive))
+    root_offset = registry_hive.root.offset
+    paths = reconstruct_key_paths(key_nodes, root_offset)
+
+    for nk_record in key_nodes:
+        if nk_record.offset == root_offset:
+            yield registry_hive._get_root_subkey_entry(nk_record, None, as_json)
+            continue
+
+        path = paths.get(nk_record.offset)
+        if path is None:
+            logger.debug(f"Key node at {nk_record.offset} is not connected to the root key")
+            continue
+
+        parent_path = paths.get(get_parent_offset(nk_record))
+        yield registry_hive._get_subkey_entry(nk_record, path, parent_path or None, as_json, fetch_values)
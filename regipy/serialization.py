@@ -0,0 +1,130 @@
+"""
+Serialize Subkey and Value entries to JSON.
+
+Entries are turned into dicts directly, instead of through dataclasses.asdict(), which deep copies every value,
+and are encoded to bytes by a serializer: orjson if it is installed, or the json module of the standard library.
+Any object with a dumps(obj) -> bytes method can be used as a serializer.
+"""
+
+import binascii
+import datetime as dt
+import json
+import logging
+from typing import Optional
+
+from regipy.exceptions import RegipyGeneralException
+from regipy.utils import MAX_LEN
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# The buffer size of the files entries are written to, so they are written in big chunks instead of line by line
+WRITE_BUFFER_SIZE: int = 1024**2
+
+
+def value_to_dict(value) -> dict:
+    """
+    The same dict as dataclasses.asdict() returns for a Value, without copying its data
+    """
+    return {
+        "name": value.name,
+        "value": value.value,
+        "value_type": value.value_type,
+        "is_corrupted": value.is_corrupted,
+    }
+
+
+def subkey_to_dict(subkey) -> dict:
+    """
+    The same dict as dataclasses.asdict() returns for a Subkey, without copying its values.
+    Values that are already dicts, like the values of entries created with as_json=True, are used as they are.
+    """
+    return {
+        "subkey_name": subkey.subkey_name,
+        "path": subkey.path,
+        "timestamp": subkey.timestamp,
+        "values_count": subkey.values_count,
+        "values": [value if isinstance(value, dict) else value_to_dict(value) for value in subkey.values],
+        "actual_path": subkey.actual_path,
+    }
+
+
+def _default(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return binascii.b2a_hex(bytes(obj[:MAX_LEN])).decode()
+    if isinstance(obj, dt.datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONSerializer:
+    """
+    Serialize with the json module of the standard library
+    """
+
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=_default).encode()
+
+
+class OrjsonSerializer:
+    """
+    Serialize with orjson. Objects orjson can not serialize, like integers bigger than 64 bits,
+    are serialized with the standard library instead.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RegipyGeneralException("orjson is not installed")
+        self._fallback = JSONSerializer()
+
+    def dumps(self, obj) -> bytes:
+        try:
+            # Datetimes are passed to _default(), so they are formatted by isoformat() like with the standard library
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError as ex:
+            logger.debug(f"orjson could not serialize an entry, using the json module: {ex}")
+            return self._fallback.dumps(obj)
+
+
+SERIALIZERS = {
+    JSONSerializer.name: JSONSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+}
+
+
+def get_serializer(name: Optional[str] = None):
+    """
+    Get a serializer by name
+    :param name: One of SERIALIZERS. If None, orjson is used if it is installed, and the standard library if not.
+    """
+    if name is None:
+        name = OrjsonSerializer.name if orjson is not None else JSONSerializer.name
+
+    if name not in SERIALIZERS:
+        raise RegipyGeneralException(f"Unknown serializer {name}, expected one of {', '.join(SERIALIZERS)}")
+    return SERIALIZERS[name]()
+
+
+def write_json_lines(writer, entries, serializer=None) -> int:
+    """
+    Write Subkey entries to a JSON-lines file, one line per entry
+    :param writer: A file opened for writing bytes, preferably with a buffer of WRITE_BUFFER_SIZE
+    :param entries: Subkey objects
+    :param serializer: The serializer to use, by default the one get_serializer() returns
+    :return: The number of entries written
+    """
+    dumps = (serializer or get_serializer()).dumps
+    entries_count = 0
+    for entry in entries:
+        writer.write(dumps(subkey_to_dict(entry)))
+        writer.write(b"\n")
+        entries_count += 1
+    return entries_count
@@ -43,18 +43,19 @@ HBIN_HEADER = Struct(
 ).compile()
 
 CM_KEY_NODE_SIZE = 76
+KEY_COMP_NAME = 0x0020
+KEY_NODE_FLAGS = FlagsEnum(
+    Int16ul,
+    KEY_VOLATILE=0x0001,
+    KEY_HIVE_EXIT=0x0002,
+    KEY_HIVE_ENTRY=0x0004,
+    KEY_NO_DELETE=0x0008,
+    KEY_SYM_LINK=0x0010,
+    KEY_COMP_NAME=KEY_COMP_NAME,
+    KEY_PREDEF_HANDLE=0x0040,
+)
 CM_KEY_NODE = Struct(
-    "flags"
-    / FlagsEnum(
-        Int16ul,
-        KEY_VOLATILE=0x0001,
-        KEY_HIVE_EXIT=0x0002,
-        KEY_HIVE_ENTRY=0x0004,
-        KEY_NO_DELETE=0x0008,
-        KEY_SYM_LINK=0x0010,
-        KEY_COMP_NAME=0x0020,
-        KEY_PREDEF_HANDLE=0x0040,
-    ),
+    "flags" / KEY_NODE_FLAGS,
     "last_modified" / Int64ul,
     "access_bits" / Bytes(4),
     "parent_key_offset" / Int32ul,
@@ -155,13 +156,15 @@ VALUE_TYPE_ENUM = Enum(
     REG_FILETIME=16,
 )
 
+VALUE_KEY_SIGNATURE = b"vk"
+VALUE_KEY_FLAGS = FlagsEnum(Int16ul, VALUE_COMP_NAME=0x0001)
 VALUE_KEY = Struct(
-    "signature" / Const(b"vk"),
+    "signature" / Const(VALUE_KEY_SIGNATURE),
     "name_size" / Int16ul,
     "data_size" / Int32ul,
     "data_offset" / Int32ul,
     "data_type" / VALUE_TYPE_ENUM,
-    "flags" / FlagsEnum(Int16ul, VALUE_COMP_NAME=0x0001),
+    "flags" / VALUE_KEY_FLAGS,
     "padding" * Int16ul,
     "name" / Bytes(this.name_size),
 ).compile()
@@ -188,6 +191,8 @@ TRANSACTION_LOG = Struct(
 )
 
 BIG_DATA_SIGNATURE = b"db"
+# Values bigger than this are split into segments of this size, listed by a big data block
+BIG_DATA_SEGMENT_SIZE = 0x3FD8
 BIG_DATA_BLOCK = Struct(
     "signature" / Const(BIG_DATA_SIGNATURE),
     "number_of_segments" / Int16ul,
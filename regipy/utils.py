@@ -1,17 +1,25 @@
 import binascii
 import datetime as dt
 import hashlib
+import itertools
 import logging
+import mmap
+import os
 import struct
 import sys
 from collections.abc import Generator
 from contextlib import contextmanager
 from dataclasses import asdict
-from io import TextIOWrapper
-from typing import Union
+from io import BytesIO, TextIOWrapper
+from typing import Optional, Union
 
 import pytz
 
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
 from regipy.exceptions import (
     NoRegistrySubkeysException,
     RegipyGeneralException,
@@ -38,6 +46,19 @@ MAX_LEN: int = 256
 # As the length can be arbitrarly large
 MAX_LEN_ERR_MSG_REGVALUE: int = 20
 
+# Hives bigger than this are memory mapped by default, instead of being read into memory
+MMAP_THRESHOLD: int = 64 * 1024**2
+
+FILETIME_EPOCH = dt.datetime(1601, 1, 1, tzinfo=pytz.utc)
+FILETIME_UNIX_EPOCH_MICROSECONDS: int = 11644473600 * 10**6
+MAX_FILETIME_MICROSECONDS: int = (dt.datetime.max.replace(tzinfo=pytz.utc) - FILETIME_EPOCH) // dt.timedelta(microseconds=1)
+
+# The number of keys whose timestamps are converted at once when dumping a hive
+TIMESTAMP_BATCH_SIZE: int = 1024
+
+# Below this many distinct timestamps, converting them one by one is faster than through numpy
+NUMPY_MIN_BATCH_SIZE: int = 64
+
 
 def calculate_sha1(file_path):
     sha1 = hashlib.sha1()
@@ -65,6 +86,123 @@ def calculate_xor32_checksum(b: bytes) -> int:
     return checksum
 
 
+def calculate_key_name_hash(key_name: str) -> int:
+    """
+    Calculate the hash of a key name, as stored in hash leaf (LH) subkey lists.
+    Windows upper cases the name with its own table, so the result is only guaranteed to match for ASCII names.
+    :param key_name: The name of the key
+    :return: The calculated hash
+    """
+    name_hash = 0
+    for c in key_name.upper():
+        name_hash = (name_hash * 37 + ord(c)) & 0xFFFFFFFF
+    return name_hash
+
+
+def calculate_marvin32(data, seed: int) -> int:
+    """
+    Calculate the Marvin32 hash of a buffer, as stored in the log entries of HvLE transaction logs
+    :param data: A bytes-like object
+    :param seed: The 64 bit seed
+    :return: The 64 bit hash
+    """
+    data = memoryview(data)
+    words_size = len(data) - len(data) % 4
+
+    # The last bytes are padded with 0x80, and mixed in twice
+    tail = int.from_bytes(data[words_size:], "little") | (0x80 << (8 * (len(data) - words_size)))
+    words = itertools.chain((word for (word,) in struct.iter_unpack("<I", data[:words_size])), [tail, 0])
+
+    low = seed & 0xFFFFFFFF
+    high = seed >> 32
+    for word in words:
+        low = (low + word) & 0xFFFFFFFF
+        high ^= low
+        low = ((low << 20) | (low >> 12)) & 0xFFFFFFFF
+        low = (low + high) & 0xFFFFFFFF
+        high = ((high << 9) | (high >> 23)) & 0xFFFFFFFF
+        high ^= low
+        low = ((low << 27) | (low >> 5)) & 0xFFFFFFFF
+        low = (low + high) & 0xFFFFFFFF
+        high = ((high << 19) | (high >> 13)) & 0xFFFFFFFF
+    return (high << 32) | low
+
+
+def open_hive_stream(hive_path, use_mmap: Optional[bool] = None) -> Union[BytesIO, mmap.mmap]:
+    """
+    Open a registry hive as a read only, seekable stream
+    :param hive_path: Path to the registry hive
+    :param use_mmap: Whether to memory map the hive instead of reading it into memory.
+                     If None, the hive will be memory mapped only if it is bigger than MMAP_THRESHOLD
+    :return: A file-like object that also exposes the buffer protocol (mmap) or getbuffer() (BytesIO)
+    """
+    if use_mmap is None:
+        use_mmap = os.path.getsize(hive_path) > MMAP_THRESHOLD
+
+    with open(hive_path, "rb") as f:
+        if use_mmap:
+            # The mapping keeps its own handle to the file, so it stays valid after the file is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return BytesIO(f.read())
+
+
+class HiveCursor:
+    """
+    A read only, seekable reader over the data of a hive, with a position of its own.
+    Parsing with a cursor per reader, instead of seeking the hive stream, lets threads and interleaved generators
+    read the same hive without moving each other's position.
+    """
+
+    __slots__ = ("buffer", "_position")
+
+    def __init__(self, buffer, offset: int = 0):
+        """
+        :param buffer: A view over the hive data, as returned by get_stream_buffer()
+        :param offset: The position to start reading from
+        """
+        self.buffer = buffer
+        self._position = offset
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        start = self._position
+        end = len(self.buffer) if size is None or size < 0 else start + size
+        data = bytes(self.buffer[start:end])
+        self._position = start + len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self.buffer)
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+
+def get_stream_buffer(stream) -> memoryview:
+    """
+    Get a zero-copy view over the data of a stream returned by open_hive_stream
+    :param stream: A BytesIO, mmap or HiveCursor object
+    :return: A memoryview over the whole stream
+    """
+    if isinstance(stream, HiveCursor):
+        return stream.buffer
+    if isinstance(stream, BytesIO):
+        return stream.getbuffer()
+    return memoryview(stream)
+
+
 @contextmanager
 def boomerang_stream(stream: TextIOWrapper) -> Generator[TextIOWrapper, None, None]:
     """
@@ -91,6 +229,18 @@ def convert_filetime(dw_low_date_time, dw_high_date_time):
         return None
 
 
+def convert_datetime_to_filetime(date: dt.datetime) -> int:
+    """
+    Convert a datetime to a FILETIME, the number of 100 nanoseconds intervals since 1601-01-01 UTC
+    :param date: The datetime. Naive datetimes are considered UTC
+    :return: The FILETIME, as an integer
+    """
+    if date.tzinfo is None:
+        date = pytz.utc.localize(date)
+    delta = date - dt.datetime(1601, 1, 1, tzinfo=pytz.utc)
+    return (delta.days * 86400 + delta.seconds) * 10**7 + delta.microseconds * 10
+
+
 # Convert FILETIME to datetime.
 # Based on http://code.activestate.com/recipes/511425-filetime-to-datetime/
 def convert_filetime2(dte):
@@ -116,13 +266,64 @@ def convert_wintime(wintime: int, as_json=False) -> Union[dt.datetime, str]:
     # http://stackoverflow.com/questions/4869769/convert-64-bit-windows-date-time-in-python
     us = wintime / 10
     try:
-        date = dt.datetime(1601, 1, 1, tzinfo=pytz.utc) + dt.timedelta(microseconds=us)
+        date = FILETIME_EPOCH + dt.timedelta(microseconds=us)
     except OverflowError:
         # If date is too big, it is probably corrupted' let's return the smallest possible windows timestamp.
-        date = dt.datetime(1601, 1, 1, tzinfo=pytz.utc)
+        date = FILETIME_EPOCH
     return date.isoformat() if as_json else date
 
 
+def convert_wintimes(wintimes, as_json=False) -> list[Union[dt.datetime, str]]:
+    """
+    Convert many FILETIME dates at once, with the same results as convert_wintime().
+    Every distinct timestamp is only converted once, and if numpy is installed, ISO strings are formatted by it.
+    :param wintimes: integers representing FILETIME timestamps
+    :param as_json: whether to return the dates as strings or not
+    :return: A list of datetimes, or of ISO strings
+    """
+    wintimes = list(wintimes)
+    # Keys are often modified together, so there are usually many less distinct timestamps than keys
+    unique_wintimes = list(dict.fromkeys(wintimes))
+
+    if as_json and numpy is not None and len(unique_wintimes) >= NUMPY_MIN_BATCH_SIZE:
+        converted = _format_wintimes_with_numpy(unique_wintimes)
+    else:
+        converted = [convert_wintime(wintime, as_json=as_json) for wintime in unique_wintimes]
+
+    if len(unique_wintimes) == len(wintimes):
+        return converted
+    conversions = dict(zip(unique_wintimes, converted))
+    return [conversions[wintime] for wintime in wintimes]
+
+
+def _format_wintimes_with_numpy(wintimes) -> list[str]:
+    # timedelta() rounds the microseconds float half to even, like round() does
+    microseconds = numpy.array([round(wintime / 10) for wintime in wintimes], dtype=numpy.int64)
+    # Dates after year 9999 are converted to the FILETIME epoch, like convert_wintime() does
+    microseconds[microseconds > MAX_FILETIME_MICROSECONDS] = 0
+
+    dates = (microseconds - FILETIME_UNIX_EPOCH_MICROSECONDS).astype("datetime64[us]")
+    # datetime.isoformat() leaves the microseconds out when they are 0
+    return [
+        f"{date[:-7] if date.endswith('.000000') else date}+00:00"
+        for date in numpy.datetime_as_string(dates, unit="us").tolist()
+    ]
+
+
+def batched(iterable, batch_size):
+    """
+    Split an iterable into lists of batch_size items. The last list may be shorter.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def get_subkey_values_from_list(registry_hive, entries_list, as_json=False, trim_values=True):
     """
     Return a list of registry subkeys given a list of paths
@@ -139,7 +340,7 @@ def get_subkey_values_from_list(registry_hive, entries_list, as_json=False, trim
         except (RegistryKeyNotFoundException, NoRegistrySubkeysException) as ex:
             logger.debug(f"Could not find subkey: {path} ({ex})")
             continue
-        ts = convert_wintime(subkey.header.last_modified, as_json=as_json)
+        ts = convert_wintime(subkey.last_modified, as_json=as_json)
 
         values = []
         if subkey.values_count:
@@ -16,9 +16,12 @@ from mcp.server.fastmcp import FastMCP
 
 # Import all plugins so they auto-register via __init_subclass__
 import regipy.plugins  # noqa
+from regipy.batch import iter_hive_files
 from regipy.plugins.plugin import PLUGINS
 from regipy.plugins.utils import run_relevant_plugins
+from regipy.regdiff import iter_registry_hive_differences
 from regipy.registry import RegistryHive
+from regipy.serialization import subkey_to_dict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -46,20 +49,16 @@ def _load_hives_from_directory(directory: str) -> dict[str, RegistryHive]:
         logger.error(f"Hive directory does not exist: {directory}")
         return hives
 
-    # Common registry hive file patterns
-    skip_extensions = {".log", ".log1", ".log2", ".sav", ".regtrans-ms", ".blf", ".tmp"}
-
-    for file_path in directory_path.iterdir():
-        if not file_path.is_file():
-            continue
-
-        # Skip transaction logs and backup files
-        if file_path.suffix.lower() in skip_extensions:
-            continue
+    # Indexes are keyed by the SHA-1 of the hive, so they are reused across sessions as long as the hive is unchanged
+    index_directory = os.getenv("REGIPY_INDEX_DIRECTORY")
 
+    # Skips transaction logs and backup files
+    for file_path in iter_hive_files(directory_path, recursive=False):
         try:
             logger.info(f"Attempting to load hive: {file_path}")
-            hive = RegistryHive(str(file_path))
+            hive = RegistryHive(str(file_path), index_path=index_directory)
+            if index_directory and hive.index is None:
+                hive.build_index(index_directory)
             hives[str(file_path)] = hive
             logger.info(f"Successfully loaded {file_path.name} as {hive.hive_type}")
         except Exception as e:
@@ -97,13 +96,6 @@ def _get_hives_by_type(hive_type: str) -> list[tuple[str, RegistryHive]]:
     return [(path, hive) for path, hive in _loaded_hives.items() if hive.hive_type == hive_type]
 
 
-def _serialize_datetime(obj):
-    """Convert datetime objects to ISO format strings."""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
-
-
 def _serialize_plugin_results(results):
     """Recursively serialize plugin results, converting datetimes to strings."""
     if isinstance(results, dict):
@@ -393,15 +385,13 @@ def get_registry_key(key_path: str, hive_type: Optional[str] = None) -> dict:
     results = {}
     for path, hive in hives_to_search:
         try:
-            subkey = hive.get_key(key_path)
-            if subkey:
-                results[Path(path).name] = {
-                    "found": True,
-                    "path": subkey.path,
-                    "timestamp": _serialize_datetime(subkey.timestamp),
-                    "values": [{"name": v.name, "value": v.value, "type": v.value_type} for v in (subkey.values or [])],
-                    "subkey_count": len(list(subkey.iter_subkeys())) if hasattr(subkey, "iter_subkeys") else 0,
-                }
+            nk_record = hive.get_key(key_path)
+            entry = next(hive.recurse_subkeys(nk_record, path_root=key_path, as_json=True, max_depth=0))
+            results[Path(path).name] = {
+                "found": True,
+                **subkey_to_dict(entry),
+                "subkey_count": nk_record.subkey_count,
+            }
         except Exception as e:
             results[Path(path).name] = {"found": False, "error": str(e)}
 
@@ -411,6 +401,50 @@ def get_registry_key(key_path: str, hive_type: Optional[str] = None) -> dict:
     return {"key_path": key_path, "results": results}
 
 
+@mcp.tool()
+def compare_hives(first_hive: str, second_hive: str, detailed: bool = False, max_differences: int = 1000) -> dict:
+    """
+    Compare two loaded hives, for example snapshots of the same hive taken at different times.
+
+    Args:
+        first_hive: File name of the first (older) hive
+        second_hive: File name of the second (newer) hive
+        detailed: Whether to compare the values of all keys, and report modified and deleted values and deleted keys
+        max_differences: The maximum number of differences to return
+
+    Returns:
+        The differences, as (difference type, first hive, second hive, key path) entries
+    """
+    if not _loaded_hives:
+        return {"error": "No hives loaded. Use set_hive_directory first."}
+
+    hives_by_name = {Path(path).name: hive for path, hive in _loaded_hives.items()}
+    missing_hives = [name for name in (first_hive, second_hive) if name not in hives_by_name]
+    if missing_hives:
+        return {"error": f"Hives not loaded: {', '.join(missing_hives)}", "available_hives": sorted(hives_by_name)}
+
+    # With REGIPY_INDEX_DIRECTORY, the digests in the indexes skip the parts of the hives that did not change
+    differences = []
+    truncated = False
+    for difference_type, first_value, second_value, key_path in iter_registry_hive_differences(
+        hives_by_name[first_hive], hives_by_name[second_hive], detailed=detailed
+    ):
+        if len(differences) >= max_differences:
+            truncated = True
+            break
+        differences.append(
+            {"difference": difference_type, "first_hive": first_value, "second_hive": second_value, "key_path": key_path}
+        )
+
+    return {
+        "first_hive": first_hive,
+        "second_hive": second_hive,
+        "differences_count": len(differences),
+        "truncated": truncated,
+        "differences": differences,
+    }
+
+
 if __name__ == "__main__":
     import argparse
 
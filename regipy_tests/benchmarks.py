@@ -0,0 +1,486 @@
+"""
+Benchmarks of regipy, on the hives of regipy_tests/data and on synthetic hives.
+
+Every benchmark is timed for at least MIN_ROUNDS rounds and MIN_TIME seconds, and the statistics of the rounds are
+written to a JSON file, with the versions and the machine they were measured on. Comparing the results with the
+results of a previous release reports the benchmarks that got slower.
+
+    python -m regipy_tests.benchmarks -o results.json
+    python -m regipy_tests.benchmarks -o results.json --synthetic-keys 1000000 --compare baseline.json
+    python -m regipy_tests.benchmarks -k walk --profile
+"""
+
+import argparse
+import cProfile
+import datetime as dt
+import gc
+import json
+import logging
+import lzma
+import os
+import platform
+import pstats
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import regipy
+from regipy.exceptions import RegipyGeneralException
+from regipy.plugins.plugin import PLUGINS
+from regipy.plugins.utils import dump_hive_to_json, run_relevant_plugins
+from regipy.recovery import apply_transaction_logs
+from regipy.regdiff import compare_hives
+from regipy.registry import RegistryHive
+from regipy.serialization import SERIALIZERS, get_serializer
+from regipy_tests.synthetic_hive import generate_hive
+
+logger = logging.getLogger(__name__)
+
+DATA_DIRECTORY = Path(__file__).parent / "data"
+
+# Bundled hives the benchmarks run on. Hives that are missing from the data directory are skipped.
+HIVES = (
+    "NTUSER.DAT",
+    "SYSTEM",
+    "SOFTWARE",
+    "SAM",
+    "SECURITY",
+    "UsrClass.dat",
+    "amcache.hve",
+    "BCD",
+)
+
+# Pairs of hives that are compared, and transaction logs that are replayed: (hive, primary log, secondary log)
+COMPARED_HIVES = (("NTUSER.DAT", "NTUSER_modified.DAT"),)
+TRANSACTION_LOGS = (
+    ("transactions_NTUSER.DAT", "transactions_ntuser.dat.log1", None),
+    ("SYSTEM_B", "SYSTEM_B.LOG1", "SYSTEM_B.LOG2"),
+    ("UsrClass.dat", "UsrClass.dat.LOG1", "UsrClass.dat.LOG2"),
+)
+
+SYNTHETIC_KEYS = 100000
+SYNTHETIC_CHANGES = 0.01
+SYNTHETIC_CHANGES_SEED = 1
+
+# The number of keys looked up by the get_key benchmarks
+GET_KEY_SAMPLE_SIZE = 1000
+
+MIN_ROUNDS = 3
+MAX_ROUNDS = 100
+MIN_TIME = 1.0
+
+RESULTS_FORMAT_VERSION = 1
+COMPARED_STATISTIC = "median"
+REGRESSION_THRESHOLD = 0.1
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    hive: Optional[str]
+    rounds: int
+    min: float
+    max: float
+    mean: float
+    median: float
+    stddev: float
+
+
+@dataclass
+class Benchmark:
+    """
+    A benchmark. setup() prepares what is not timed, and returns the function that is timed
+    """
+
+    name: str
+    group: str
+    hive: Optional[str]
+    setup: Callable[[], Callable[[], object]]
+
+
+class HiveFiles:
+    """
+    The hives the benchmarks run on: bundled hives are decompressed, and synthetic hives are generated,
+    once, into a work directory
+    """
+
+    def __init__(self, work_directory):
+        self.work_directory = Path(work_directory)
+        self.work_directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, name) -> Optional[str]:
+        """
+        The path of a bundled hive or log, or None if it is not in the data directory
+        """
+        compressed_path = DATA_DIRECTORY / f"{name}.xz"
+        if not compressed_path.exists():
+            return None
+        path = self.work_directory / name
+        if not path.exists():
+            with lzma.open(compressed_path) as f, open(path, "wb") as output:
+                output.write(f.read())
+        return str(path)
+
+    def get_synthetic(self, keys_count, seed=0, changes=0.0) -> str:
+        path = self.work_directory / f"synthetic-{keys_count}-{seed}-{changes}.dat"
+        if not path.exists():
+            logger.info(f"Generating a synthetic hive with {keys_count} keys")
+            generate_hive(f"{path}.tmp", keys_count=keys_count, seed=seed, changes=changes)
+            os.replace(f"{path}.tmp", path)
+        return str(path)
+
+
+def _consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def _sample_key_paths(hive_path) -> list[str]:
+    registry_hive = RegistryHive(hive_path)
+    key_paths = [subkey.path for subkey in registry_hive.recurse_subkeys(fetch_values=False)]
+    registry_hive.close()
+    step = max(1, len(key_paths) // GET_KEY_SAMPLE_SIZE)
+    return key_paths[::step][:GET_KEY_SAMPLE_SIZE]
+
+
+def _hive_benchmarks(hive_name, hive_path, output_directory) -> Iterator[Benchmark]:
+    """
+    The benchmarks of the hot paths that run on any hive
+    """
+
+    def open_hive():
+        return lambda: RegistryHive(hive_path).close()
+
+    def walk():
+        registry_hive = RegistryHive(hive_path)
+        return lambda: _consume(registry_hive.recurse_subkeys(fetch_values=False))
+
+    def walk_values():
+        registry_hive = RegistryHive(hive_path)
+        return lambda: _consume(registry_hive.recurse_subkeys(as_json=True))
+
+    def get_key(key_cache_size):
+        def setup():
+            key_paths = _sample_key_paths(hive_path)
+
+            def get_keys():
+                # A new hive every round, so every round starts with an empty key cache
+                registry_hive = RegistryHive(hive_path, key_cache_size=key_cache_size)
+                for key_path in key_paths:
+                    registry_hive.get_key(key_path)
+
+            return get_keys
+
+        return setup
+
+    def dump(serializer_name):
+        def setup():
+            registry_hive = RegistryHive(hive_path)
+            serializer = get_serializer(serializer_name)
+            output_path = os.path.join(output_directory, f"{hive_name}.{serializer_name}.jsonl")
+            return lambda: dump_hive_to_json(registry_hive, output_path, registry_hive.root, False, serializer=serializer)
+
+        return setup
+
+    yield Benchmark(f"open[{hive_name}]", "open", hive_name, open_hive)
+    yield Benchmark(f"walk[{hive_name}]", "walk", hive_name, walk)
+    yield Benchmark(f"walk_values[{hive_name}]", "walk_values", hive_name, walk_values)
+    yield Benchmark(f"get_key_uncached[{hive_name}]", "get_key_uncached", hive_name, get_key(0))
+    yield Benchmark(f"get_key_cached[{hive_name}]", "get_key_cached", hive_name, get_key(GET_KEY_SAMPLE_SIZE))
+    for serializer_name in SERIALIZERS:
+        try:
+            get_serializer(serializer_name)
+        except RegipyGeneralException:
+            logger.info(f"Skipping the {serializer_name} dump benchmarks, {serializer_name} is not installed")
+            continue
+        yield Benchmark(f"dump_{serializer_name}[{hive_name}]", f"dump_{serializer_name}", hive_name, dump(serializer_name))
+
+
+def _plugin_benchmarks(hive_name, hive_path) -> Iterator[Benchmark]:
+    registry_hive = RegistryHive(hive_path)
+    hive_type = registry_hive.hive_type
+    registry_hive.close()
+    if hive_type is None:
+        return
+
+    def run_plugin(plugin_class):
+        def setup():
+            registry_hive = RegistryHive(hive_path)
+            return lambda: plugin_class(registry_hive, as_json=True).run()
+
+        return setup
+
+    def run_plugins():
+        registry_hive = RegistryHive(hive_path)
+        return lambda: run_relevant_plugins(registry_hive, as_json=True, include_unvalidated=True)
+
+    for plugin_class in sorted(PLUGINS, key=lambda x: x.NAME):
+        if hive_type == plugin_class.COMPATIBLE_HIVE:
+            yield Benchmark(f"plugin_{plugin_class.NAME}[{hive_name}]", "plugin", hive_name, run_plugin(plugin_class))
+    yield Benchmark(f"run_relevant_plugins[{hive_name}]", "run_relevant_plugins", hive_name, run_plugins)
+
+
+def _compare_benchmarks(name, first_hive_path, second_hive_path, output_directory) -> Iterator[Benchmark]:
+    yield Benchmark(
+        f"compare_hives[{name}]", "compare_hives", name, lambda: lambda: compare_hives(first_hive_path, second_hive_path)
+    )
+
+    def compare_indexed():
+        # The indexes are built once, and only the comparison that skips the identical subtrees is timed
+        index_directory = os.path.join(output_directory, "indexes")
+        os.makedirs(index_directory, exist_ok=True)
+        compare_hives(first_hive_path, second_hive_path, index_path=index_directory)
+        return lambda: compare_hives(first_hive_path, second_hive_path, index_path=index_directory)
+
+    yield Benchmark(f"compare_hives_indexed[{name}]", "compare_hives_indexed", name, compare_indexed)
+
+
+def _transaction_logs_benchmarks(
+    hive_files: HiveFiles, hive_name, primary_log_name, secondary_log_name, output_directory
+) -> Iterator[Benchmark]:
+    hive_path = hive_files.get(hive_name)
+    primary_log_path = hive_files.get(primary_log_name)
+    secondary_log_path = hive_files.get(secondary_log_name) if secondary_log_name else None
+    if not hive_path or not primary_log_path:
+        return
+
+    output_path = os.path.join(output_directory, f"{hive_name}.restored")
+    yield Benchmark(
+        f"apply_transaction_logs[{hive_name}]",
+        "apply_transaction_logs",
+        hive_name,
+        lambda: lambda: apply_transaction_logs(hive_path, primary_log_path, secondary_log_path, output_path),
+    )
+
+    def open_recovered():
+        RegistryHive(hive_path, primary_log_path=primary_log_path, secondary_log_path=secondary_log_path).close()
+
+    yield Benchmark(f"open_recovered_hive[{hive_name}]", "open_recovered_hive", hive_name, lambda: open_recovered)
+
+
+def iter_benchmarks(hive_files: HiveFiles, output_directory, synthetic_keys=SYNTHETIC_KEYS) -> Iterator[Benchmark]:
+    """
+    All the benchmarks
+    :param hive_files: Where the hives are taken from
+    :param output_directory: Where the benchmarks write their outputs
+    :param synthetic_keys: The number of keys of the synthetic hive, 0 to skip the synthetic hive benchmarks
+    """
+    for hive_name in HIVES:
+        hive_path = hive_files.get(hive_name)
+        if hive_path is None:
+            logger.info(f"Skipping the benchmarks of {hive_name}, it is not in {DATA_DIRECTORY}")
+            continue
+        yield from _hive_benchmarks(hive_name, hive_path, output_directory)
+        yield from _plugin_benchmarks(hive_name, hive_path)
+
+    for first_hive_name, second_hive_name in COMPARED_HIVES:
+        first_hive_path, second_hive_path = hive_files.get(first_hive_name), hive_files.get(second_hive_name)
+        if first_hive_path and second_hive_path:
+            yield from _compare_benchmarks(first_hive_name, first_hive_path, second_hive_path, output_directory)
+
+    for hive_name, primary_log_name, secondary_log_name in TRANSACTION_LOGS:
+        yield from _transaction_logs_benchmarks(hive_files, hive_name, primary_log_name, secondary_log_name, output_directory)
+
+    if synthetic_keys:
+        hive_name = f"synthetic-{synthetic_keys}"
+        hive_path = hive_files.get_synthetic(synthetic_keys)
+        yield from _hive_benchmarks(hive_name, hive_path, output_directory)
+        changed_hive_path = hive_files.get_synthetic(synthetic_keys, SYNTHETIC_CHANGES_SEED, SYNTHETIC_CHANGES)
+        yield from _compare_benchmarks(hive_name, hive_path, changed_hive_path, output_directory)
+
+
+def time_benchmark(benchmark: Benchmark, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, min_time=MIN_TIME) -> BenchmarkResult:
+    """
+    Time a benchmark. The garbage collector is disabled while a round is timed, like timeit does.
+    """
+    function = benchmark.setup()
+    timings = []
+    while len(timings) < min_rounds or (sum(timings) < min_time and len(timings) < max_rounds):
+        gc.collect()
+        gc.disable()
+        try:
+            start_time = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start_time)
+        finally:
+            gc.enable()
+
+    return BenchmarkResult(
+        name=benchmark.name,
+        group=benchmark.group,
+        hive=benchmark.hive,
+        rounds=len(timings),
+        min=min(timings),
+        max=max(timings),
+        mean=statistics.mean(timings),
+        median=statistics.median(timings),
+        stddev=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    )
+
+
+def profile_benchmark(benchmark: Benchmark, limit=40):
+    """
+    Print the cProfile statistics of a round of a benchmark, sorted by cumulative time
+    """
+    function = benchmark.setup()
+    profile = cProfile.Profile()
+    profile.runcall(function)
+    print(f"=== {benchmark.name}")
+    pstats.Stats(profile, stream=sys.stdout).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+
+
+def _get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_environment() -> dict:
+    """
+    What the results were measured with, so results of different machines are not compared by mistake
+    """
+    return {
+        "regipy_version": regipy.__version__,
+        "git_commit": _get_git_commit(),
+        "python_version": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "optional_dependencies": {name: _is_installed(name) for name in ("numpy", "orjson", "pyarrow", "libfwsi", "libfwps")},
+    }
+
+
+def _is_installed(module_name) -> bool:
+    try:
+        __import__(module_name)
+    except ImportError:
+        return False
+    return True
+
+
+def run_benchmarks(
+    work_directory,
+    keyword: Optional[str] = None,
+    synthetic_keys=SYNTHETIC_KEYS,
+    min_rounds=MIN_ROUNDS,
+    max_rounds=MAX_ROUNDS,
+    min_time=MIN_TIME,
+) -> dict:
+    """
+    Run the benchmarks
+    :param work_directory: Where the hives are decompressed and generated, and the outputs are written
+    :param keyword: If given, only the benchmarks whose name contains it are run
+    :param synthetic_keys: The number of keys of the synthetic hive, 0 to skip the synthetic hive benchmarks
+    :return: The results, as written to the results file
+    """
+    hive_files = HiveFiles(work_directory)
+    output_directory = tempfile.mkdtemp(dir=work_directory)
+    results = []
+    for benchmark in iter_benchmarks(hive_files, output_directory, synthetic_keys):
+        if keyword and keyword not in benchmark.name:
+            continue
+        result = time_benchmark(benchmark, min_rounds, max_rounds, min_time)
+        logger.info(f"{result.name}: {result.median:.6f}s median of {result.rounds} rounds")
+        results.append(result)
+
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "date": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "environment": get_environment(),
+        "benchmarks": [asdict(result) for result in results],
+    }
+
+
+def compare_results(baseline, results, statistic=COMPARED_STATISTIC, threshold=REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Compare results with the results of a baseline run
+    :param baseline: Results, as returned by run_benchmarks()
+    :param results: Results, as returned by run_benchmarks()
+    :param statistic: The statistic of the rounds that is compared
+    :param threshold: A benchmark regressed if it is slower than the baseline by more than this fraction
+    :return: A comparison for every benchmark that is in both results, sorted from the biggest slowdown
+    """
+    baseline_benchmarks = {benchmark["name"]: benchmark for benchmark in baseline["benchmarks"]}
+    comparisons = []
+    for benchmark in results["benchmarks"]:
+        baseline_benchmark = baseline_benchmarks.get(benchmark["name"])
+        if baseline_benchmark is None or not baseline_benchmark[statistic]:
+            continue
+        ratio = benchmark[statistic] / baseline_benchmark[statistic]
+        comparisons.append(
+            {
+                "name": benchmark["name"],
+                "baseline": baseline_benchmark[statistic],
+                "current": benchmark[statistic],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return sorted(comparisons, key=lambda x: x["ratio"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="The path of the JSON results file")
+    parser.add_argument("-k", "--keyword", help="Only run the benchmarks whose name contains this")
+    parser.add_argument("-w", "--work-directory", help="Where hives are decompressed and generated, and reused")
+    parser.add_argument("--synthetic-keys", type=int, default=SYNTHETIC_KEYS, help="0 to skip the synthetic hive")
+    parser.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="The minimal time of every benchmark")
+    parser.add_argument("--compare", help="The results file of a baseline run, to report regressions against")
+    parser.add_argument("--statistic", default=COMPARED_STATISTIC, choices=("min", "median", "mean"))
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="The allowed slowdown, as a fraction")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks, without running them")
+    parser.add_argument("--profile", action="store_true", help="Profile a round of every benchmark instead of timing")
+    args = parser.parse_args()
+
+    # Only the progress of the benchmarks is logged, and the errors of regipy
+    logging.basicConfig(level=logging.ERROR, format="%(message)s")
+    logger.setLevel(logging.INFO)
+    work_directory = args.work_directory or tempfile.mkdtemp(prefix="regipy-benchmarks-")
+
+    if args.list or args.profile:
+        hive_files = HiveFiles(work_directory)
+        for benchmark in iter_benchmarks(hive_files, tempfile.mkdtemp(dir=work_directory), args.synthetic_keys):
+            if args.keyword and args.keyword not in benchmark.name:
+                continue
+            if args.profile:
+                profile_benchmark(benchmark)
+            else:
+                print(benchmark.name)
+        return
+
+    results = run_benchmarks(work_directory, args.keyword, args.synthetic_keys, args.min_rounds, args.max_rounds, args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparisons = compare_results(baseline, results, args.statistic, args.threshold)
+        for comparison in comparisons:
+            flag = "REGRESSION" if comparison["regression"] else ""
+            print(
+                f"{comparison['name']:<60} {comparison['baseline']:>12.6f} {comparison['current']:>12.6f} "
+                f"{comparison['ratio']:>7.2f}x {flag}"
+            )
+        if any(comparison["regression"] for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
+import csv
 import json
+import shutil
 from tempfile import mktemp
 
+import pytest
 from click.testing import CliRunner
 
-from regipy.cli import parse_header, registry_dump, run_plugins
+from regipy.cli import (
+    parse_header,
+    reg_diff,
+    reg_diff_snapshots,
+    registry_dump,
+    registry_export,
+    run_plugins,
+    run_plugins_batch,
+)
+from regipy.index import INDEX_FILE_EXTENSION
 
 
 def test_cli_registry_parse_header(ntuser_hive):
@@ -52,6 +64,58 @@ def test_cli_registry_dump(ntuser_hive):
     assert result.output.strip().endswith("(1489 subkeys enumerated)")
 
 
+@pytest.mark.parametrize(
+    "hive_fixture, extra_args",
+    [
+        ("ntuser_hive", []),
+        ("ntuser_hive", ["-d"]),
+        ("ntuser_hive", ["-p", "\\Software\\Microsoft"]),
+        ("ntuser_software_partial", ["-r", "\\Software"]),
+    ],
+)
+def test_cli_registry_dump_workers(hive_fixture, extra_args, request):
+    hive_path = request.getfixturevalue(hive_fixture)
+    runner = CliRunner()
+
+    outputs = []
+    for workers in ("1", "2"):
+        output_file_path = mktemp()
+        result = runner.invoke(registry_dump, [hive_path, "-o", output_file_path, "-w", workers, *extra_args])
+        assert result.exit_code == 0
+        with open(output_file_path, "rb") as f:
+            outputs.append(f.read())
+        subkey_count = len(outputs[-1].splitlines()) - 1
+        assert result.output.strip().endswith(f"({subkey_count} subkeys enumerated)")
+
+    assert outputs[0] == outputs[1]
+
+
+def test_cli_registry_dump_serializer(ntuser_hive):
+    runner = CliRunner()
+
+    outputs = []
+    for serializer in ("json", "orjson"):
+        output_file_path = mktemp()
+        result = runner.invoke(registry_dump, [ntuser_hive, "-o", output_file_path, "--serializer", serializer])
+        assert result.exit_code == 0
+        assert result.output.strip().endswith("(1811 subkeys enumerated)")
+        with open(output_file_path) as f:
+            outputs.append([json.loads(x) for x in f])
+
+    assert outputs[0] == outputs[1]
+
+
+def test_cli_registry_export(ntuser_hive):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    runner = CliRunner()
+
+    output_file_path = mktemp()
+    result = runner.invoke(registry_export, [ntuser_hive, "-o", output_file_path, "-p", "\\Software"])
+    assert result.exit_code == 0
+    assert result.output.strip().endswith("rows written)")
+    assert pyarrow_parquet.read_table(output_file_path).column("path")[-1].as_py() == "\\"
+
+
 def test_cli_run_plugins(ntuser_hive):
     runner = CliRunner()
 
@@ -79,3 +143,56 @@ def test_cli_run_plugins(ntuser_hive):
         "word_wheel_query",
         "wsl",
     }
+
+
+def test_cli_run_plugins_batch(ntuser_hive, tmp_path):
+    hives_directory = tmp_path / "hives"
+    hives_directory.mkdir()
+    shutil.copy(ntuser_hive, hives_directory / "NTUSER.DAT")
+    output_directory = tmp_path / "output"
+
+    runner = CliRunner()
+    result = runner.invoke(run_plugins_batch, [str(hives_directory), "-o", str(output_directory), "-w", "1"])
+    assert result.exit_code == 0
+    assert result.output.strip().endswith("1 done")
+    with open(output_directory / "NTUSER.DAT.json") as f:
+        assert json.load(f)
+
+
+def test_cli_reg_diff(ntuser_hive, second_hive_path, tmp_path):
+    runner = CliRunner()
+    output_file_path = tmp_path / "diff.csv"
+    result = runner.invoke(reg_diff, [ntuser_hive, second_hive_path, "-o", str(output_file_path)])
+    assert result.exit_code == 0
+    assert result.output.strip().endswith("Detected 7 differences")
+    with open(output_file_path) as f:
+        rows = list(csv.reader(f, delimiter="|"))
+    assert rows[0] == ["difference", "first_hive", "second_hive", "description"]
+    assert sorted(row[0] for row in rows[1:]) == ["new_subkey"] * 6 + ["new_value"]
+
+    result = runner.invoke(reg_diff, [ntuser_hive, second_hive_path, "-d", "-i", str(tmp_path)])
+    assert result.exit_code == 0
+    assert "deleted_subkey" in result.output
+    assert result.output.strip().endswith("Detected 7 differences")
+    assert len(list(tmp_path.glob(f"*{INDEX_FILE_EXTENSION}"))) == 2
+
+
+def test_cli_reg_diff_snapshots(ntuser_hive, second_hive_path, tmp_path):
+    runner = CliRunner()
+    output_file_path = tmp_path / "history.jsonl"
+    result = runner.invoke(reg_diff_snapshots, [ntuser_hive, second_hive_path, ntuser_hive, "-o", str(output_file_path)])
+    assert result.exit_code == 0
+    assert result.output.strip().endswith("Detected changes in 9 keys")
+    with open(output_file_path) as f:
+        key_histories = [json.loads(line) for line in f]
+    assert len(key_histories) == 9
+    assert key_histories[2]["path"] == "\\Software\\Microsoft\\legitimate_subkey"
+    assert [key_change["change"] for key_change in key_histories[2]["changes"]] == ["added", "removed"]
+
+    result = runner.invoke(reg_diff_snapshots, [ntuser_hive, second_hive_path])
+    assert result.exit_code == 0
+    assert "not_a_malware" in result.output
+    assert result.output.strip().endswith("Detected changes in 9 keys")
+
+    result = runner.invoke(reg_diff_snapshots, [ntuser_hive])
+    assert result.exit_code != 0
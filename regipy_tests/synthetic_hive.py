@@ -0,0 +1,379 @@
+"""
+Generate synthetic registry hives of any size, for benchmarks and tests.
+
+The key tree is a complete tree: key 0 is the root, and the subkeys of key i are keys fanout * i + 1 to
+fanout * i + fanout. Names, values and timestamps are derived from the index of the key and the seed, so the same
+arguments always produce the same file. With changes, a deterministic fraction of the keys get different timestamps
+and values, and an extra value and subkey named CHANGED_NAME, so two hives generated with different seeds can be
+compared.
+
+    python -m regipy_tests.synthetic_hive /tmp/synthetic.dat --keys 1000000
+"""
+
+import argparse
+import datetime as dt
+import hashlib
+import struct
+
+from regipy.structs import BIG_DATA_SEGMENT_SIZE, REGF_HEADER_SIZE
+from regipy.utils import calculate_key_name_hash, calculate_xor32_checksum, convert_datetime_to_filetime
+
+HBIN_SIZE = 4096
+HBIN_HEADER_SIZE = 32
+
+# Subkeys are split between several LH lists, referenced by an RI list, above this many subkeys
+SUBKEY_LIST_MAX_ELEMENTS = 512
+
+# The FILETIME of the root key. Every key was modified a second after the previous one
+BASE_TIMESTAMP = convert_datetime_to_filetime(dt.datetime(2024, 1, 1))
+TIMESTAMP_INTERVAL = 10**7
+
+BIG_DATA_VALUE_SIZE = 40000
+
+# The name of the value and of the subkey that are added to changed keys. It is sorted before the other subkeys.
+CHANGED_NAME = "Changed"
+
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+# The data types of the values of a key, in order
+VALUE_TYPES = (REG_SZ, REG_DWORD, REG_BINARY, REG_QWORD, REG_MULTI_SZ, REG_EXPAND_SZ)
+
+KEY_COMP_NAME = 0x0020
+KEY_HIVE_ENTRY = 0x0004
+KEY_NO_DELETE = 0x0008
+ROOT_KEY_FLAGS = KEY_COMP_NAME | KEY_HIVE_ENTRY | KEY_NO_DELETE
+VALUE_COMP_NAME = 0x0001
+NO_OFFSET = 0xFFFFFFFF
+
+_REGF_HEADER = struct.Struct("<4sIIQIIIIIII64s396s")
+_HBIN_HEADER = struct.Struct("<4sIIIIQI")
+_CELL_SIZE = struct.Struct("<i")
+_KEY_NODE = struct.Struct("<2sHQ4s13I4xHH")
+_VALUE_KEY = struct.Struct("<2sHIIIH2x")
+_SECURITY_KEY = struct.Struct("<2s2xIIII")
+_BIG_DATA_BLOCK = struct.Struct("<2sHI")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+
+# The offset of subkeys_list_offset and values_list_offset in a key node cell, including the cell size
+_SUBKEYS_LIST_OFFSET_FIELD = 32
+_VALUES_LIST_OFFSET_FIELD = 44
+_SECURITY_KEY_OFFSET_FIELD = 48
+
+
+def _sid(authority: int, *sub_authorities: int) -> bytes:
+    return (
+        struct.pack("<BB", 1, len(sub_authorities))
+        + authority.to_bytes(6, "big")
+        + b"".join(_UINT32.pack(x) for x in sub_authorities)
+    )
+
+
+def _build_security_descriptor() -> bytes:
+    """
+    A self relative security descriptor: owned by Administrators, with a DACL that grants everything to SYSTEM
+    """
+    owner = _sid(5, 32, 544)
+    group = _sid(5, 18)
+    ace_sid = _sid(5, 18)
+    # ACCESS_ALLOWED, CONTAINER_INHERIT_ACE, GENERIC_ALL
+    ace = struct.pack("<BBHI", 0, 0x2, 8 + len(ace_sid), 0x10000000) + ace_sid
+    dacl = struct.pack("<BBHHH", 2, 0, 8 + len(ace), 1, 0) + ace
+
+    owner_offset = 20
+    group_offset = owner_offset + len(owner)
+    dacl_offset = group_offset + len(group)
+    # SE_SELF_RELATIVE | SE_DACL_PRESENT
+    header = struct.pack("<BBHIIII", 1, 0, 0x8004, owner_offset, group_offset, 0, dacl_offset)
+    return header + owner + group + dacl
+
+
+def get_key_name(index: int) -> str:
+    """
+    The name of a key. Names are zero padded, so the subkeys of a key are sorted by their index.
+    """
+    return f"Key{index:08d}"
+
+
+def is_changed(index: int, seed: int, changes: float) -> bool:
+    """
+    Whether a key differs from the key with the same index in a hive generated with seed 0
+    """
+    if not changes or not seed:
+        return False
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=4).digest()
+    return _UINT32.unpack(digest)[0] < changes * 2**32
+
+
+class _HiveWriter:
+    """
+    Allocates cells in hbins and writes the hbins to the file. The last hbin is kept in memory until it is full,
+    so most cells can still be patched without seeking the file.
+    """
+
+    def __init__(self, f, timestamp: int):
+        self._f = f
+        self._timestamp = timestamp
+        self._hbin = bytearray()
+        self._hbin_offset = 0
+        self._position = 0
+        self.hbins_size = 0
+
+    def _flush_hbin(self):
+        if not self._hbin:
+            return
+        free_size = len(self._hbin) - (self._position - self._hbin_offset)
+        if free_size:
+            _CELL_SIZE.pack_into(self._hbin, len(self._hbin) - free_size, free_size)
+        self._f.write(self._hbin)
+        self._hbin_offset += len(self._hbin)
+
+    def _new_hbin(self, cell_size: int):
+        self._flush_hbin()
+        hbin_size = -(-(cell_size + HBIN_HEADER_SIZE) // HBIN_SIZE) * HBIN_SIZE
+        self._hbin = bytearray(hbin_size)
+        _HBIN_HEADER.pack_into(self._hbin, 0, b"hbin", self._hbin_offset, hbin_size, 0, 0, self._timestamp, 0)
+        self._position = self._hbin_offset + HBIN_HEADER_SIZE
+        self.hbins_size = self._hbin_offset + hbin_size
+
+    def allocate(self, data: bytes) -> int:
+        """
+        Write an allocated cell
+        :return: The offset of the cell, relative to the first hbin, as stored in the hive
+        """
+        cell_size = (len(data) + 4 + 7) & ~7
+        if not self._hbin or self._position + cell_size > self._hbin_offset + len(self._hbin):
+            self._new_hbin(cell_size)
+
+        offset = self._position
+        position = offset - self._hbin_offset
+        _CELL_SIZE.pack_into(self._hbin, position, -cell_size)
+        self._hbin[position + 4 : position + 4 + len(data)] = data
+        self._position += cell_size
+        return offset
+
+    def patch_uint32(self, offset: int, value: int):
+        """
+        Overwrite a 32 bits field of a cell that was already allocated
+        """
+        if offset >= self._hbin_offset:
+            _UINT32.pack_into(self._hbin, offset - self._hbin_offset, value)
+            return
+        self._f.seek(REGF_HEADER_SIZE + offset)
+        self._f.write(_UINT32.pack(value))
+        self._f.seek(0, 2)
+
+    def close(self):
+        self._flush_hbin()
+
+
+class _HiveGenerator:
+    def __init__(self, f, keys_count, fanout, values_per_key, seed, changes, big_data):
+        self.keys_count = keys_count
+        self.fanout = fanout
+        self.values_per_key = values_per_key
+        self.seed = seed
+        self.changes = changes
+        self.big_data = big_data
+        self.writer = _HiveWriter(f, BASE_TIMESTAMP)
+        self.security_key_offset = NO_OFFSET
+        self.values_count = 0
+
+    def _get_value_data(self, index: int, value_index: int, changed: bool) -> tuple[int, bytes]:
+        value_type = VALUE_TYPES[value_index % len(VALUE_TYPES)]
+        version = self.seed if changed else 0
+        if value_type == REG_SZ:
+            data = f"Data {index}.{value_index}.{version}\0".encode("utf-16-le")
+        elif value_type == REG_EXPAND_SZ:
+            data = f"%SystemRoot%\\System32\\{index}.{version}.dll\0".encode("utf-16-le")
+        elif value_type == REG_MULTI_SZ:
+            data = f"First {index}\0Second {version}\0\0".encode("utf-16-le")
+        elif value_type == REG_DWORD:
+            data = _UINT32.pack((index * 31 + value_index + version) & 0xFFFFFFFF)
+        elif value_type == REG_QWORD:
+            data = _UINT64.pack(index * 2**32 + value_index + version)
+        else:
+            data = hashlib.blake2b(f"{index}:{value_index}:{version}".encode(), digest_size=16).digest()
+        return value_type, data
+
+    def _write_value(self, name: str, value_type: int, data: bytes) -> int:
+        if len(data) <= 4:
+            # Small data is stored in the data offset field of the value key
+            data_size = len(data) | 0x80000000
+            data_offset = int.from_bytes(data.ljust(4, b"\x00"), "little")
+        elif len(data) > BIG_DATA_SEGMENT_SIZE:
+            data_size = len(data)
+            segment_offsets = [
+                self.writer.allocate(data[i : i + BIG_DATA_SEGMENT_SIZE]) for i in range(0, len(data), BIG_DATA_SEGMENT_SIZE)
+            ]
+            segments_list_offset = self.writer.allocate(b"".join(_UINT32.pack(x) for x in segment_offsets))
+            data_offset = self.writer.allocate(_BIG_DATA_BLOCK.pack(b"db", len(segment_offsets), segments_list_offset))
+        else:
+            data_size = len(data)
+            data_offset = self.writer.allocate(data)
+
+        encoded_name = name.encode("ascii")
+        self.values_count += 1
+        return self.writer.allocate(
+            _VALUE_KEY.pack(b"vk", len(encoded_name), data_size, data_offset, value_type, VALUE_COMP_NAME) + encoded_name
+        )
+
+    def _write_values(self, index: int, changed: bool) -> list[int]:
+        value_offsets = []
+        for value_index in range(self.values_per_key):
+            value_type, data = self._get_value_data(index, value_index, changed)
+            value_offsets.append(self._write_value(f"Value{value_index}", value_type, data))
+        if changed:
+            value_offsets.append(self._write_value(CHANGED_NAME, REG_SZ, f"{self.seed}\0".encode("utf-16-le")))
+        if index == 0 and self.big_data:
+            data = hashlib.shake_128(b"big data").digest(BIG_DATA_VALUE_SIZE)
+            value_offsets.append(self._write_value("BigData", REG_BINARY, data))
+        return value_offsets
+
+    def _write_key_node(self, name: str, timestamp: int, parent_offset: int, subkey_count: int, flags=KEY_COMP_NAME) -> int:
+        encoded_name = name.encode("ascii")
+        key_node = _KEY_NODE.pack(
+            b"nk",
+            flags,
+            timestamp,
+            b"\x00" * 4,
+            parent_offset,
+            subkey_count,
+            0,
+            NO_OFFSET,
+            NO_OFFSET,
+            0,
+            NO_OFFSET,
+            self.security_key_offset,
+            NO_OFFSET,
+            2 * len(get_key_name(0)) if subkey_count else 0,
+            0,
+            2 * len(CHANGED_NAME),
+            BIG_DATA_VALUE_SIZE if self.big_data else 16,
+            len(encoded_name),
+            0,
+        )
+        return self.writer.allocate(key_node + encoded_name)
+
+    def _write_subkey_lists(self, subkeys: list[tuple[int, str]]) -> int:
+        lists = []
+        for i in range(0, len(subkeys), SUBKEY_LIST_MAX_ELEMENTS):
+            chunk = subkeys[i : i + SUBKEY_LIST_MAX_ELEMENTS]
+            elements = b"".join(struct.pack("<II", offset, calculate_key_name_hash(name)) for offset, name in chunk)
+            lists.append(self.writer.allocate(b"lh" + struct.pack("<H", len(chunk)) + elements))
+        if len(lists) == 1:
+            return lists[0]
+        return self.writer.allocate(b"ri" + struct.pack("<H", len(lists)) + b"".join(_UINT32.pack(x) for x in lists))
+
+    def _get_subkey_indexes(self, index: int) -> range:
+        first_subkey = self.fanout * index + 1
+        return range(min(first_subkey, self.keys_count), min(first_subkey + self.fanout, self.keys_count))
+
+    def _write_key(self, index: int, parent_offset: int) -> int:
+        subkey_indexes = self._get_subkey_indexes(index)
+        changed = is_changed(index, self.seed, self.changes)
+        timestamp = BASE_TIMESTAMP + index * TIMESTAMP_INTERVAL + (TIMESTAMP_INTERVAL // 2 if changed else 0)
+        if index == 0:
+            key_offset = self._write_key_node("ROOT", timestamp, 0, len(subkey_indexes), flags=ROOT_KEY_FLAGS)
+        else:
+            key_offset = self._write_key_node(get_key_name(index), timestamp, parent_offset, len(subkey_indexes) + changed)
+
+        if index == 0:
+            # The root key node is the first cell, so the security key is written right after it
+            security_descriptor = _build_security_descriptor()
+            self.security_key_offset = self.writer.allocate(
+                _SECURITY_KEY.pack(b"sk", 0, 0, self.keys_count, len(security_descriptor)) + security_descriptor
+            )
+            for field_offset in (8, 12):
+                self.writer.patch_uint32(self.security_key_offset + field_offset, self.security_key_offset)
+            self.writer.patch_uint32(key_offset + _SECURITY_KEY_OFFSET_FIELD, self.security_key_offset)
+
+        value_offsets = self._write_values(index, changed)
+        if value_offsets:
+            values_list_offset = self.writer.allocate(b"".join(_UINT32.pack(x) for x in value_offsets))
+            self.writer.patch_uint32(key_offset + _VALUES_LIST_OFFSET_FIELD - 4, len(value_offsets))
+            self.writer.patch_uint32(key_offset + _VALUES_LIST_OFFSET_FIELD, values_list_offset)
+
+        subkeys = []
+        if changed and index:
+            subkeys.append((self._write_key_node(CHANGED_NAME, timestamp, key_offset, 0), CHANGED_NAME))
+        subkeys.extend(
+            (self._write_key(subkey_index, key_offset), get_key_name(subkey_index)) for subkey_index in subkey_indexes
+        )
+        if subkeys:
+            self.writer.patch_uint32(key_offset + _SUBKEYS_LIST_OFFSET_FIELD, self._write_subkey_lists(subkeys))
+        return key_offset
+
+
+def generate_hive(
+    path,
+    keys_count: int = 1000,
+    fanout: int = 100,
+    values_per_key: int = 3,
+    seed: int = 0,
+    changes: float = 0.0,
+    big_data: bool = True,
+    file_name: str = "SYNTHETIC",
+) -> int:
+    """
+    Write a synthetic hive
+    :param path: The path of the hive file
+    :param keys_count: The number of keys, including the root key
+    :param fanout: The number of subkeys of every key that has subkeys
+    :param values_per_key: The number of values of every key
+    :param seed: With changes, the seed of the keys that differ from the hive generated with seed 0
+    :param changes: The fraction of the keys that differ from the hive generated with seed 0
+    :param big_data: Whether to add a big data value to the root key
+    :param file_name: The file name in the header of the hive, which is used to identify the hive type
+    :return: The number of values that were written
+    """
+    if keys_count < 1 or fanout < 2:
+        raise ValueError("A hive needs at least one key, and a fanout of at least 2")
+
+    with open(path, "w+b", buffering=1024**2) as f:
+        f.write(bytes(REGF_HEADER_SIZE))
+        generator = _HiveGenerator(f, keys_count, fanout, values_per_key, seed, changes, big_data)
+        generator._write_key(0, 0)
+        generator.writer.close()
+
+        header = _REGF_HEADER.pack(
+            b"regf",
+            1,
+            1,
+            BASE_TIMESTAMP,
+            1,
+            5,
+            0,
+            1,
+            HBIN_HEADER_SIZE,
+            generator.writer.hbins_size,
+            1,
+            file_name.encode("utf-16-le")[:64].ljust(64, b"\x00"),
+            bytes(396),
+        )
+        f.seek(0)
+        f.write(header + _UINT32.pack(calculate_xor32_checksum(header)))
+    return generator.values_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="The path of the hive to write")
+    parser.add_argument("-k", "--keys", type=int, default=1000000, help="The number of keys")
+    parser.add_argument("-f", "--fanout", type=int, default=100, help="The number of subkeys of every key")
+    parser.add_argument("-n", "--values", type=int, default=3, help="The number of values of every key")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="The seed of the changed keys")
+    parser.add_argument("-c", "--changes", type=float, default=0.0, help="The fraction of changed keys")
+    args = parser.parse_args()
+
+    values_count = generate_hive(args.path, args.keys, args.fanout, args.values, args.seed, args.changes)
+    print(f"Wrote {args.keys} keys and {values_count} values to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,100 @@
+import datetime as dt
+import hashlib
 import json
 import os
+import shutil
+import struct
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from io import BytesIO
+from pathlib import Path
 from tempfile import mkdtemp
 
-from regipy import NoRegistrySubkeysException
+import pytest
+from construct import ConstError, Container, Int32ul, StreamError
+
+import regipy
+from regipy import NoRegistrySubkeysException, RegistryKeyNotFoundException
+from regipy.batch import DONE, MANIFEST_FILE_NAME, TIMEOUT, UNIDENTIFIED, load_manifest, run_plugins_on_directory
+from regipy.carving import (
+    UNALLOCATED,
+    RecoveredValue,
+    carve_hive,
+    iter_carved_cells,
+    iter_recovered_keys,
+    validate_key_node,
+)
 from regipy.cli_utils import get_filtered_subkeys
+from regipy.columnar import ARROW_FORMAT, KeyValueRow, dump_hive_to_arrow, iter_key_value_rows
+from regipy.digests import DIGEST_SIZE, iter_subtree_digests
+from regipy.exceptions import RegipyGeneralException
+from regipy.fast_parsers import (
+    parse_cm_key_node,
+    parse_index_leaf,
+    parse_index_root,
+    parse_lf_lh_sk_element,
+    parse_value_key,
+)
 from regipy.hive_types import NTUSER_HIVE_TYPE
-from regipy.plugins.utils import dump_hive_to_json
-from regipy.recovery import apply_transaction_logs
-from regipy.regdiff import compare_hives
-from regipy.registry import NKRecord, RegistryHive
+from regipy.index import INDEX_FILE_EXTENSION, IndexedKey, get_lookup_path
+from regipy.parallel import parallel_dump_hive_to_json
+from regipy.plugins.planner import SharedKeysHive, plan_key_paths
+from regipy.plugins.plugin import PLUGINS
+from regipy.plugins.utils import dump_hive_to_json, run_relevant_plugins
+from regipy.recovery import HVLE_HASH_SEED, LOG_SECTOR_SIZE, DirtyPageMap, apply_transaction_logs
+from regipy.regdiff import (
+    KEY_ADDED,
+    KEY_MODIFIED,
+    KEY_REMOVED,
+    KeyChange,
+    KeyHistory,
+    compare_hives,
+    compare_snapshots,
+    iter_hive_differences,
+    iter_registry_hive_differences,
+    iter_snapshot_changes,
+)
+from regipy.registry import NKRecord, RegistryHive, Value
+from regipy.scanner import iter_allocated_cells, iter_hbin_cells, iter_hbins, iter_subkeys_linear
+from regipy.serialization import get_serializer, subkey_to_dict
+from regipy.structs import (
+    CM_KEY_NODE,
+    CM_KEY_NODE_SIZE,
+    FAST_LEAF_SIGNATURE,
+    HASH_LEAF_SIGNATURE,
+    INDEX_LEAF,
+    INDEX_ROOT,
+    INDEX_ROOT_SIGNATURE,
+    LEAF_INDEX_SIGNATURE,
+    LF_LH_SK_ELEMENT,
+    REGF_HEADER,
+    REGF_HEADER_SIZE,
+    TRANSACTION_LOG,
+    VALUE_KEY,
+)
+from regipy.utils import (
+    MAX_LEN,
+    TIMESTAMP_BATCH_SIZE,
+    calculate_key_name_hash,
+    calculate_marvin32,
+    calculate_sha1,
+    calculate_xor32_checksum,
+    convert_datetime_to_filetime,
+    convert_wintime,
+    convert_wintimes,
+)
+from regipy_tests.benchmarks import compare_results, run_benchmarks
+from regipy_tests.conftest import extract_lzma
+from regipy_tests.synthetic_hive import (
+    BASE_TIMESTAMP,
+    BIG_DATA_VALUE_SIZE,
+    SUBKEY_LIST_MAX_ELEMENTS,
+    TIMESTAMP_INTERVAL,
+    generate_hive,
+    get_key_name,
+    is_changed,
+)
 
 
 def test_parse_header(ntuser_hive):
@@ -100,6 +186,116 @@ def test_regdiff(ntuser_hive, second_hive_path):
     assert len([x for x in found_differences if x[0] == "new_value"]) == 1
 
 
+def test_regdiff_detailed(ntuser_hive, second_hive_path):
+    # Subkeys are compared in order, and every subkey comes after its parent key
+    found_differences = list(iter_hive_differences(ntuser_hive, second_hive_path, detailed=True))
+    assert found_differences == [
+        ("deleted_subkey", "2021-11-18T13:57:11.845506+00:00", None, "\\Software\\WinRAR"),
+        ("deleted_subkey", "2021-11-18T13:59:04.888952+00:00", None, "\\Software\\WinRAR\\ArcHistory"),
+        ("deleted_subkey", "2021-11-18T13:57:37.290118+00:00", None, "\\Software\\WinRAR\\DialogEditHistory"),
+        ("deleted_subkey", "2021-11-18T13:59:50.023788+00:00", None, "\\Software\\WinRAR\\DialogEditHistory\\ArcName"),
+        ("deleted_subkey", "2021-11-18T14:00:44.180468+00:00", None, "\\Software\\WinRAR\\DialogEditHistory\\ExtrPath"),
+        ("new_subkey", None, "2019-02-11T19:46:31.832134+00:00", "\\Software\\Microsoft\\legitimate_subkey"),
+        (
+            "new_value",
+            None,
+            "not_a_malware: c:\\temp\\legitimate_binary.exe @ 2019-02-11 19:45:25.516346+00:00",
+            "\\Software\\Microsoft\\Windows\\CurrentVersion\\Run",
+        ),
+    ]
+    assert list(iter_hive_differences(ntuser_hive, ntuser_hive, detailed=True)) == []
+
+
+def test_compare_snapshots(ntuser_hive, second_hive_path, tmp_path):
+    # The original hive, the modified hive and the original hive again
+    key_histories = list(compare_snapshots([ntuser_hive, second_hive_path, ntuser_hive]))
+    assert [key_history.path for key_history in key_histories] == [
+        "\\Software",
+        "\\Software\\Microsoft",
+        "\\Software\\Microsoft\\legitimate_subkey",
+        "\\Software\\Microsoft\\Windows\\CurrentVersion\\Run",
+        "\\Software\\WinRAR",
+        "\\Software\\WinRAR\\ArcHistory",
+        "\\Software\\WinRAR\\DialogEditHistory",
+        "\\Software\\WinRAR\\DialogEditHistory\\ArcName",
+        "\\Software\\WinRAR\\DialogEditHistory\\ExtrPath",
+    ]
+    assert key_histories[2] == KeyHistory(
+        path="\\Software\\Microsoft\\legitimate_subkey",
+        changes=[
+            KeyChange(snapshot_index=1, change=KEY_ADDED, timestamp="2019-02-11T19:46:31.832134+00:00"),
+            KeyChange(snapshot_index=2, change=KEY_REMOVED),
+        ],
+    )
+    assert key_histories[3] == KeyHistory(
+        path="\\Software\\Microsoft\\Windows\\CurrentVersion\\Run",
+        changes=[
+            KeyChange(
+                snapshot_index=1,
+                change=KEY_MODIFIED,
+                timestamp="2019-02-11T19:45:25.516346+00:00",
+                new_values=["not_a_malware"],
+            ),
+            KeyChange(
+                snapshot_index=2,
+                change=KEY_MODIFIED,
+                timestamp="2012-04-03T21:19:54.837716+00:00",
+                deleted_values=["not_a_malware"],
+            ),
+        ],
+    )
+    assert [(key_change.snapshot_index, key_change.change) for key_change in key_histories[4].changes] == [
+        (1, KEY_REMOVED),
+        (2, KEY_ADDED),
+    ]
+
+    # The same history with indexes, and with every key compared
+    assert list(compare_snapshots([ntuser_hive, second_hive_path, ntuser_hive], index_path=str(tmp_path))) == (key_histories)
+    assert len(list(tmp_path.glob(f"*{INDEX_FILE_EXTENSION}"))) == 2
+    assert list(compare_snapshots([ntuser_hive, second_hive_path, ntuser_hive], detailed=True)) == key_histories
+
+    # Identical snapshots have no history
+    assert list(compare_snapshots([ntuser_hive, ntuser_hive, ntuser_hive])) == []
+    with pytest.raises(RegipyGeneralException):
+        list(iter_snapshot_changes([RegistryHive(ntuser_hive)]))
+
+
+def test_subtree_digests(ntuser_hive, second_hive_path, tmp_path):
+    registry_hive = RegistryHive(ntuser_hive)
+    modified_hive = RegistryHive(second_hive_path)
+    assert not registry_hive.has_digests
+    digests = registry_hive.get_digests()
+    assert registry_hive.has_digests
+    assert len(digests.subtree_digest) == DIGEST_SIZE
+
+    # Only the subtrees with changes have different digests
+    assert digests.key_digest == modified_hive.get_digests().key_digest
+    assert digests.subtree_digest != modified_hive.get_digests().subtree_digest
+    for key_path, is_identical in [
+        (r"\AppEvents", True),
+        (r"\Control Panel", True),
+        (r"\Software", False),
+        (r"\Software\Microsoft\Windows\CurrentVersion\Run", False),
+    ]:
+        first_digests = registry_hive.get_digests(registry_hive.get_key(key_path))
+        second_digests = modified_hive.get_digests(modified_hive.get_key(key_path))
+        assert (first_digests == second_digests) is is_identical
+
+    # The index keeps the same digests
+    indexed_hive = RegistryHive(ntuser_hive)
+    indexed_hive.build_index(str(tmp_path))
+    for offset, key_digests in iter_subtree_digests(registry_hive.root):
+        assert indexed_hive.index.get_digests(offset) == key_digests
+
+    # Identical subtrees are skipped, and the differences are the same
+    for detailed in (False, True):
+        found_differences = list(iter_registry_hive_differences(registry_hive, modified_hive, detailed=detailed))
+        assert found_differences == list(
+            iter_registry_hive_differences(registry_hive, modified_hive, detailed=detailed, use_digests=False)
+        )
+        assert found_differences == compare_hives(ntuser_hive, second_hive_path, detailed=detailed, index_path=str(tmp_path))
+
+
 def test_ntuser_emojis(transaction_ntuser):
     # There are some cases where the Registry stores utf-16 emojis as subkey names :)
     registry_hive = RegistryHive(transaction_ntuser)
@@ -163,6 +359,25 @@ def test_recurse_ntuser_without_fetching_values(ntuser_hive):
     assert subkey_count == 1811
 
 
+def test_recurse_ntuser_depth_and_order(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    paths = [x.path for x in registry_hive.recurse_subkeys(fetch_values=False)]
+    assert paths[-1] == "\\"
+    assert paths.index(r"\Software\Microsoft") < paths.index(r"\Software")
+
+    assert [x.path for x in registry_hive.recurse_subkeys(fetch_values=False, max_depth=100)] == paths
+    assert [x.path for x in registry_hive.recurse_subkeys(fetch_values=False, max_depth=0)] == ["\\"]
+
+    top_level = [x.path for x in registry_hive.recurse_subkeys(fetch_values=False, max_depth=2)]
+    assert top_level == [x for x in paths if x.count("\\") <= 2]
+
+    breadth_first = [x.path for x in registry_hive.recurse_subkeys(fetch_values=False, breadth_first=True)]
+    assert breadth_first[0] == "\\"
+    assert sorted(breadth_first) == sorted(paths)
+    depths = [x.count("\\") for x in breadth_first[1:]]
+    assert depths == sorted(depths)
+
+
 def test_recurse_amcache(amcache_hive):
     registry_hive = RegistryHive(amcache_hive)
 
@@ -209,6 +424,114 @@ def test_ntuser_apply_transaction_logs(transaction_ntuser, transaction_log):
     assert len([x for x in found_differences if x[0] == "new_subkey"]) == 527
     assert len([x for x in found_differences if x[0] == "new_value"]) == 60
 
+    found_differences = compare_hives(transaction_ntuser, restored_hive_path, detailed=True)
+    assert Counter(x[0] for x in found_differences) == {
+        "different_hive_bin_data_size": 1,
+        "new_subkey": 521,
+        "deleted_subkey": 6,
+        "new_value": 57,
+        "deleted_value": 2,
+        "modified_value": 128,
+    }
+    assert (
+        "modified_value",
+        "MaxVirtualDesktopDimension: 2048 @ 2017-07-12 17:19:52.971378+00:00",
+        "MaxVirtualDesktopDimension: 2880 @ 2019-02-13 21:00:41.471586+00:00",
+        "\\Control Panel\\Desktop",
+    ) in found_differences
+
+
+def test_open_hive_with_transaction_logs(transaction_ntuser, transaction_log, tmp_path):
+    restored_hive_path, _ = apply_transaction_logs(
+        transaction_ntuser, transaction_log, restored_hive_path=str(tmp_path / "restored_hive.dat")
+    )
+    with open(transaction_ntuser, "rb") as f:
+        original_data = f.read()
+
+    # The logs are replayed in memory, and the hive file is not changed
+    with RegistryHive(transaction_ntuser, primary_log_path=transaction_log) as registry_hive:
+        assert registry_hive.recovered_dirty_pages_count == 132
+        assert registry_hive.is_mmap
+        with RegistryHive(restored_hive_path) as restored_hive:
+            assert registry_hive.sha1 == restored_hive.sha1
+            assert registry_hive.header.primary_sequence_num == restored_hive.header.primary_sequence_num
+        assert registry_hive.get_key(r"\Control Panel\Desktop").get_value("MaxVirtualDesktopDimension") == 2880
+
+        registry_hive.save(str(tmp_path / "saved_hive.dat"))
+    assert (tmp_path / "saved_hive.dat").read_bytes() == Path(restored_hive_path).read_bytes()
+    with open(transaction_ntuser, "rb") as f:
+        assert f.read() == original_data
+
+
+def test_hvle_log_entry_hashes(transaction_ntuser, transaction_log, tmp_path):
+    with open(transaction_log, "rb") as f:
+        log_data = bytearray(f.read())
+
+    # The first log entry starts after the REGF header of the log
+    first_log_entry = TRANSACTION_LOG.parse(log_data[512:])
+    assert calculate_marvin32(log_data[512:544], HVLE_HASH_SEED) == first_log_entry.hash_2
+    assert calculate_marvin32(log_data[552 : 512 + first_log_entry.log_size], HVLE_HASH_SEED) == first_log_entry.hash_1
+
+    # A log entry whose data does not match its hashes is not replayed, and neither are the entries after it
+    second_log_entry_offset = 512 + first_log_entry.log_size
+    log_data[second_log_entry_offset + 0x1000] ^= 0xFF
+    corrupted_log_path = tmp_path / "corrupted.log1"
+    corrupted_log_path.write_bytes(log_data)
+    _, recovered_dirty_pages_count = apply_transaction_logs(
+        transaction_ntuser, str(corrupted_log_path), restored_hive_path=str(tmp_path / "restored_hive.dat")
+    )
+    assert recovered_dirty_pages_count == first_log_entry.dirty_pages_count == 24
+
+
+def test_dirt_transaction_log(ntuser_hive, tmp_path):
+    with open(ntuser_hive, "rb") as f:
+        hive_data = f.read()
+    hive_bins_data_size = Int32ul.parse(hive_data[40:44])
+
+    # The sectors marked in the bitmap follow each other in the log, from offset 1024
+    dirty_sectors = {1: b"\x01" * LOG_SECTOR_SIZE, 2: b"\x02" * LOG_SECTOR_SIZE, 17: b"\x03" * LOG_SECTOR_SIZE}
+    bitmap = bytearray(hive_bins_data_size // 4096)
+    for sector in dirty_sectors:
+        bitmap[sector // 8] |= 1 << (sector % 8)
+    transaction_log_path = tmp_path / "NTUSER.DAT.LOG"
+    transaction_log_path.write_bytes(
+        (hive_data[:512] + b"DIRT" + bytes(bitmap)).ljust(1024, b"\x00") + b"".join(dirty_sectors.values())
+    )
+
+    restored_hive_path, recovered_dirty_pages_count = apply_transaction_logs(
+        ntuser_hive, str(transaction_log_path), restored_hive_path=str(tmp_path / "restored_hive.dat")
+    )
+    assert recovered_dirty_pages_count == 3
+    expected_data = bytearray(hive_data)
+    for sector, sector_data in dirty_sectors.items():
+        expected_data[4096 + sector * 512 : 4096 + (sector + 1) * 512] = sector_data
+    assert Path(restored_hive_path).read_bytes() == expected_data
+
+    with RegistryHive(ntuser_hive, primary_log_path=str(transaction_log_path)) as registry_hive:
+        assert bytes(registry_hive._buffer) == expected_data
+
+
+def test_dirty_page_map():
+    hive_data = bytes(range(256)) * 32
+    dirty_page_map = DirtyPageMap(memoryview(hive_data), page_size=4096)
+    dirty_page_map.write(4096, b"\xaa" * 4096)
+    dirty_page_map.write(10, b"\xbb" * 4)
+    # Logs may grow the hive, the gap before the new pages is zeros
+    dirty_page_map.write(4 * 4096, b"\xcc" * 4096)
+
+    expected_data = bytearray(hive_data) + bytes(3 * 4096)
+    expected_data[4096:8192] = b"\xaa" * 4096
+    expected_data[10:14] = b"\xbb" * 4
+    expected_data[4 * 4096 :] = b"\xcc" * 4096
+    assert len(dirty_page_map) == len(expected_data)
+    assert sorted(dirty_page_map.pages) == [0, 4096, 4 * 4096]
+    assert dirty_page_map.read(0, len(expected_data) + 100) == expected_data
+    assert dirty_page_map.read(4090, 12) == expected_data[4090:4102]
+
+    restored_data = bytearray(hive_data) + bytes(len(dirty_page_map) - len(hive_data))
+    dirty_page_map.apply(restored_data)
+    assert restored_data == expected_data
+
 
 def test_system_apply_transaction_logs(transaction_system, system_tr_log_1, system_tr_log_2):
     output_path = os.path.join(mkdtemp(), "recovered_hive.dat")
@@ -221,9 +544,18 @@ def test_system_apply_transaction_logs(transaction_system, system_tr_log_1, syst
     assert recovered_dirty_pages_count == 315
 
     found_differences = compare_hives(transaction_system, restored_hive_path)
-    assert len(found_differences) == 2511
+    assert len(found_differences) == 2508
     assert len([x for x in found_differences if x[0] == "new_subkey"]) == 2458
-    assert len([x for x in found_differences if x[0] == "new_value"]) == 53
+    assert len([x for x in found_differences if x[0] == "new_value"]) == 50
+
+    # An inline REG_MULTI_SZ value is one difference, with the string stored in the VK record
+    assert (
+        "new_value",
+        None,
+        "(default): \x03 @ 2018-04-06 12:26:15.539714+00:00",
+        "\\ControlSet001\\Enum\\HDAUDIO\\FUNC_01&VEN_10DE&DEV_0014&SUBSYS_10DE0101&REV_1001\\5&e992c3d&0&0101"
+        "\\Properties\\{83da6326-97a6-4088-9453-a1923f573b29}\\0067",
+    ) in found_differences
 
 
 def test_system_hive_devprop_structure(system_devprop):
@@ -265,6 +597,146 @@ def test_hive_serialization(ntuser_hive, temp_output_file):
     assert counter == 1812
 
 
+def test_parallel_hive_serialization(ntuser_hive, temp_output_file):
+    registry_hive = RegistryHive(ntuser_hive)
+    dump_hive_to_json(registry_hive, temp_output_file, registry_hive.root)
+    with open(temp_output_file) as f:
+        expected = f.read()
+
+    for split_depth in (1, 2):
+        parallel_output_file = f"{temp_output_file}.{split_depth}"
+        assert parallel_dump_hive_to_json(
+            registry_hive, parallel_output_file, registry_hive.root, workers=2, split_depth=split_depth
+        ) == len(expected.splitlines())
+        with open(parallel_output_file) as f:
+            assert f.read() == expected
+        os.remove(parallel_output_file)
+
+    software_key = registry_hive.get_key(r"\Software")
+    dump_hive_to_json(registry_hive, temp_output_file, software_key)
+    parallel_output_file = f"{temp_output_file}.software"
+    dump_hive_to_json(registry_hive, parallel_output_file, software_key, workers=2)
+    with open(temp_output_file) as expected_file, open(parallel_output_file) as f:
+        assert f.read() == expected_file.read()
+    os.remove(parallel_output_file)
+
+
+def test_serializers(ntuser_hive, temp_output_file):
+    registry_hive = RegistryHive(ntuser_hive)
+    for as_json in (False, True):
+        for entry in registry_hive.recurse_subkeys(as_json=as_json):
+            assert subkey_to_dict(entry) == asdict(entry)
+
+    # The json module writes the same lines the CLI always did
+    dump_hive_to_json(registry_hive, temp_output_file, registry_hive.root, serializer=get_serializer("json"))
+    with open(temp_output_file) as f:
+        output = f.read().splitlines()
+    assert output == [json.dumps(asdict(entry), separators=(",", ":")) for entry in registry_hive.recurse_subkeys(as_json=True)]
+
+    # Binary data and datetimes of entries not created with as_json are written as hex and in isoformat
+    raw_entry = next(registry_hive.recurse_subkeys(max_depth=0))
+    raw_entry.values = [Value(name="Data", value=b"\x00\xff", value_type="REG_BINARY")]
+    assert json.loads(get_serializer("json").dumps(subkey_to_dict(raw_entry))) == {
+        **asdict(raw_entry),
+        "timestamp": raw_entry.timestamp.isoformat(),
+        "values": [{"name": "Data", "value": "00ff", "value_type": "REG_BINARY", "is_corrupted": False}],
+    }
+
+    with pytest.raises(RegipyGeneralException):
+        get_serializer("yaml")
+
+
+def test_key_value_rows(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    rows = list(iter_key_value_rows(registry_hive))
+    assert len(rows) == 4700
+
+    # Every key is in the table, in the order of recurse_subkeys(), with one row per value
+    entries = list(registry_hive.recurse_subkeys(as_json=True))
+    assert list(dict.fromkeys(row.path for row in rows)) == [entry.path for entry in entries]
+    assert rows[-1] == KeyValueRow(path="\\", timestamp=129780243434537497)
+
+    big_data_row = next(row for row in rows if row.raw_data and len(row.raw_data) > 16344)
+    assert big_data_row.path == r"\Software\Microsoft\Windows\CurrentVersion\Explorer\StartPage2"
+    assert len(big_data_row.raw_data) == 73315
+    assert big_data_row.value == big_data_row.raw_data.hex()
+
+
+def test_dump_hive_to_arrow(ntuser_hive, tmp_path):
+    pyarrow_ipc = pytest.importorskip("pyarrow.ipc")
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+
+    registry_hive = RegistryHive(ntuser_hive)
+    parquet_path = str(tmp_path / "ntuser.parquet")
+    assert dump_hive_to_arrow(registry_hive, parquet_path, batch_size=1000) == 4700
+    table = pyarrow_parquet.read_table(parquet_path)
+    assert table.column_names == ["path", "timestamp", "value_name", "value_type", "value", "raw_data"]
+    assert table.num_rows == 4700
+    assert table.column("timestamp")[-1].as_py() == convert_wintime(129780243434537497)
+
+    arrow_path = str(tmp_path / "ntuser.arrow")
+    assert dump_hive_to_arrow(registry_hive, arrow_path, output_format=ARROW_FORMAT, fetch_raw_data=False) == 4700
+    with pyarrow_ipc.open_file(arrow_path) as reader:
+        arrow_table = reader.read_all()
+    assert arrow_table.column("raw_data").null_count == 4700
+    columns = ["path", "timestamp", "value_name", "value_type", "value"]
+    assert arrow_table.select(columns).equals(table.select(columns))
+
+
+def test_run_plugins_on_directory(ntuser_hive, sam_hive, system_hive, tmp_path):
+    hives_directory = tmp_path / "hives"
+    (hives_directory / "host1").mkdir(parents=True)
+    (hives_directory / "host2").mkdir()
+    shutil.copy(ntuser_hive, hives_directory / "host1" / "NTUSER.DAT")
+    shutil.copy(sam_hive, hives_directory / "host1" / "SAM")
+    shutil.copy(system_hive, hives_directory / "host2" / "SYSTEM")
+    (hives_directory / "host1" / "NTUSER.DAT.LOG1").write_bytes(b"")
+    (hives_directory / "host2" / "notes.txt").write_text("Not a hive")
+    output_directory = tmp_path / "output"
+
+    results = run_plugins_on_directory(hives_directory, output_directory, workers=2)
+    statuses = {Path(result.hive_path).relative_to(hives_directory).as_posix(): result.status for result in results}
+    assert statuses == {"host1/NTUSER.DAT": DONE, "host1/SAM": DONE, "host2/SYSTEM": DONE, "host2/notes.txt": UNIDENTIFIED}
+
+    ntuser_result = next(result for result in results if result.hive_type == NTUSER_HIVE_TYPE)
+    assert ntuser_result.output_path == str(output_directory / "host1" / "NTUSER.DAT.json")
+    with open(ntuser_result.output_path) as f:
+        assert len(json.load(f)) == ntuser_result.plugins_count
+
+    # Resuming processes nothing again
+    assert run_plugins_on_directory(hives_directory, output_directory, workers=2) == []
+    assert len(load_manifest(output_directory / MANIFEST_FILE_NAME)) == 4
+
+
+def test_run_plugins_on_directory_timeout(system_hive, tmp_path):
+    hives_directory = tmp_path / "hives"
+    hives_directory.mkdir()
+    shutil.copy(system_hive, hives_directory / "SYSTEM")
+    output_directory = tmp_path / "output"
+
+    # The worker is killed, and a new one is started for the next hives
+    results = run_plugins_on_directory(hives_directory, output_directory, workers=1, timeout=0.01)
+    assert [result.status for result in results] == [TIMEOUT]
+    assert not os.path.exists(output_directory / "SYSTEM.json")
+
+    assert run_plugins_on_directory(hives_directory, output_directory) == []
+    results = run_plugins_on_directory(hives_directory, output_directory, retry_failed=True)
+    assert [(result.hive_type, result.status) for result in results] == [("system", DONE)]
+    assert load_manifest(output_directory / MANIFEST_FILE_NAME)[str(hives_directory / "SYSTEM")].status == DONE
+
+
+def test_orjson_serializer(ntuser_hive, temp_output_file):
+    pytest.importorskip("orjson")
+    registry_hive = RegistryHive(ntuser_hive)
+    dump_hive_to_json(registry_hive, temp_output_file, registry_hive.root, serializer=get_serializer("orjson"))
+    with open(temp_output_file) as f:
+        output = [json.loads(x) for x in f]
+    assert output == [asdict(entry) for entry in registry_hive.recurse_subkeys(as_json=True)]
+
+    # Integers orjson does not support are serialized by the json module
+    assert get_serializer("orjson").dumps({"value": 2**70}) == b'{"value":1180591620717411303424}'
+
+
 def test_get_key(software_hive):
     """
     # Refers to https://github.com/mkorman90/regipy/issues/144
@@ -339,6 +811,27 @@ def test_parse_filetime_value(system_hive_with_filetime):
     assert val == "2020-03-17T14:02:38.955490+00:00"
 
 
+def test_inline_values(sam_hive, system_hive, system_hive_with_filetime):
+    # The data of these values is stored in the data offset field of their VK records, and is at most 4 bytes
+    sam_key = RegistryHive(sam_hive).get_key(r"\SAM\Domains\Account\Users\Names\Administrator")
+    assert sam_key.get_values(as_json=True)[0].value == ""
+
+    system_key = RegistryHive(system_hive).get_key(r"\ControlSet001\Control\Class\{36FC9E60-C465-11CF-8056-444553540000}")
+    assert system_key.get_value("UpperFilters") == []
+
+    devprop_key = RegistryHive(system_hive_with_filetime).get_key(
+        r"\ControlSet001\Control\Class\{05f5cfe2-4733-4950-a6bb-07aad01a3a84}\Properties"
+        r"\{6a3433f4-5626-40e8-a9b9-dbd9ecd2884b}\0006"
+    )
+    assert devprop_key.get_value("(default)", as_json=True) == "ff"
+
+    # A FILETIME does not fit in the VK record
+    vk = Container(data_type=16, data_size=0x80000004, data_offset=0x12345678)
+    assert devprop_key._decode_value(vk, "REG_FILETIME", 0, True, MAX_LEN, True) == (None, True)
+    vk = Container(data_type=16, data_size=4, data_offset=0)
+    assert devprop_key._decode_value(vk, "REG_FILETIME", 0, True, MAX_LEN, True) == (None, True)
+
+
 def test_ntuser_filtered_timestamps_do_not_fetch_values(ntuser_hive):
     registry_hive = RegistryHive(ntuser_hive)
     for subkey_count, entry in enumerate(
@@ -376,3 +869,592 @@ def test_ntuser_filtered_timestamps_no_filter(ntuser_hive):
     for subkey_count, entry in enumerate(get_filtered_subkeys(registry_hive, registry_hive.root, fetch_values=False)):
         assert entry.values == []
     assert subkey_count == 1811
+
+
+def test_mmap_hive(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    assert not registry_hive.is_mmap
+
+    with RegistryHive(ntuser_hive, use_mmap=True) as mmap_registry_hive:
+        assert mmap_registry_hive.is_mmap
+        assert mmap_registry_hive.header == registry_hive.header
+        assert list(mmap_registry_hive.recurse_subkeys(as_json=True)) == list(registry_hive.recurse_subkeys(as_json=True))
+
+        run_key = mmap_registry_hive.get_key(r"\Software\Microsoft\Windows\CurrentVersion\Run")
+        assert run_key.get_value("Sidebar") == "%ProgramFiles%\\Windows Sidebar\\Sidebar.exe /autoRun"
+
+
+def test_lazy_nk_record(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    with open(ntuser_hive, "rb") as f:
+        data = f.read()
+
+    for subkey in registry_hive.get_key(r"\Software\Microsoft").iter_subkeys():
+        # Nothing is decoded until a field is accessed
+        assert subkey._fields is None
+        assert subkey._name is None
+
+        stream = BytesIO(data)
+        stream.seek(subkey.offset)
+        expected = CM_KEY_NODE.parse_stream(stream)
+
+        assert subkey.last_modified == expected.last_modified
+        assert subkey.flags == expected.flags
+        assert subkey.security_key_offset == expected.security_key_offset
+        assert subkey.class_name_offset == expected.class_name_offset
+        assert subkey.subkey_count == expected.subkey_count
+        assert subkey.values_count == expected.values_count
+        assert subkey.name == expected.key_name_string.decode("ascii")
+        assert subkey.header == expected
+
+        with pytest.raises(AttributeError):
+            subkey.some_attribute = 1
+
+
+def test_lazy_values(ntuser_hive, monkeypatch):
+    registry_hive = RegistryHive(ntuser_hive)
+    key = registry_hive.get_key(r"\Software\Microsoft\Windows\CurrentVersion\Explorer\Advanced")
+    assert key.values_count == 17
+
+    values = key.get_values()
+    lazy_values = list(key.iter_lazy_values(trim_values=False))
+    assert [x.name for x in lazy_values] == [x.name for x in values]
+    assert [x.value_type for x in lazy_values] == [x.value_type for x in values]
+    assert [x.value for x in lazy_values] == [x.value for x in values]
+
+    decoded_values = []
+    decode_value = NKRecord._decode_value
+
+    def _decode_value(self, vk, *args):
+        decoded_values.append(vk.name)
+        return decode_value(self, vk, *args)
+
+    monkeypatch.setattr(NKRecord, "_decode_value", _decode_value)
+    assert key.get_value("Hidden") == 2
+    assert decoded_values == [b"Hidden"]
+
+    # The decoded data is cached
+    lazy_value = next(key.iter_lazy_values())
+    assert lazy_value.value == lazy_value.value
+    assert len(decoded_values) == 2
+
+
+def test_big_data_segments(system_hive_with_filetime):
+    registry_hive = RegistryHive(system_hive_with_filetime)
+    key = registry_hive.get_key(r"\ControlSet001\Control\Session Manager\AppCompatCache")
+    value = next(x for x in key.iter_lazy_values() if x.name == "AppCompatCache")
+    assert value.size == 269986
+
+    big_data_block = NKRecord.read_value(value._vk, registry_hive._stream).value
+    segments = list(key.iter_big_data_segments(big_data_block, value.size))
+    assert len(segments) == 17
+    assert all(isinstance(x, memoryview) for x in segments)
+    assert sum(len(x) for x in segments) == value.size
+
+    data = key.get_value("AppCompatCache")
+    assert data == b"".join(segments)
+    assert data == key.read_big_data(big_data_block, value.size)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_close_with_live_views(system_hive_with_filetime, use_mmap):
+    registry_hive = RegistryHive(system_hive_with_filetime, use_mmap=use_mmap)
+    key = registry_hive.get_key(r"\ControlSet001\Control\Session Manager\AppCompatCache")
+    value = next(x for x in key.iter_lazy_values() if x.name == "AppCompatCache")
+    big_data_block = NKRecord.read_value(value._vk, registry_hive._stream).value
+    segments = list(key.iter_big_data_segments(big_data_block, value.size))
+    data = b"".join(segments)
+    subkey = next(registry_hive.root.iter_subkeys())
+
+    # The segments keep the hive data alive, but not the records
+    registry_hive.close()
+    assert not registry_hive._stream.closed
+    assert b"".join(segments) == data
+    with pytest.raises(ValueError):
+        _ = subkey.name
+
+    del segments
+    registry_hive.close()
+    assert registry_hive._stream.closed
+
+
+@pytest.mark.parametrize("hive_fixture", ["ntuser_hive", "amcache_hive"])
+def test_get_subkey_by_hash(request, hive_fixture):
+    registry_hive = RegistryHive(request.getfixturevalue(hive_fixture))
+
+    keys = [registry_hive.root]
+    while keys:
+        key = keys.pop()
+        if not key.subkey_count:
+            continue
+
+        for subkey_list_offset in key._iter_subkey_lists():
+            signature, elements = key._parse_subkeys(subkey_list_offset)
+            if signature == HASH_LEAF_SIGNATURE:
+                for key_node_offset, hash_value in elements:
+                    assert calculate_key_name_hash(key._get_nk_record(key_node_offset).name) == hash_value
+
+        subkeys = list(key.iter_subkeys())
+        for subkey in subkeys:
+            for key_name in (subkey.name, subkey.name.lower(), subkey.name.upper()):
+                assert key.get_subkey(key_name).offset == subkey.offset
+            assert key.get_subkey(f"{subkey.name}_missing", raise_on_missing=False) is None
+        keys.extend(subkeys)
+
+
+def test_key_cache(system_hive):
+    registry_hive = RegistryHive(system_hive)
+    run_relevant_plugins(registry_hive, as_json=True)
+    assert registry_hive.key_cache.hits + registry_hive.key_cache.partial_hits > registry_hive.key_cache.misses
+
+    key = registry_hive.get_key(r"\ControlSet001\Services\Tcpip\Parameters")
+    cached_key = registry_hive.get_key(r"\controlset001\SERVICES\tcpip\parameters")
+    assert cached_key.offset == key.offset
+    assert cached_key.name == "Parameters"
+
+    with pytest.raises(RegistryKeyNotFoundException, match=r"Did not find Missing at ControlSet001\\services"):
+        registry_hive.get_key(r"\ControlSet001\Services\Tcpip\Missing")
+
+    registry_hive = RegistryHive(system_hive, key_cache_size=2)
+    registry_hive.get_key(r"\ControlSet001\Services\Tcpip\Parameters")
+    assert len(registry_hive.key_cache) == 2
+    assert registry_hive.key_cache.misses == 1
+
+    registry_hive = RegistryHive(system_hive, key_cache_size=0)
+    registry_hive.get_key(r"\ControlSet001\Services\Tcpip\Parameters")
+    registry_hive.get_key(r"\ControlSet001\Services\Tcpip\Parameters")
+    assert len(registry_hive.key_cache) == 0
+    assert registry_hive.key_cache.misses == 2
+
+
+def test_shared_plugin_key_lookups(system_hive, monkeypatch):
+    expected_results = run_relevant_plugins(RegistryHive(system_hive), as_json=True)
+
+    resolved_paths = Counter()
+    get_key = RegistryHive.get_key
+
+    def counting_get_key(self, key_path):
+        resolved_paths[get_lookup_path(key_path)] += 1
+        return get_key(self, key_path)
+
+    monkeypatch.setattr(RegistryHive, "get_key", counting_get_key)
+
+    # The lookups of the same plugins, without sharing
+    plain_hive = RegistryHive(system_hive)
+    for plugin_class in PLUGINS:
+        if plugin_class.NAME in expected_results:
+            plugin_class(plain_hive, as_json=True).run()
+    requested_paths = resolved_paths.copy()
+    resolved_paths.clear()
+
+    registry_hive = SharedKeysHive(RegistryHive(system_hive))
+    assert run_relevant_plugins(registry_hive, as_json=True) == expected_results
+
+    # Every key was looked up in the hive once, whichever plugins asked for it
+    assert max(resolved_paths.values()) == 1
+    lookup_stats = registry_hive.lookup_stats
+    assert lookup_stats.requested == sum(requested_paths.values())
+    assert lookup_stats.resolved == len(requested_paths)
+    assert lookup_stats.saved == lookup_stats.requested - lookup_stats.resolved > 0
+    assert lookup_stats.resolved + lookup_stats.unused == len(resolved_paths)
+
+    # Planning is not counted as plugin lookups
+    counted_lookups = asdict(lookup_stats)
+    key_paths = plan_key_paths(PLUGINS, registry_hive)
+    assert asdict(registry_hive.lookup_stats) == counted_lookups
+    assert r"\ControlSet001\Services" in key_paths
+    assert r"\ControlSet002\Services" in key_paths
+    assert key_paths == sorted(set(key_paths), key=get_lookup_path)
+    assert r"\Select" in key_paths
+
+
+def test_linear_scan(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+
+    cell_types = {}
+    for cell in iter_allocated_cells(registry_hive):
+        cell_types[cell.cell_type] = cell_types.get(cell.cell_type, 0) + 1
+    assert cell_types == {"nk": 1812, "vk": 4094, "lf": 514, "sk": 22}
+
+    # HBin.iter_cells walks a single hbin, the scanner walks all of them
+    hbin_offset, hbin_size = next(iter_hbins(registry_hive))
+    hbin = registry_hive.get_hbin_at_offset(hbin_offset - REGF_HEADER_SIZE)
+    hbin_cells = list(hbin.iter_cells(registry_hive._stream))
+    assert hbin_cells[0].offset == registry_hive.root.offset
+    assert [x.offset for x in hbin_cells] == [
+        offset + 6 for offset, cell_size in iter_hbin_cells(registry_hive) if cell_size < 0 and offset < hbin_offset + hbin_size
+    ]
+
+    linear_entries = sorted(json.dumps(asdict(x)) for x in iter_subkeys_linear(registry_hive, as_json=True))
+    entries = sorted(json.dumps(asdict(x)) for x in registry_hive.recurse_subkeys(as_json=True))
+    assert linear_entries == entries
+
+
+def test_carve_deleted_keys(second_hive_path, ntuser_hive):
+    registry_hive = RegistryHive(second_hive_path)
+
+    carved_cells = list(iter_carved_cells(registry_hive))
+    assert Counter(x.cell_type for x in carved_cells) == {"vk": 29, "nk": 1}
+    assert {x.source for x in carved_cells} == {UNALLOCATED}
+
+    result = carve_hive(registry_hive, as_json=True)
+    assert len(result.keys) == 1
+    recovered_key = result.keys[0]
+    assert recovered_key.path == r"\Software\Microsoft\Cryptography\CertificateTemplateCache\DomainControllerAuthentication"
+    assert recovered_key.has_live_parent
+    assert recovered_key.timestamp == "2012-04-06T12:42:11.821646+00:00"
+    assert recovered_key.values_count == 25
+    assert len(recovered_key.values) == 21
+    assert recovered_key.values[0] == RecoveredValue(
+        offset=382404,
+        name="SupportedCSPs",
+        value_type="REG_MULTI_SZ",
+        value=["Microsoft RSA SChannel Cryptographic Provider"],
+        size=94,
+        source=UNALLOCATED,
+    )
+    assert recovered_key.values[3].value == 110
+    assert recovered_key.values[3].size == 4
+
+    # Values that belong to the recovered key are not reported again
+    assert len(result.values) == 8
+    assert {x.offset for x in result.values}.isdisjoint(x.offset for x in recovered_key.values)
+    assert list(iter_recovered_keys(registry_hive, as_json=True)) == result.keys
+
+    # Nothing was deleted from the original hive
+    assert not carve_hive(RegistryHive(ntuser_hive)).keys
+
+
+def test_carved_key_node_values_list_bounds(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    offset = registry_hive.root.offset
+    buffer = bytearray(registry_hive._buffer)
+    end_offset = offset + CM_KEY_NODE_SIZE + registry_hive.root.fields.key_name_size
+
+    # One value, with the values list cell at the end of the buffer
+    struct.pack_into("<II", buffer, offset + 34, 1, len(buffer) - REGF_HEADER_SIZE - 8)
+    assert validate_key_node(buffer, offset, end_offset, len(buffer)) is not None
+
+    # The values list entry is read after the cell size, so it would end past the buffer
+    struct.pack_into("<I", buffer, offset + 38, len(buffer) - REGF_HEADER_SIZE - 4)
+    assert validate_key_node(buffer, offset, end_offset, len(buffer)) is None
+
+
+def test_hive_index(ntuser_hive, second_hive_path, tmp_path):
+    registry_hive = RegistryHive(ntuser_hive)
+    assert registry_hive.index is None
+    assert registry_hive.sha1 == calculate_sha1(ntuser_hive)
+
+    walked_values = list(registry_hive.find_values("progid"))
+    assert [(x.path, x.name) for x in walked_values] == [
+        (r"\Software\Microsoft\Windows\Shell\Associations\UrlAssociations\mapi\UserChoice", "Progid")
+    ]
+
+    hive_index = registry_hive.build_index(str(tmp_path))
+    assert hive_index.index_path == str(tmp_path / f"{registry_hive.sha1}{INDEX_FILE_EXTENSION}")
+    assert list(registry_hive.find_values("ProgId")) == walked_values
+    registry_hive.close()
+
+    # The index is picked up again for the same hive, and the lookups match the tree walk
+    indexed_hive = RegistryHive(ntuser_hive, index_path=str(tmp_path), key_cache_size=0)
+    assert indexed_hive.index is not None
+    walked_hive = RegistryHive(ntuser_hive, key_cache_size=0)
+    for entry in walked_hive.recurse_subkeys(fetch_values=False):
+        assert indexed_hive.get_key(entry.path).offset == walked_hive.get_key(entry.path).offset
+    assert indexed_hive.get_key("\\software\\microsoft").name == "Microsoft"
+
+    with pytest.raises(RegistryKeyNotFoundException, match="Did not find subkey at \\\\Nope"):
+        indexed_hive.get_key("\\Nope")
+
+    indexed_keys = list(indexed_hive.index.iter_keys_modified_between(0, 2**64))
+    assert len(indexed_keys) == 1812
+    assert indexed_keys[-1] == IndexedKey(
+        path="\\", offset=4134, last_modified=129780243434537497, subkey_count=11, values_count=0
+    )
+    assert not list(indexed_hive.index.iter_keys_modified_between(129780243434537497, 129780243434537497))
+
+    # An index of another hive is not used
+    assert not RegistryHive(second_hive_path).load_index(hive_index.index_path)
+
+
+def test_concurrent_reads(ntuser_hive, tmp_path):
+    registry_hive = RegistryHive(ntuser_hive, use_mmap=True)
+    key_paths = [entry.path for entry in registry_hive.recurse_subkeys(fetch_values=False)]
+
+    def read_keys(paths):
+        keys = [registry_hive.get_key(path) for path in paths]
+        return [
+            ([asdict(value) for value in key.iter_values(as_json=True)], key.get_security_key_info()["owner"]) for key in keys
+        ]
+
+    expected = read_keys(key_paths)
+
+    # Interleaved generators on the same hive do not move each other
+    generators = [registry_hive.recurse_subkeys(as_json=True), registry_hive.recurse_subkeys(as_json=True)]
+    first_entries, second_entries = zip(*[(next(generators[0]), next(generators[1])) for _ in range(len(key_paths))])
+    assert first_entries == second_entries
+    assert [entry.path for entry in first_entries] == key_paths
+
+    # Threads share the hive, its key cache and its index
+    registry_hive.build_index(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        chunks = [key_paths[i::4] for i in range(4)]
+        results = list(executor.map(read_keys, chunks))
+        indexed_values = list(executor.map(lambda _: list(registry_hive.find_values("ProgId")), range(4)))
+    for i, result in enumerate(results):
+        assert result == expected[i::4]
+    assert all(values == indexed_values[0] for values in indexed_values)
+    registry_hive.close()
+
+
+def test_iter_keys_modified_between(ntuser_hive, tmp_path):
+    registry_hive = RegistryHive(ntuser_hive)
+    start = convert_datetime_to_filetime(dt.datetime(2012, 4, 3, 21, 19, 54, 847000))
+    end = convert_datetime_to_filetime(dt.datetime(2012, 4, 4))
+
+    entries = list(registry_hive.iter_keys_modified_between(start, end, as_json=True))
+    assert len(entries) == 731
+    assert entries == [
+        x for x in registry_hive.recurse_subkeys(as_json=True) if start <= registry_hive.get_key(x.path).last_modified < end
+    ]
+    # The key nodes are walked in the same order, without building the entries
+    key_nodes = list(registry_hive.iter_key_nodes_modified_between(start, end))
+    assert [subkey_path or "\\" for _, subkey_path, _ in key_nodes] == [x.path for x in entries]
+    assert all(start <= nk_record.last_modified < end for nk_record, _, _ in key_nodes)
+
+    # Values are only read for the keys in the range
+    run_key = registry_hive.get_key(r"\Software\Microsoft\Windows\CurrentVersion\Run")
+    entries = list(
+        registry_hive.iter_keys_modified_between(run_key.last_modified, run_key.last_modified + 1, nk_record=run_key)
+    )
+    assert [x.path for x in entries] == ["\\"]
+    assert entries[0].values[0].name == "Sidebar"
+
+    # The index returns the same keys, in the same order
+    registry_hive.build_index(str(tmp_path))
+    assert list(registry_hive.iter_keys_modified_between(start, end, as_json=True)) == list(
+        RegistryHive(ntuser_hive).iter_keys_modified_between(start, end, as_json=True)
+    )
+
+
+def test_convert_wintimes(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    wintimes = [x.last_modified for x, _, _ in registry_hive._walk_subkeys_depth_first(registry_hive.root, None)]
+    # Corrupted timestamps, a timestamp that is rounded by the conversion, and the epoch
+    wintimes += [2**64 - 1, 0x7FFFFFFFFFFFFFFF, 129770123947968665, 0]
+
+    for as_json in (False, True):
+        assert convert_wintimes(wintimes, as_json=as_json) == [convert_wintime(x, as_json=as_json) for x in wintimes]
+    assert convert_wintimes([]) == []
+
+
+def test_recurse_subkeys_timestamp_batches(ntuser_hive):
+    registry_hive = RegistryHive(ntuser_hive)
+    walked_keys = []
+    walk_subkeys = registry_hive._walk_subkeys_depth_first
+
+    def counting_walk_subkeys(*args):
+        for key in walk_subkeys(*args):
+            walked_keys.append(key)
+            yield key
+
+    registry_hive._walk_subkeys_depth_first = counting_walk_subkeys
+
+    # By default the first entry is yielded as soon as it is walked
+    first_entry = next(registry_hive.recurse_subkeys(as_json=True))
+    assert len(walked_keys) == 1
+
+    walked_keys.clear()
+    batched_entries = registry_hive.recurse_subkeys(as_json=True, timestamp_batch_size=TIMESTAMP_BATCH_SIZE)
+    assert next(batched_entries) == first_entry
+    assert len(walked_keys) == TIMESTAMP_BATCH_SIZE
+
+    for as_json in (False, True):
+        assert list(registry_hive.recurse_subkeys(as_json=as_json)) == list(
+            registry_hive.recurse_subkeys(as_json=as_json, timestamp_batch_size=TIMESTAMP_BATCH_SIZE)
+        )
+
+
+def test_convert_wintimes_with_numpy():
+    pytest.importorskip("numpy")
+    from regipy.utils import _format_wintimes_with_numpy
+
+    wintimes = [129770123947968665, 129770123940000000, 2**64 - 1, 0, 128166372000000005]
+    assert _format_wintimes_with_numpy(wintimes) == [convert_wintime(x, as_json=True) for x in wintimes]
+
+
+def test_synthetic_hive(tmp_path):
+    hive_path = tmp_path / "synthetic.dat"
+    values_count = generate_hive(hive_path, keys_count=2000, fanout=SUBKEY_LIST_MAX_ELEMENTS + 100, values_per_key=6)
+    assert values_count == 2000 * 6 + 1
+
+    registry_hive = RegistryHive(str(hive_path))
+    assert registry_hive.header.checksum == calculate_xor32_checksum(bytes(registry_hive._buffer[:508]))
+    assert registry_hive.root.subkey_count == SUBKEY_LIST_MAX_ELEMENTS + 100
+    entries = list(registry_hive.recurse_subkeys(as_json=True))
+    assert len(entries) == 2000
+
+    # The subkeys of the root are split between LH lists, under an RI list
+    assert registry_hive.get_key(rf"\{get_key_name(SUBKEY_LIST_MAX_ELEMENTS + 50)}").subkey_count == 0
+    key = registry_hive.get_key(rf"\{get_key_name(1998 // (SUBKEY_LIST_MAX_ELEMENTS + 100))}\{get_key_name(1999)}")
+    assert key.last_modified == BASE_TIMESTAMP + 1999 * TIMESTAMP_INTERVAL
+    assert [(value.value_type, value.value) for value in key.iter_values(trim_values=False)] == [
+        ("REG_SZ", "Data 1999.0.0"),
+        ("REG_DWORD", 1999 * 31 + 1),
+        ("REG_BINARY", hashlib.blake2b(b"1999:2:0", digest_size=16).digest()),
+        ("REG_QWORD", 1999 * 2**32 + 3),
+        ("REG_MULTI_SZ", ["First 1999", "Second 0"]),
+        ("REG_EXPAND_SZ", "%SystemRoot%\\System32\\1999.0.dll"),
+    ]
+    assert len(registry_hive.root.get_value("BigData")) == BIG_DATA_VALUE_SIZE
+    assert key.get_security_key_info()["owner"] == "S-1-5-32-544"
+
+    # The same arguments generate the same hive, and changed hives differ by the changed keys
+    generate_hive(tmp_path / "same.dat", keys_count=2000, fanout=SUBKEY_LIST_MAX_ELEMENTS + 100, values_per_key=6)
+    assert (tmp_path / "same.dat").read_bytes() == hive_path.read_bytes()
+
+    generate_hive(tmp_path / "changed.dat", keys_count=2000, fanout=SUBKEY_LIST_MAX_ELEMENTS + 100, seed=3, changes=0.05)
+    generate_hive(tmp_path / "original.dat", keys_count=2000, fanout=SUBKEY_LIST_MAX_ELEMENTS + 100)
+    changed_keys = [index for index in range(1, 2000) if is_changed(index, 3, 0.05)]
+    found_differences = compare_hives(str(tmp_path / "original.dat"), str(tmp_path / "changed.dat"))
+    assert Counter(x[0] for x in found_differences) == {
+        "different_hive_bin_data_size": 1,
+        "new_subkey": len(changed_keys),
+        "new_value": len(changed_keys),
+    }
+    # The data of the values of changed keys is different too
+    found_differences = compare_hives(str(tmp_path / "original.dat"), str(tmp_path / "changed.dat"), detailed=True)
+    assert Counter(x[0] for x in found_differences) == {
+        "different_hive_bin_data_size": 1,
+        "new_subkey": len(changed_keys),
+        "new_value": len(changed_keys),
+        "modified_value": 3 * len(changed_keys),
+    }
+
+
+def test_benchmarks(tmp_path):
+    results = run_benchmarks(tmp_path, keyword="synthetic", synthetic_keys=300, min_rounds=2, max_rounds=2, min_time=0)
+    assert results["environment"]["regipy_version"] == regipy.__version__
+    benchmarks = {benchmark["name"]: benchmark for benchmark in results["benchmarks"]}
+    assert {
+        "walk[synthetic-300]",
+        "get_key_cached[synthetic-300]",
+        "compare_hives[synthetic-300]",
+        "compare_hives_indexed[synthetic-300]",
+    } <= set(benchmarks)
+    assert all(benchmark["rounds"] == 2 and benchmark["min"] <= benchmark["median"] for benchmark in benchmarks.values())
+
+    baseline = json.loads(json.dumps(results))
+    baseline["benchmarks"][0]["median"] /= 2
+    comparisons = compare_results(baseline, results, threshold=0.1)
+    assert len(comparisons) == len(benchmarks)
+    assert comparisons[0]["name"] == baseline["benchmarks"][0]["name"]
+    assert comparisons[0]["regression"]
+    assert not any(comparison["regression"] for comparison in comparisons[1:])
+
+
+TEST_HIVES = sorted(x.name for x in Path(__file__).parent.joinpath("data").iterdir() if ".log" not in x.name.lower())
+
+
+def _parse_both(construct_struct, fast_parser, data, offset):
+    """
+    Parse with both decoders, and expect either the same result or the same exception type
+    """
+    stream = BytesIO(data)
+    stream.seek(offset)
+    try:
+        expected = construct_struct.parse_stream(stream)
+    except (ConstError, StreamError) as ex:
+        with pytest.raises(type(ex)):
+            fast_parser(memoryview(data), offset)
+        return None
+    assert fast_parser(memoryview(data), offset) == expected
+    return expected
+
+
+def _as_container(elements):
+    return {"element_count": len(elements), "elements": elements}
+
+
+def _cross_check_subkey_list(data, offset):
+    signature = data[offset : offset + 2]
+    if signature in [HASH_LEAF_SIGNATURE, FAST_LEAF_SIGNATURE]:
+        expected = _parse_both(
+            LF_LH_SK_ELEMENT,
+            lambda buffer, o: _as_container(
+                [{"key_node_offset": x, "hash_value": y} for x, y in parse_lf_lh_sk_element(buffer, o)]
+            ),
+            data,
+            offset + 2,
+        )
+    elif signature == LEAF_INDEX_SIGNATURE:
+        expected = _parse_both(
+            INDEX_LEAF,
+            lambda buffer, o: _as_container([{"key_node_offset": x} for x in parse_index_leaf(buffer, o)]),
+            data,
+            offset + 2,
+        )
+    elif signature == INDEX_ROOT_SIGNATURE:
+        expected = _parse_both(
+            INDEX_ROOT,
+            lambda buffer, o: _as_container([{"subkey_list_offset": x} for x in parse_index_root(buffer, o)]),
+            data,
+            offset + 2,
+        )
+        key_node_offsets = []
+        for element in expected.elements if expected else []:
+            key_node_offsets.extend(_cross_check_subkey_list(data, REGF_HEADER_SIZE + 4 + element.subkey_list_offset))
+        return key_node_offsets
+    else:
+        return []
+    return [x.key_node_offset for x in expected.elements] if expected else []
+
+
+def _cross_check_hive(data):
+    checked_key_nodes = 0
+    checked_values = 0
+    header = REGF_HEADER.parse(data)
+    pending = [header.root_key_offset]
+    visited = set()
+    while pending:
+        key_node_offset = pending.pop()
+        if key_node_offset in visited or REGF_HEADER_SIZE + key_node_offset + 6 > len(data):
+            continue
+        visited.add(key_node_offset)
+
+        # Skip the cell size and the NK signature
+        nk = _parse_both(CM_KEY_NODE, parse_cm_key_node, data, REGF_HEADER_SIZE + key_node_offset + 6)
+        if nk is None:
+            continue
+        checked_key_nodes += 1
+
+        if nk.values_count:
+            values_list_offset = REGF_HEADER_SIZE + 4 + nk.values_list_offset
+            for i in range(nk.values_count):
+                vk_offset_data = data[values_list_offset + i * 4 : values_list_offset + i * 4 + 4]
+                if len(vk_offset_data) != 4:
+                    break
+                # Like iter_values(), stop at the first value that cannot be parsed
+                if _parse_both(VALUE_KEY, parse_value_key, data, REGF_HEADER_SIZE + 4 + Int32ul.parse(vk_offset_data)) is None:
+                    break
+                checked_values += 1
+
+        if nk.subkey_count:
+            pending.extend(_cross_check_subkey_list(data, REGF_HEADER_SIZE + 4 + nk.subkeys_list_offset))
+    return checked_key_nodes, checked_values
+
+
+@pytest.mark.parametrize("hive_file_name", TEST_HIVES)
+def test_fast_parsers_match_construct(test_data_dir, hive_file_name):
+    """
+    Cross-check the struct based decoders against the construct definitions on every hive
+    """
+    hive_path = extract_lzma(os.path.join(test_data_dir, hive_file_name))
+    try:
+        with open(hive_path, "rb") as f:
+            data = f.read()
+    finally:
+        os.remove(hive_path)
+
+    checked_key_nodes, _ = _cross_check_hive(data)
+    assert checked_key_nodes > 0